@@ -20,8 +20,9 @@ from __future__ import absolute_import
 
 from .datetime_utils import valid_from,valid_until, parse_timestamp, parse_time, iso2seconds
 from .exceptions import install_exc_handler, default_handler
-from .parsing_utils import parse_fqan
-from .hashing import calculate_hash
+from .parsing_utils import parse_fqan, decode_fqan
+from .hashing import (calculate_hash, detect_compression, gzip_size, open_log,
+                      iter_lines, Bzip2Reader, HashingReader)
 
 import logging
 import sys
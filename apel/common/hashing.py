@@ -15,37 +15,198 @@
 '''
 
 from hashlib import md5
+import bz2
 import gzip
+import mmap
+import os
+import struct
+
+# The first bytes of bzip2 and gzip files.
+BZ2_MAGIC = b'BZh'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def detect_compression(fname):
+    '''
+    Returns 'bz2' or 'gzip' if the file with name='fname' starts with the
+    magic bytes of that format, or None for any other file.
+    '''
+    with open(fname, 'rb') as fp:
+        magic = fp.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    # The magic bytes are followed by the block size, from 1 to 9.
+    elif magic[:3] == BZ2_MAGIC and magic[3:4].isdigit() and magic[3:4] != b'0':
+        return 'bz2'
+    return None
+
+
+def gzip_size(fname):
+    '''
+    Returns the size of the content of the gzip file with name='fname',
+    modulo 2**32, from the ISIZE field at its end, or None if the file is too
+    short to have one.  For a file of several gzip members, this is the size
+    of the last member only.
+    '''
+    with open(fname, 'rb') as fp:
+        try:
+            fp.seek(-4, os.SEEK_END)
+        except (IOError, OSError):
+            return None
+        return struct.unpack('<I', fp.read(4))[0]
+
+
+def open_log(fname):
+    '''
+    Opens the file with name='fname' for reading bytes, decompressing it if
+    it is a bzip2 or gzip file.
+    '''
+    compression = detect_compression(fname)
+    if compression == 'bz2':
+        return bz2.BZ2File(fname, 'rb')
+    elif compression == 'gzip':
+        return gzip.open(fname, 'rb')
+    return open(fname, 'rb')
+
+
+def iter_lines(fp, end=None):
+    '''
+    Iterates over the lines of a regular file opened in binary mode, from
+    its current position to end or, if end is None, to the end of the
+    file.  The lines are read from a memory map of the file rather than
+    through the file object's buffer.
+
+    Files which can't be mapped, such as empty ones, are read through the
+    file object instead.
+    '''
+    start = fp.tell()
+    try:
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError):
+        for line in fp:
+            if end is not None and start >= end:
+                break
+            start += len(line)
+            yield line
+        return
+
+    try:
+        size = len(mapped)
+        if end is not None:
+            size = min(size, end)
+        find = mapped.find
+        while start < size:
+            stop = find(b'\n', start, size) + 1
+            if stop == 0:
+                # A last line without a newline.
+                stop = size
+            yield mapped[start:stop]
+            start = stop
+    finally:
+        mapped.close()
+
+
+class HashingReader(object):
+    '''
+    Iterates over the lines of a file, updating an MD5 hash with every
+    byte read, so that a file can be hashed while it is being parsed.
+    '''
+    def __init__(self, fp, md=None):
+        self._fp = fp
+        self._md = md5() if md is None else md
+
+    def __iter__(self):
+        for line in self._fp:
+            self._md.update(line)
+            yield line
+
+    def hexdigest(self):
+        '''The MD5 hash of the bytes read so far.'''
+        return self._md.hexdigest()
+
+
+class Bzip2Reader(object):
+    '''
+    Iterates over the decompressed lines of a bzip2 file opened in binary
+    mode, which may hold several streams, updating an MD5 hash with every
+    compressed byte read.  This gives the hash calculate_hash does for a
+    bzip2 file while it is being parsed.
+    '''
+    def __init__(self, fp):
+        self._fp = fp
+        self._md = md5()
+
+    def __iter__(self):
+        decompressor = bz2.BZ2Decompressor()
+        # Whether the current decompressor follows the end of a stream and
+        # has not yet given any data.
+        following = False
+        pending = b''
+        finished = False
+        while True:
+            data = self._fp.read(131072)
+            if data == b'':
+                break
+            self._md.update(data)
+            while data and not finished:
+                try:
+                    text = decompressor.decompress(data)
+                except EOFError:
+                    # The stream ended with the bytes read before, so the
+                    # next one starts here.
+                    decompressor = bz2.BZ2Decompressor()
+                    following = True
+                    continue
+                except (IOError, OSError):
+                    if not following:
+                        raise
+                    # Trailing bytes after the last stream are ignored, as
+                    # by bz2.BZ2File, but are still hashed.
+                    finished = True
+                    break
+                if text:
+                    following = False
+                # Bytes after the end of a stream may be only the start of
+                # the next one, so a new decompressor is given them rather
+                # than checking them here.
+                data = decompressor.unused_data
+                if data:
+                    decompressor = bz2.BZ2Decompressor()
+                    following = True
+                if text:
+                    lines = (pending + text).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield line + b'\n'
+        if pending:
+            yield pending
+
+    def hexdigest(self):
+        '''The MD5 hash of the bytes read so far.'''
+        return self._md.hexdigest()
+
 
 def calculate_hash(fname):
     '''
-    Calculates MD5 hash from content of file with name='fname'.  Also opens gzip
-    files.
+    Calculates MD5 hash from content of file with name='fname'.  Gzip files
+    are decompressed first, so a log has the same hash after it has been
+    gzipped.  Bzip2 files are hashed as they are, as they always have been,
+    so that the hashes of those parsed before still match.
 
     Used in parsers to avoid double parsing of files.
     For sample usage please go to: apel2/bin/client.py
     '''
-
-    data = b'initial'
-
     md = md5()
 
-    # try opening as a gzip file, and if it fails
-    # try as a regular file
-    try:
+    if detect_compression(fname) == 'gzip':
         fp = gzip.open(fname, 'rb')
-        while data != b'':
-            # 128kiB buffer
-            data = fp.read(131072)
-            md.update(data)
-    except IOError: # not a gzipped file
+    else:
         fp = open(fname, 'rb')
+    with fp:
+        data = fp.read(131072)
         while data != b'':
+            md.update(data)
             # 128kiB buffer
             data = fp.read(131072)
-            md.update(data)
-
-    finally:
-        fp.close()
 
     return md.hexdigest()
@@ -14,10 +14,17 @@
    limitations under the License.
 '''
 
+from future.builtins import object
+
+from collections import OrderedDict
 import logging
 
 log = logging.getLogger(__name__)
 
+# How many distinct FQANs decode_fqan remembers.  A site only sees a
+# handful, so this bounds memory without ever evicting in practice.
+FQAN_CACHE_SIZE = 1024
+
 def parse_fqan(fqan):
     '''
     We can get three pieces of information from a FQAN: role, group and VO.
@@ -57,3 +64,53 @@ def parse_fqan(fqan):
     except Exception:
         log.warning("FQAN in non-standard format: %s", fqan)
         return (None, None, fqan)
+
+
+
+class FqanDecoder(object):
+    '''
+    Callable which returns the same (role, group, vo) tuple as parse_fqan,
+    but remembers the result for the most recently used FQAN strings and
+    counts how often it could use them.
+    '''
+    def __init__(self, maxsize=FQAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, fqan):
+        cache = self._cache
+        try:
+            result = cache.pop(fqan)
+            self.hits += 1
+        except KeyError:
+            result = parse_fqan(fqan)
+            self.misses += 1
+            if len(cache) >= self.maxsize:
+                # Drop the least recently used FQAN.
+                cache.popitem(last=False)
+        # (Re)insert as the most recently used FQAN.
+        cache[fqan] = result
+        return result
+
+    def stats(self):
+        '''
+        Returns a dict with the number of hits and misses, the hit rate and
+        how many FQANs are cached.
+        '''
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'size': len(self._cache)}
+
+    def clear(self):
+        '''Forget all cached FQANs and reset the statistics.'''
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by the parsers and the records, so each distinct FQAN is decoded once.
+decode_fqan = FqanDecoder()
@@ -70,6 +70,13 @@ class ApelDb(object):
         '''
         pass
 
+    def get_processed_files(self, hostname):
+        '''
+        Returns the files parsed on the given host, as a dict of
+        ProcessedFiles by hash.
+        '''
+        pass
+
 
 class Query(object):
     '''
@@ -30,7 +30,9 @@ from apel.db.records import (BlahdRecord,
                              JobRecord04,
                              NormalisedSummaryRecord,
                              NormalisedSummaryRecord04,
+                             ProcessedFile,
                              ProcessedRecord,
+                             RecordBatch,
                              StorageRecord,
                              SummaryRecord,
                              SummaryRecord04,
@@ -78,7 +80,7 @@ class ApelMysqlDb(object):
               NormalisedSummaryRecord: "CALL ReplaceNormalisedSummary(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
               NormalisedSummaryRecord04: "CALL ReplaceNormalisedSummary(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
               SyncRecord  : "CALL ReplaceSyncRecord(%s, %s, %s, %s, %s, %s)",
-              ProcessedRecord : "CALL ReplaceProcessedFile(%s, %s, %s, %s, %s)",
+              ProcessedRecord : "CALL ReplaceProcessedFile(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
               CloudRecord : "CALL ReplaceCloudRecord(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
               CloudSummaryRecord : "CALL ReplaceCloudSummaryRecord(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
               StorageRecord: "CALL ReplaceStarRecord(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
@@ -106,6 +108,9 @@ class ApelMysqlDb(object):
         self._spec_update_proc = "CALL SpecUpdate (%s, %s, %s, %s, %s)"
 
         self._processed_clean = "CALL CleanProcessedFiles(%s)"
+        # Selects the rows of one host by the start of the primary key.
+        self._processed_select = ('SELECT %s FROM ProcessedFiles WHERE HostName = %%s'
+                                  % ', '.join(ProcessedFile._fields))
 
         try:
             self.db = MySQLdb.connect(host=self._db_host, port=self._db_port,
@@ -136,7 +141,14 @@ class ApelMysqlDb(object):
         Loads the records in the list into the DB.  This is transactional -
         either all or no records will be loaded.  Includes the DN of the
         sender.
+
+        record_list may also be a RecordBatch, which is checked and loaded
+        a column at a time.
         '''
+        if isinstance(record_list, RecordBatch):
+            self._load_batch(record_list, replace, source)
+            return
+
         # All records in the list should be of the same type (but may not be),
         # unless they are Storage or GroupAttribute records which can be mixed.
         try:
@@ -181,10 +193,44 @@ class ApelMysqlDb(object):
             self.db.rollback()
             raise ApelDbException(err)
 
-    def get_records(self, record_type, table_name=None, query=None, records_per_message=1000):
+    def _load_batch(self, batch, replace, source):
+        '''
+        Loads the rows of a RecordBatch into the DB in one transaction.
+        '''
+        if len(batch) == 0:
+            return
+
+        try:
+            if replace:
+                proc = self.REPLACE_PROCEDURES[batch.record_class]
+            else:
+                proc = self.INSERT_PROCEDURES[batch.record_class]
+        except KeyError:
+            raise ApelDbException('No procedure found for %s; replace = %s'
+                                  % (batch.record_class, replace))
+
+        try:
+            # prevent MySQLdb from raising
+            # 'MySQL server has gone' exception
+            self._mysql_reconnect()
+
+            c = self.db.cursor(MySQLdb.cursors.DictCursor)
+            values = batch.get_db_tuples(source)
+            c.executemany(proc, values)
+            self.db.commit()
+        except (MySQLdb.Warning, MySQLdb.Error, KeyError) as err:
+            log.error("Error loading records: %s", err)
+            log.error("Transaction will be rolled back.")
+            self.db.rollback()
+            raise ApelDbException(err)
+
+    def get_records(self, record_type, table_name=None, query=None,
+                    records_per_message=1000, as_batch=False):
         '''
         Yields lists of records fetched from database of the given type.  This is used
         if the records are coming directly from a table or view.
+
+        If as_batch is True, a RecordBatch is yielded in place of each list.
         '''
         if table_name is None:
             table_name = self.MYSQL_TABLES[record_type]
@@ -196,7 +242,8 @@ class ApelMysqlDb(object):
 
         log.debug(select_query)
 
-        for batch in self._get_records(record_type, select_query, records_per_message):
+        for batch in self._get_records(record_type, select_query, records_per_message,
+                                       as_batch):
             yield batch
 
     def get_sync_records(self, query=None, records_per_message=1000):
@@ -219,9 +266,9 @@ class ApelMysqlDb(object):
         for batch in self._get_records(SyncRecord, select_query, records_per_message):
             yield batch
 
-    def _get_records(self, record_type, query_string, records_per_message=1000):
+    def _get_records(self, record_type, query_string, records_per_message=1000,
+                     as_batch=False):
 
-        record_list = []
         try:
             # prevent MySQLdb from raising
             # 'MySQL server has gone' exception
@@ -230,15 +277,16 @@ class ApelMysqlDb(object):
             c = self.db.cursor(MySQLdb.cursors.SSDictCursor)
             c.execute(query_string)
             while True:
+                # row is a dictionary {Field: Value}
+                batch = RecordBatch(record_type)
                 for row in c.fetchmany(size=records_per_message):
-                    record = record_type()
-                    # row is a dictionary {Field: Value}
-                    record.set_all(row)
-                    record_list.append(record)
+                    batch.append(row)
 
-                if len(record_list) > 0:
-                    yield record_list
-                    record_list = []
+                if len(batch) > 0:
+                    if as_batch:
+                        yield batch
+                    else:
+                        yield batch.to_records()
 
                 else:
                     break
@@ -251,6 +299,30 @@ class ApelMysqlDb(object):
         except MySQLdb.Warning as warning:
             log.warning('Warning from MySQL: %s', warning)
 
+    def get_processed_files(self, hostname):
+        '''
+        Returns the files parsed on the given host, as a dict of
+        ProcessedFiles by hash.  Only the host's rows and the fields the
+        parser needs are fetched, and no records are made from them.
+        '''
+        try:
+            # prevent MySQLdb from raising
+            # 'MySQL server has gone' exception
+            self._mysql_reconnect()
+
+            c = self.db.cursor()
+            c.execute(self._processed_select, [hostname])
+            processed = {}
+            for row in c.fetchall():
+                processed_file = ProcessedFile.from_row(row)
+                processed[processed_file.Hash] = processed_file
+            return processed
+        except MySQLdb.Error as err:
+            log.error('Error during getting processed files: %s', err)
+            log.error('Transaction will be rolled back.')
+            self.db.rollback()
+            raise ApelDbException(err)
+
     def get_last_updated(self):
         '''
         Find the last time that messages were sent.
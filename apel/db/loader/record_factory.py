@@ -20,6 +20,7 @@ Module containing the RecordFactory class.
 
 from future.builtins import object
 
+from apel.db.records.batch import RecordBatch
 from apel.db.records.job import JobRecord, JobRecord04
 from apel.db.records.summary import SummaryRecord, SummaryRecord04
 from apel.db.records.normalised_summary import NormalisedSummaryRecord, NormalisedSummaryRecord04
@@ -135,19 +136,16 @@ class RecordFactory(object):
 
     def _create_record_objects(self, msg_text, record_class):
         """Given the text from a record message, return a list of record objects."""
-        msg_text = msg_text.strip()
-
-        records = msg_text.split('%%')
-        msgs = []
-
-        for record in records:
-            # unnecessary hack?
-            if record != '' and not record.isspace():
-                j = record_class()
-                j.load_from_msg(record)
-                msgs.append(j)
-
-        return msgs
+        return self._create_record_batch(msg_text, record_class).to_records()
+
+    def _create_record_batch(self, msg_text, record_class):
+        """
+        Given the text from a record message, return a checked RecordBatch
+        of its records.
+        """
+        batch = RecordBatch.from_msg(record_class, msg_text.strip())
+        batch.validate()
+        return batch
 
     def _create_cars(self, msg_text):
         '''
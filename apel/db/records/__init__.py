@@ -26,13 +26,14 @@ import time
 import datetime
 
 from .record import Record, InvalidRecordException
+from .batch import RecordBatch
 from .blahd import BlahdRecord
 from .cloud import CloudRecord
 from .cloud_summary import CloudSummaryRecord
 from .event import EventRecord
 from .group_attribute import GroupAttributeRecord
 from .job import JobRecord, JobRecord04
-from .processed import ProcessedRecord
+from .processed import ProcessedFile, ProcessedRecord
 
 from .storage import StorageRecord
 from .summary import SummaryRecord, SummaryRecord04
@@ -0,0 +1,380 @@
+'''
+   Copyright (C) 2024 STFC
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Module containing the RecordBatch class.
+'''
+
+from future.builtins import object, range, zip
+
+from datetime import datetime
+
+from apel.db.records.record import (InvalidRecordException, Record,
+                                    RecordSchema, check_for_null, intern_value,
+                                    _MISSING)
+
+
+def _intern(name, value):
+    return intern_value(value)
+
+
+class RecordBatch(object):
+    '''
+    A batch of records of one type, held column by column.
+
+    Each field of the record type's schema has one column: a list with one
+    value per row.  Loading a message or a set of database rows into a
+    batch and checking it a column at a time avoids creating and checking a
+    Record object per row.  The checks, and the values they leave behind,
+    are those of Record._check_fields.
+
+    Rows added with append() hold the raw values from a message or the
+    database and are converted to their field types a column at a time,
+    while rows added with append_record() have been converted already.
+    '''
+
+    def __init__(self, record_class, schema=None):
+        self.record_class = record_class
+        if schema is None:
+            schema = record_class.get_schema()
+        self._schema = schema
+        self._columns = [[] for _ in schema.content_fields]
+        # Values for fields which the schema doesn't know about, by row.
+        self._extra = {}
+        # Rows whose values haven't been converted to their field types.
+        self._raw_rows = []
+        self._size = 0
+        # Whether the rows have passed the checks since the last change.
+        self._valid = False
+
+    def __getstate__(self):
+        # As for Record, the schema and the missing-value marker are replaced
+        # by plain values, so that batches can be passed between processes.
+        schema = self._schema
+        if schema is self.record_class.get_schema():
+            fields = None
+        else:
+            fields = dict((category, getattr(schema, category + '_fields'))
+                          for category in RecordSchema.CATEGORIES)
+        missing = [[row for row, value in enumerate(column) if value is _MISSING]
+                   for column in self._columns]
+        columns = [[None if value is _MISSING else value for value in column]
+                   for column in self._columns]
+        return (self.record_class, fields, columns, missing, self._extra,
+                self._raw_rows, self._size, self._valid)
+
+    def __setstate__(self, state):
+        (self.record_class, fields, self._columns, missing, self._extra,
+         self._raw_rows, self._size, self._valid) = state
+        self._schema = self.record_class.get_schema()
+        if fields is not None:
+            self._schema = self._schema.replace(**fields)
+        for column, rows in zip(self._columns, missing):
+            for row in rows:
+                column[row] = _MISSING
+
+    @classmethod
+    def from_msg(cls, record_class, msg_text):
+        '''
+        Given the text of the records from a message, separated by '%%',
+        return a batch holding them.
+        '''
+        batch = cls(record_class)
+        dict_fields = batch._schema.dict_set
+        for text in msg_text.split('%%'):
+            if text != '' and not text.isspace():
+                batch.append(Record._read_msg(text, dict_fields))
+        return batch
+
+    @classmethod
+    def from_records(cls, records):
+        '''Return a batch holding a copy of each of a list of records.'''
+        batch = cls(type(records[0]), records[0]._schema)
+        for record in records:
+            batch.append_record(record)
+        return batch
+
+    @classmethod
+    def from_db_tuples(cls, record_class, rows):
+        '''
+        Returns a batch holding rows of DB values, as returned by
+        get_db_tuples, which are taken to have passed the checks already.
+        '''
+        batch = cls(record_class)
+        columns = batch._columns
+        for (key, index, is_mandatory), values in zip(batch._schema.db_layout,
+                                                      zip(*rows)):
+            columns[index] = list(values)
+        for index, column in enumerate(columns):
+            if not column:
+                columns[index] = [_MISSING] * len(rows)
+        batch._size = len(rows)
+        batch._valid = True
+        return batch
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def column(self, name):
+        '''
+        Returns the column holding the values of the field 'name'.  The list
+        itself is returned, so changing it changes the batch.
+        '''
+        return self._columns[self._schema.slots[name]]
+
+    def append(self, fielddict):
+        '''
+        Add a row holding the unchecked values of a dictionary, as
+        Record.set_all would for a single record.
+        '''
+        schema = self._schema
+        slots = schema.slots
+        db_set = schema.db_set
+        ignored_set = schema.ignored_set
+        row = self._size
+
+        for key in fielddict:
+            if key not in db_set and key not in ignored_set:
+                raise InvalidRecordException('Unknown field: %s' % key)
+
+        for column in self._columns:
+            column.append(_MISSING)
+        for key, value in fielddict.items():
+            if key in db_set:
+                self._columns[slots[key]][row] = value
+
+        self._raw_rows.append(row)
+        self._size += 1
+        self._valid = False
+
+    def append_record(self, record):
+        '''Add a row holding a copy of the values of a record.'''
+        if type(record) is not self.record_class:
+            raise TypeError('Cannot add a %s to a batch of %s.'
+                            % (type(record).__name__,
+                               self.record_class.__name__))
+        if record._schema is self._schema:
+            for column, value in zip(self._columns, record._values):
+                column.append(value)
+            if record._extra:
+                self._extra[self._size] = dict(record._extra)
+        else:
+            # The record has its own schema (see CloudRecord), so move its
+            # values by name.
+            slots = self._schema.slots
+            for column in self._columns:
+                column.append(_MISSING)
+            for key, value in record._record_content.items():
+                if key in slots:
+                    self._columns[slots[key]][self._size] = value
+                else:
+                    self._extra.setdefault(self._size, {})[key] = value
+        self._size += 1
+        self._valid = False
+
+    def select(self, rows):
+        '''
+        Returns a batch holding the rows with the given indices, in the
+        order given.
+        '''
+        self._convert()
+        batch = type(self)(self.record_class, self._schema)
+        batch._columns = [[column[row] for row in rows] for column in self._columns]
+        batch._extra = dict((new_row, self._extra[row])
+                            for new_row, row in enumerate(rows)
+                            if row in self._extra)
+        batch._size = len(rows)
+        batch._valid = self._valid
+        return batch
+
+    def validate(self):
+        '''
+        Check all the rows unless they have passed the checks and not been
+        changed since.
+        '''
+        self._convert()
+        if not self._valid:
+            self.record_class._check_batch(self)
+            self._valid = True
+
+    def to_records(self):
+        '''Returns a list with one record for each row of the batch.'''
+        self._convert()
+        record_class = self.record_class
+        schema = self._schema
+        extra = self._extra
+        valid = self._valid
+
+        records = []
+        for row, values in enumerate(zip(*self._columns)):
+            record = record_class.__new__(record_class)
+            record._schema = schema
+            record._values = list(values)
+            record._extra = extra.get(row)
+            record._valid = valid
+            records.append(record)
+        return records
+
+    def get_db_tuples(self, source=None):
+        '''
+        Returns the rows as a list of tuples of the DB fields, as
+        Record.get_db_tuple does for a single record.
+        '''
+        self.validate()
+        columns = []
+        for key, index, is_mandatory in self._schema.db_layout:
+            column = self._columns[index]
+            if _MISSING in column:
+                if is_mandatory:
+                    raise InvalidRecordException('Mandatory field: %s was not found' % key)
+                column = ['None' if value is _MISSING else value
+                          for value in column]
+            columns.append(column)
+        if source is not None:
+            columns.append([source] * self._size)
+        return list(zip(*columns))
+
+    def check_columns(self):
+        '''
+        Makes the checks of Record._check_fields a column at a time.
+        '''
+        columns = self._columns
+        schema = self._schema
+        mandatory = schema.mandatory_set
+
+        # Check that all the required information is present.
+        for key, index in schema.mandatory_slots:
+            for value in columns[index]:
+                if value is _MISSING or check_for_null(value):
+                    raise InvalidRecordException("Mandatory field " + key + " not specified.")
+
+        # Check that no extra fields are specified.
+        for key, index in schema.unexpected:
+            for value in columns[index]:
+                if value is not _MISSING:
+                    raise InvalidRecordException("Unexpected field " + key + " in message.")
+        for row_extra in self._extra.values():
+            for key in row_extra:
+                raise InvalidRecordException("Unexpected field " + key + " in message.")
+
+        # The string values are getting 'None' (not None!) instead of going
+        # into the DB as NULL.
+        for key, index in schema.msg_slots:
+            column = columns[index]
+            for row, value in enumerate(column):
+                if value is _MISSING or check_for_null(value):
+                    column[row] = "None"
+
+        # Null values for ints and floats become None -> NULL in the DB.
+        for slots, cast, kind, article in ((schema.int_slots, int, 'int', 'an integer'),
+                                           (schema.float_slots, float, 'decimal', 'a float')):
+            for key, index in slots:
+                column = columns[index]
+                for row, value in enumerate(column):
+                    if value is _MISSING:
+                        value = None
+                    try:
+                        cast(value)
+                    except (ValueError, TypeError):
+                        if key in mandatory:
+                            raise InvalidRecordException("Mandatory " + kind + " field " + key +
+                                                         " doesn't contain " + article + ".")
+                        elif check_for_null(value):
+                            column[row] = None
+                        elif value is not None:
+                            raise InvalidRecordException(kind.capitalize() + " field " + key +
+                                                         " doesn't contain " + article + ".")
+
+        # Null values for Datetimes become None -> NULL in the DB.
+        for key, index in schema.datetime_slots:
+            column = columns[index]
+            for row, value in enumerate(column):
+                if value is _MISSING:
+                    value = None
+                if not isinstance(value, datetime):
+                    if key in mandatory:
+                        raise InvalidRecordException("Mandatory datetime field " + key +
+                                                     " doesn't contain a datetime.")
+                    elif check_for_null(value):
+                        column[row] = None
+                    elif value is not None:
+                        raise InvalidRecordException("Datetime field " + key +
+                                                     " doesn't contain an datetime.")
+
+    def check_rows(self):
+        '''
+        Makes the checks of the record type's _check_fields on a record
+        made from each row in turn, keeping the values they leave behind.
+        '''
+        columns = self._columns
+        for row in range(self._size):
+            record = self._make_record(row)
+            record._check_fields()
+            for column, value in zip(columns, record._values):
+                column[row] = value
+
+    ##########################################################################
+    # Private methods below
+    ##########################################################################
+
+    def _make_record(self, row):
+        '''Returns a record holding the values of one row.'''
+        record = self.record_class.__new__(self.record_class)
+        record._schema = self._schema
+        record._values = [column[row] for column in self._columns]
+        record._extra = self._extra.get(row)
+        record._valid = self._valid
+        return record
+
+    def _convert(self):
+        '''
+        Converts the values of the raw rows to the types of their fields,
+        as Record.checked does for each field of a single record.
+        '''
+        rows = self._raw_rows
+        if not rows:
+            return
+
+        schema = self._schema
+        columns = self._columns
+        converters = schema.converters
+        for key in schema.db_fields:
+            column = columns[schema.slots[key]]
+            is_fqan = key in schema.fqan_set
+            is_mandatory = key in schema.mandatory_set
+            converter = converters.get(key)
+            if converter is None and key in schema.intern_set:
+                converter = _intern
+            for row in rows:
+                value = column[row]
+                if value is _MISSING:
+                    continue
+                try:
+                    # Convert null equivalents (except VOMS attributes) to None
+                    if not is_fqan and check_for_null(value):
+                        value = None
+                    if value is None:
+                        if is_mandatory:
+                            raise InvalidRecordException('NULL in mandatory field: %s' % str(key))
+                    elif converter is not None:
+                        value = converter(key, value)
+                except ValueError:
+                    raise InvalidRecordException('Invalid content for field: %s (%s)'
+                                                 % (key, str(value)))
+                column[row] = value
+
+        self._raw_rows = []
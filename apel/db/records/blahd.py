@@ -21,22 +21,16 @@ class BlahdRecord(Record):
     """
     Class to represent a record from BLAHP systems
     """
+    __slots__ = ()
 
-    def __init__(self):
-        '''
-        Initializer for BlahdRecord
-        '''
+    MANDATORY_FIELDS = []
 
-        Record.__init__(self)
+    DB_FIELDS = ["TimeStamp", "GlobalUserName", "FQAN",
+                 "VO", "VOGroup", "VORole", "CE", "GlobalJobId", "LrmsId",
+                 "Site", "ValidFrom", "ValidUntil", "Processed"]
 
-        self._mandatory_fields = []
+    INT_FIELDS = ["Processed"]
 
-        self._db_fields = ["TimeStamp", "GlobalUserName", "FQAN",
-                        "VO", "VOGroup", "VORole", "CE", "GlobalJobId", "LrmsId",
-                        "Site", "ValidFrom", "ValidUntil", "Processed"]
+    ALL_FIELDS = DB_FIELDS
 
-        self._int_fields = ["Processed"]
-
-        self._all_fields = self._db_fields
-
-        self._datetime_fields = ["TimeStamp", "ValidFrom", "ValidUntil"]
+    DATETIME_FIELDS = ["TimeStamp", "ValidFrom", "ValidUntil"]
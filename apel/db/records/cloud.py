@@ -19,7 +19,7 @@
 from future.builtins import str
 
 from apel.db.records import Record, InvalidRecordException
-from apel.common import parse_fqan
+from apel.common import decode_fqan
 from datetime import datetime, timedelta
 
 
@@ -31,36 +31,33 @@ class CloudRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
-    def __init__(self):
-        '''Provide the necessary lists containing message information.'''
+    __slots__ = ()
 
-        Record.__init__(self)
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["VMUUID", "SiteName"]
 
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["VMUUID", "SiteName"]
+    # This list allows us to specify the order of lines when we construct records.
+    MSG_FIELDS  = ["RecordCreateTime", "VMUUID", "SiteName", "CloudComputeService", "MachineName",
+                   "LocalUserId", "LocalGroupId", "GlobalUserName", "FQAN",
+                   "Status", "StartTime", "EndTime", "SuspendDuration",
+                   "WallDuration", "CpuDuration", "CpuCount",
+                   "NetworkType", "NetworkInbound", "NetworkOutbound", "PublicIPCount",
+                   "Memory", "Disk", "BenchmarkType", "Benchmark",
+                   "StorageRecordId", "ImageId", "CloudType"]
 
-        # This list allows us to specify the order of lines when we construct records.
-        self._msg_fields  = ["RecordCreateTime", "VMUUID", "SiteName", "CloudComputeService", "MachineName",
-                             "LocalUserId", "LocalGroupId", "GlobalUserName", "FQAN",
-                             "Status", "StartTime", "EndTime", "SuspendDuration",
-                             "WallDuration", "CpuDuration", "CpuCount",
-                             "NetworkType", "NetworkInbound", "NetworkOutbound", "PublicIPCount",
-                             "Memory", "Disk", "BenchmarkType", "Benchmark",
-                             "StorageRecordId", "ImageId", "CloudType"]
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = MSG_FIELDS[:9] + ['VO', 'VOGroup', 'VORole'] + MSG_FIELDS[9:]
+    ALL_FIELDS = DB_FIELDS
 
-        # This list specifies the information that goes in the database.
-        self._db_fields = self._msg_fields[:9] + ['VO', 'VOGroup', 'VORole'] + self._msg_fields[9:]
-        self._all_fields = self._db_fields
+    IGNORED_FIELDS = ["UpdateTime", "MeasurementTime",
+                      "MeasurementMonth", "MeasurementYear"]
 
-        self._ignored_fields = ["UpdateTime", "MeasurementTime",
-                                "MeasurementMonth", "MeasurementYear"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = [ "SuspendDuration", "WallDuration", "CpuDuration",
+                   "NetworkInbound", "NetworkOutbound", "PublicIPCount", "Memory", "Disk"]
 
-        # Fields which will have an integer stored in them
-        self._int_fields = [ "SuspendDuration", "WallDuration", "CpuDuration",
-                             "NetworkInbound", "NetworkOutbound", "PublicIPCount", "Memory", "Disk"]
-
-        self._float_fields = ['CpuCount', 'Benchmark']
-        self._datetime_fields = ["RecordCreateTime", "StartTime", "EndTime"]
+    FLOAT_FIELDS = ['CpuCount', 'Benchmark']
+    DATETIME_FIELDS = ["RecordCreateTime", "StartTime", "EndTime"]
 
     def _check_fields(self):
         '''
@@ -71,7 +68,7 @@ class CloudRecord(Record):
 
         # Extract the relevant information from the user fqan.
         # Keep the fqan itself as other methods in the class use it.
-        role, group, vo = parse_fqan(self._record_content['FQAN'])
+        role, group, vo = decode_fqan(self._record_content['FQAN'])
         # We can't / don't put NULL in the database, so we use 'None'
         if role is None:
             role = 'None'
@@ -105,6 +102,29 @@ class CloudRecord(Record):
         # Check the values of StartTime and EndTime
         # self._check_start_end_times()
 
+    @classmethod
+    def _check_batch(cls, batch):
+        '''
+        Makes the checks of _check_fields a column at a time.
+        '''
+        batch.check_columns()
+
+        roles = batch.column('VORole')
+        groups = batch.column('VOGroup')
+        vos = batch.column('VO')
+        for row, fqan in enumerate(batch.column('FQAN')):
+            role, group, vo = decode_fqan(fqan)
+            roles[row] = 'None' if role is None else role
+            groups[row] = 'None' if group is None else group
+            vos[row] = 'None' if vo is None else vo
+
+        # Benchmark and CpuCount are NOT NULL in the DB, see _check_fields.
+        for name in ('Benchmark', 'CpuCount'):
+            column = batch.column(name)
+            for row, value in enumerate(column):
+                if value is None:
+                    column[row] = 0.0
+
 
     def _check_start_end_times(self):
         '''Checks the values of StartTime and EndTime in _record_content.
@@ -136,7 +156,7 @@ class CloudRecord(Record):
     '''
     Move a field from one type category to another.
 
-    This updates the internal type lists by removing `field_name` from the
+    This updates the record's type lists by removing `field_name` from the
     list associated with `from_type` and appending it to the list associated
     with `to_type`. The method only performs the change if the field is
     currently present in the source type list.
@@ -145,6 +165,8 @@ class CloudRecord(Record):
     - No action is taken if from_type is not a valid key in the internal
       type mapping or if the field is not present in the source list.
     - This method assumes that to_type is a valid key in the type map.
+    - The class schema is shared, so this switches only this record to a
+      (cached) variant of it.
     '''
     def change_field_type(self, field_name, from_type, to_type):
         type_map = {
@@ -153,5 +175,7 @@ class CloudRecord(Record):
         }
 
         if from_type in type_map and field_name in type_map[from_type]:
-            type_map[from_type].remove(field_name)
-            type_map[to_type].append(field_name)
+            self._set_schema(self._schema.replace(**{
+                from_type: [f for f in type_map[from_type] if f != field_name],
+                to_type: type_map[to_type] + (field_name,)
+            }))
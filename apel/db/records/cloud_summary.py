@@ -27,34 +27,31 @@ class CloudSummaryRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
-    def __init__(self):
-        '''Provide the necessary lists containing message information.'''
-
-        Record.__init__(self)
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = ['SiteName', 'Month', 'Year', 'NumberOfVMs']
-
-        # This list allows us to specify the order of lines when we construct records.
-        self._msg_fields = ['SiteName', 'CloudComputeService', 'Month', 'Year',
-                            'GlobalUserName', 'VO', 'VOGroup', 'VORole',
-                            'Status', 'CloudType', 'ImageId',
-                            'EarliestStartTime', 'LatestStartTime',
-                            'WallDuration', 'CpuDuration', 'CpuCount',
-                            'NetworkInbound', 'NetworkOutbound',
-                            'Memory', 'Disk',
-                            'BenchmarkType', 'Benchmark', 'NumberOfVMs']
-
-        # This list specifies the information that goes in the database.
-        self._db_fields = self._msg_fields
-        self._all_fields = self._db_fields
-
-        self._ignored_fields = ['UpdateTime']
-
-        # Fields which will have an integer stored in them
-        self._int_fields = ['Month', 'Year', 'WallDuration', 'CpuDuration',
-                            'NetworkInbound', 'NetworkOutbound',
-                            'Memory', 'Disk', 'NumberOfVMs']
-
-        self._float_fields = ['CpuCount', 'Benchmark']
-        self._datetime_fields = ['EarliestStartTime', 'LatestStartTime']
+    __slots__ = ()
+
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ['SiteName', 'Month', 'Year', 'NumberOfVMs']
+
+    # This list allows us to specify the order of lines when we construct records.
+    MSG_FIELDS = ['SiteName', 'CloudComputeService', 'Month', 'Year',
+                  'GlobalUserName', 'VO', 'VOGroup', 'VORole',
+                  'Status', 'CloudType', 'ImageId',
+                  'EarliestStartTime', 'LatestStartTime',
+                  'WallDuration', 'CpuDuration', 'CpuCount',
+                  'NetworkInbound', 'NetworkOutbound',
+                  'Memory', 'Disk',
+                  'BenchmarkType', 'Benchmark', 'NumberOfVMs']
+
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = MSG_FIELDS
+    ALL_FIELDS = DB_FIELDS
+
+    IGNORED_FIELDS = ['UpdateTime']
+
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ['Month', 'Year', 'WallDuration', 'CpuDuration',
+                  'NetworkInbound', 'NetworkOutbound',
+                  'Memory', 'Disk', 'NumberOfVMs']
+
+    FLOAT_FIELDS = ['CpuCount', 'Benchmark']
+    DATETIME_FIELDS = ['EarliestStartTime', 'LatestStartTime']
@@ -22,20 +22,17 @@ class EventRecord(Record):
     """
     Class to represent a batch system record.
     """
+    __slots__ = ()
 
-    def __init__(self):
+    MANDATORY_FIELDS = []
 
-        Record.__init__(self)
+    DB_FIELDS = ["Site", "JobName", "LocalUserID", "LocalUserGroup",
+                 "WallDuration", "CpuDuration", "StartTime", "StopTime", "Infrastructure",
+                 "MachineName", "Queue", "MemoryReal", "MemoryVirtual", "Processors", "NodeCount"]
 
-        self._mandatory_fields = []
+    ALL_FIELDS = DB_FIELDS
 
-        self._db_fields = ["Site", "JobName", "LocalUserID", "LocalUserGroup",
-                           "WallDuration", "CpuDuration", "StartTime", "StopTime", "Infrastructure",
-                           "MachineName", "Queue", "MemoryReal", "MemoryVirtual", "Processors", "NodeCount"]
+    INT_FIELDS = ["WallDuration", "CpuDuration", "MemoryReal",
+                  "MemoryVirtual", "Processors", "NodeCount"]
 
-        self._all_fields = self._db_fields
-
-        self._int_fields = ["WallDuration", "CpuDuration", "MemoryReal",
-                            "MemoryVirtual", "Processors", "NodeCount"]
-
-        self._datetime_fields = ["StartTime", "StopTime"]
+    DATETIME_FIELDS = ["StartTime", "StopTime"]
@@ -23,22 +23,13 @@ class GroupAttributeRecord(Record):
 
     Single StarRecord can have multiple GroupAttributeRecords.
     '''
+    __slots__ = ()
 
     DB_FIELDS = ["StarRecordID", "AttributeType", "AttributeValue"]
     MANDATORY_FIELDS = ["StarRecordID"]
 
     ALL_FIELDS = DB_FIELDS
 
-    def __init__(self):
-        '''
-        Initializer for GroupAttributeRecord
-        '''
-        Record.__init__(self)
-
-        self._db_fields = self.DB_FIELDS
-        self._mandatory_fields = self.MANDATORY_FIELDS
-        self._all_fields = self._db_fields
-
     def get_db_tuple(self, source=None):
         """
         Return record contents as tuple ignoring the 'source' keyword argument.
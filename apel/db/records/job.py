@@ -16,12 +16,12 @@
     @author Will Rogers, Konrad Jopek
 '''
 
-from future.builtins import str, super
+from future.builtins import str, super, zip
 
 from apel.db.records import Record, InvalidRecordException
 from datetime import datetime, timedelta
 from xml.dom.minidom import Document
-from apel.common import parse_fqan
+from apel.common import decode_fqan
 import time
 
 WITHHELD_DN = 'withheld'
@@ -35,47 +35,43 @@ class JobRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
+    __slots__ = ()
 
-    def __init__(self):
-        '''Provide the necessary lists containing message information.'''
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "LocalJobId",
+                        "WallDuration", "CpuDuration",
+                        "StartTime", "EndTime"]
 
-        super().__init__()
+    # This list allows us to specify the order of lines when we construct records.
+    MSG_FIELDS  = ["Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
+                   "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration",
+                   "CpuDuration", "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription", "InfrastructureType",
+                   "MemoryReal", "MemoryVirtual", "ServiceLevelType",
+                   "ServiceLevel"]
 
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "LocalJobId",
-                                  "WallDuration", "CpuDuration",
-                                  "StartTime", "EndTime"]
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = ["Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
+                 "GlobalUserName", "FQAN", "VO",
+                 "VOGroup", "VORole", "WallDuration", "CpuDuration", "Processors",
+                 "NodeCount", "StartTime", "EndTime", "InfrastructureDescription", "InfrastructureType", "MemoryReal",
+                 "MemoryVirtual", "ServiceLevelType", "ServiceLevel"]
 
-        # This list allows us to specify the order of lines when we construct records.
-        self._msg_fields  = ["Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
-                       "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration",
-                       "CpuDuration", "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription", "InfrastructureType",
-                       "MemoryReal", "MemoryVirtual", "ServiceLevelType",
-                       "ServiceLevel"]
+    # Fields which are accepted but currently ignored.
+    IGNORED_FIELDS = ["SubmitHostType", "UpdateTime"]
 
-        # This list specifies the information that goes in the database.
-        self._db_fields = ["Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
-                       "GlobalUserName", "FQAN", "VO",
-                       "VOGroup", "VORole", "WallDuration", "CpuDuration", "Processors",
-                       "NodeCount", "StartTime", "EndTime", "InfrastructureDescription", "InfrastructureType", "MemoryReal",
-                       "MemoryVirtual", "ServiceLevelType", "ServiceLevel"]
+    ALL_FIELDS = MSG_FIELDS + IGNORED_FIELDS
 
-        # Fields which are accepted but currently ignored.
-        self._ignored_fields = ["SubmitHostType", "UpdateTime"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["WallDuration", "CpuDuration", "Processors",
+                  "NodeCount", "MemoryReal",
+                  "MemoryVirtual"]
 
-        self._all_fields = self._msg_fields + self._ignored_fields
+    FLOAT_FIELDS = ["ServiceLevel"]
 
-        # Fields which will have an integer stored in them
-        self._int_fields = ["WallDuration", "CpuDuration", "Processors",
-                            "NodeCount", "MemoryReal",
-                            "MemoryVirtual"]
+    DATETIME_FIELDS = ["StartTime", "EndTime"]
 
-        self._float_fields = ["ServiceLevel"]
-
-        self._datetime_fields = ["StartTime", "EndTime"]
-
-        # Acceptable values for the ServiceLevelType field, not case-sensitive
-        self._valid_slts = ["si2k", "hepspec", "hepscore23"]
+    # Acceptable values for the ServiceLevelType field, not case-sensitive
+    _valid_slts = ["si2k", "hepspec", "hepscore23"]
 
     def _check_fields(self):
         '''
@@ -88,7 +84,7 @@ class JobRecord(Record):
         # Keep the fqan itself as other methods in the class use it.
         if self._record_content['FQAN'] not in ('None', None):
 
-            role, group, vo = parse_fqan(self._record_content['FQAN'])
+            role, group, vo = decode_fqan(self._record_content['FQAN'])
             # We can't / don't put NULL in the database, so we use 'None'
             if role is None:
                 role = 'None'
@@ -114,6 +110,37 @@ class JobRecord(Record):
         # Check the values of StartTime and EndTime
         self._check_start_end_times()
 
+    @classmethod
+    def _check_batch(cls, batch):
+        '''
+        Makes the checks of _check_fields a column at a time.
+        '''
+        batch.check_columns()
+
+        fqans = batch.column('FQAN')
+        roles = batch.column('VORole')
+        groups = batch.column('VOGroup')
+        vos = batch.column('VO')
+        for row, fqan in enumerate(fqans):
+            if fqan not in ('None', None):
+                role, group, vo = decode_fqan(fqan)
+                roles[row] = 'None' if role is None else role
+                groups[row] = 'None' if group is None else group
+                vos[row] = 'None' if vo is None else vo
+
+        slts = batch.column('ServiceLevelType')
+        sls = batch.column('ServiceLevel')
+        for row, (slt, sl) in enumerate(zip(slts, sls)):
+            slts[row], sls[row] = cls._check_factor(slt, sl)
+
+        # add two days to prevent timezone problems
+        tomorrow = datetime.now() + timedelta(2)
+        for start, end in zip(batch.column('StartTime'), batch.column('EndTime')):
+            if end < start:
+                raise InvalidRecordException("EndTime is before StartTime.")
+            if end > tomorrow:
+                raise InvalidRecordException("Epoch time " + str(end) + " is in the future.")
+
 
     def _check_start_end_times(self):
         '''Checks the values of StartTime and EndTime in _record_content.
@@ -139,7 +166,8 @@ class JobRecord(Record):
             raise InvalidRecordException("Cannot parse an integer from StartTime or EndTime.")
 
 
-    def _check_factor(self, sfu, sf):
+    @classmethod
+    def _check_factor(cls, sfu, sf):
         '''
         Check for the validity of the ScalingFactorUnit and ScalingFactor fields.
         We accept neither field included or both.  If only one of the fields is
@@ -161,7 +189,7 @@ class JobRecord(Record):
             if sfu == 'None':
                 raise InvalidRecordException('Unit but not value supplied for ScalingFactor.')
             else:
-                if sfu.lower() not in self._valid_slts:
+                if sfu.lower() not in cls._valid_slts:
                     raise InvalidRecordException('ScalingFactorUnit ' + sfu +
                                 ' not valid.')
 
@@ -325,50 +353,43 @@ class JobRecord04(JobRecord):
     in the message fields, as this is extracted from the associative array
     in ServiceLevel before putting into the database.
     """
-
-    def __init__(self):
-        """Provide the necessary lists containing message information."""
-
-        super().__init__()
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "LocalJobId", "WallDuration",
-                                  "CpuDuration", "StartTime", "EndTime"]
-
-        # This list allows us to specify the order of lines when we construct records.
-        # It differs from JobRecord by lacking a separate ServiceLevelType field
-        # as this is included in the dict for ServiceLevel.
-        self._msg_fields  = [
-            "Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
-            "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration", "CpuDuration",
-            "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription",
-            "InfrastructureType", "MemoryReal", "MemoryVirtual", "ServiceLevel"
-        ]
-
-        # This list specifies the information that goes in the database.
-        self._db_fields = [
-            "Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
-            "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration", "CpuDuration",
-            "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription",
-            "InfrastructureType", "MemoryReal", "MemoryVirtual", "ServiceLevelType",
-            "ServiceLevel"
-        ]
-
-        # Fields which are accepted but currently ignored.
-        self._ignored_fields = ["SubmitHostType", "UpdateTime"]
-
-        self._all_fields = self._db_fields + self._ignored_fields
-
-        # Fields which will have an integer stored in them
-        self._int_fields = ["WallDuration", "CpuDuration", "Processors", "NodeCount",
-                            "MemoryReal", "MemoryVirtual"]
-
-        self._float_fields = ["ServiceLevel"]
-
-        self._datetime_fields = ["StartTime", "EndTime"]
-
-        # Fields which should contain associative arrays in the v0.4 message
-        self._dict_fields = ["ServiceLevel"]
-
-        # Acceptable values for the ServiceLevelType field, not case-sensitive
-        self._valid_slts = ["si2k", "hepspec", "hepscore23"]
+    __slots__ = ()
+
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "LocalJobId", "WallDuration",
+                        "CpuDuration", "StartTime", "EndTime"]
+
+    # This list allows us to specify the order of lines when we construct records.
+    # It differs from JobRecord by lacking a separate ServiceLevelType field
+    # as this is included in the dict for ServiceLevel.
+    MSG_FIELDS  = [
+        "Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
+        "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration", "CpuDuration",
+        "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription",
+        "InfrastructureType", "MemoryReal", "MemoryVirtual", "ServiceLevel"
+    ]
+
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = [
+        "Site", "SubmitHost", "MachineName", "Queue", "LocalJobId", "LocalUserId",
+        "GlobalUserName", "FQAN", "VO", "VOGroup", "VORole", "WallDuration", "CpuDuration",
+        "Processors", "NodeCount", "StartTime", "EndTime", "InfrastructureDescription",
+        "InfrastructureType", "MemoryReal", "MemoryVirtual", "ServiceLevelType",
+        "ServiceLevel"
+    ]
+
+    # Fields which are accepted but currently ignored.
+    IGNORED_FIELDS = ["SubmitHostType", "UpdateTime"]
+
+    ALL_FIELDS = DB_FIELDS + IGNORED_FIELDS
+
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["WallDuration", "CpuDuration", "Processors", "NodeCount",
+                  "MemoryReal", "MemoryVirtual"]
+
+    FLOAT_FIELDS = ["ServiceLevel"]
+
+    DATETIME_FIELDS = ["StartTime", "EndTime"]
+
+    # Fields which should contain associative arrays in the v0.4 message
+    DICT_FIELDS = ["ServiceLevel"]
@@ -32,50 +32,46 @@ class NormalisedSummaryRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
-
-    def __init__(self):
-        '''Populate fields required to load the message.'''
-
-        super().__init__()
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "Month", "Year", "WallDuration",
-                                  "CpuDuration", "NormalisedWallDuration",
-                                  "NormalisedCpuDuration", "NumberOfJobs"]
-
-        # This list allows us to specify the order of lines when we construct
-        # records. We use the field "Infrastructure" rather than the previously
-        # used "InfrastructureType"
-        self._msg_fields = ["Site", "Month", "Year", "GlobalUserName", "VO",
-                            "VOGroup", "VORole", "SubmitHost", "Infrastructure",
-                            "InfrastructureDescription", "NodeCount",
-                            "Processors", "EarliestEndTime",
-                            "LatestEndTime", "WallDuration", "CpuDuration",
-                            "NormalisedWallDuration", "NormalisedCpuDuration",
-                            "NumberOfJobs"]
-
-        # Fields which will have an integer stored in them
-        self._int_fields = ["Month", "Year", "NodeCount", "Processors",
-                            "WallDuration", "CpuDuration",
-                            "NormalisedWallDuration", "NormalisedCpuDuration",
-                            "NumberOfJobs"]
-
-        self._datetime_fields = ["EarliestEndTime", "LatestEndTime"]
-
-        self._ignored_fields = ["UpdateTime"]
-
-        # This list specifies the information that goes in the database. It includes
-        # the additional ServiceLevelType field.
-        self._db_fields = ["Site", "Month", "Year", "GlobalUserName", "VO",
-                           "VOGroup", "VORole", "SubmitHost",
-                           "Infrastructure", "InfrastructureDescription",
-                           "ServiceLevelType",
-                           "NodeCount", "Processors", "EarliestEndTime",
-                           "LatestEndTime", "WallDuration", "CpuDuration",
-                           "NormalisedWallDuration", "NormalisedCpuDuration",
-                           "NumberOfJobs"]
-        # All allowed fields.
-        self._all_fields = self._db_fields
+    __slots__ = ()
+
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "Month", "Year", "WallDuration",
+                        "CpuDuration", "NormalisedWallDuration",
+                        "NormalisedCpuDuration", "NumberOfJobs"]
+
+    # This list allows us to specify the order of lines when we construct
+    # records. We use the field "Infrastructure" rather than the previously
+    # used "InfrastructureType"
+    MSG_FIELDS = ["Site", "Month", "Year", "GlobalUserName", "VO",
+                  "VOGroup", "VORole", "SubmitHost", "Infrastructure",
+                  "InfrastructureDescription", "NodeCount",
+                  "Processors", "EarliestEndTime",
+                  "LatestEndTime", "WallDuration", "CpuDuration",
+                  "NormalisedWallDuration", "NormalisedCpuDuration",
+                  "NumberOfJobs"]
+
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["Month", "Year", "NodeCount", "Processors",
+                  "WallDuration", "CpuDuration",
+                  "NormalisedWallDuration", "NormalisedCpuDuration",
+                  "NumberOfJobs"]
+
+    DATETIME_FIELDS = ["EarliestEndTime", "LatestEndTime"]
+
+    IGNORED_FIELDS = ["UpdateTime"]
+
+    # This list specifies the information that goes in the database. It includes
+    # the additional ServiceLevelType field.
+    DB_FIELDS = ["Site", "Month", "Year", "GlobalUserName", "VO",
+                 "VOGroup", "VORole", "SubmitHost",
+                 "Infrastructure", "InfrastructureDescription",
+                 "ServiceLevelType",
+                 "NodeCount", "Processors", "EarliestEndTime",
+                 "LatestEndTime", "WallDuration", "CpuDuration",
+                 "NormalisedWallDuration", "NormalisedCpuDuration",
+                 "NumberOfJobs"]
+    # All allowed fields.
+    ALL_FIELDS = DB_FIELDS
 
     def _check_fields(self):
         '''
@@ -254,47 +250,43 @@ class NormalisedSummaryRecord04(NormalisedSummaryRecord):
     associative array in the Normalised...Duration fields before putting
     into the database.
     """
-
-    def __init__(self):
-        """Provide the necessary lists containing message information."""
-
-        super().__init__()
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "Month", "Year", "WallDuration", "CpuDuration",
-                                  "NormalisedWallDuration", "NormalisedCpuDuration",
-                                  "NumberOfJobs"]
-
-        # This list allows us to specify the order of lines when we construct
-        # records. We use the field "Infrastructure" rather than the previously
-        # used "InfrastructureType"
-        self._msg_fields = [
-            "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
-            "Infrastructure", "InfrastructureDescription", "NodeCount", "Processors", "EarliestEndTime",
-            "LatestEndTime", "WallDuration", "CpuDuration", "NormalisedWallDuration",
-            "NormalisedCpuDuration", "NumberOfJobs"
-        ]
-
-        self._ignored_fields = ["UpdateTime"]
-
-        # This list specifies the information that goes in the database.
-        # It includes the extra ServiceLevelType field that's extracted from the dict fields.
-        self._db_fields = [
-            "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
-            "Infrastructure", "InfrastructureDescription", "ServiceLevelType", "NodeCount", "Processors",
-            "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NormalisedWallDuration",
-            "NormalisedCpuDuration", "NumberOfJobs"
-        ]
-        # All allowed fields.
-        self._all_fields = self._db_fields
-
-        # Fields which will have an integer stored in them
-        self._int_fields = ["Month", "Year", "NodeCount", "Processors",
-                            "WallDuration", "CpuDuration",
-                            "NormalisedWallDuration", "NormalisedCpuDuration",
-                            "NumberOfJobs"]
-
-        self._datetime_fields = ["EarliestEndTime", "LatestEndTime"]
-
-        # Fields which should contain associative arrays in the v0.4 message
-        self._dict_fields = ["NormalisedWallDuration", "NormalisedCpuDuration"]
+    __slots__ = ()
+
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "Month", "Year", "WallDuration", "CpuDuration",
+                        "NormalisedWallDuration", "NormalisedCpuDuration",
+                        "NumberOfJobs"]
+
+    # This list allows us to specify the order of lines when we construct
+    # records. We use the field "Infrastructure" rather than the previously
+    # used "InfrastructureType"
+    MSG_FIELDS = [
+        "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
+        "Infrastructure", "InfrastructureDescription", "NodeCount", "Processors", "EarliestEndTime",
+        "LatestEndTime", "WallDuration", "CpuDuration", "NormalisedWallDuration",
+        "NormalisedCpuDuration", "NumberOfJobs"
+    ]
+
+    IGNORED_FIELDS = ["UpdateTime"]
+
+    # This list specifies the information that goes in the database.
+    # It includes the extra ServiceLevelType field that's extracted from the dict fields.
+    DB_FIELDS = [
+        "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
+        "Infrastructure", "InfrastructureDescription", "ServiceLevelType", "NodeCount", "Processors",
+        "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NormalisedWallDuration",
+        "NormalisedCpuDuration", "NumberOfJobs"
+    ]
+    # All allowed fields.
+    ALL_FIELDS = DB_FIELDS
+
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["Month", "Year", "NodeCount", "Processors",
+                  "WallDuration", "CpuDuration",
+                  "NormalisedWallDuration", "NormalisedCpuDuration",
+                  "NumberOfJobs"]
+
+    DATETIME_FIELDS = ["EarliestEndTime", "LatestEndTime"]
+
+    # Fields which should contain associative arrays in the v0.4 message
+    DICT_FIELDS = ["NormalisedWallDuration", "NormalisedCpuDuration"]
@@ -14,7 +14,31 @@
    limitations under the License.
 '''
 
+from collections import namedtuple
+
 from apel.db.records import Record
+from apel.db.records.record import check_for_null
+
+
+class ProcessedFile(namedtuple('ProcessedFile',
+                               ['FileName', 'Hash', 'StopLine', 'Parsed',
+                                'StopByte', 'PrefixHash', 'FileSize',
+                                'ModifiedTime', 'Inode'])):
+    '''
+    The fields of a ProcessedRecord which the parser looks files up by,
+    without its host name.  Reading these, rather than records, is enough
+    to decide which files need parsing.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row):
+        '''
+        Returns the ProcessedFile of a row of values in the order of its
+        fields, with the null equivalents written to the DB as None.
+        '''
+        return cls(*[None if check_for_null(value) else value for value in row])
+
 
 class ProcessedRecord(Record):
     '''
@@ -23,14 +47,34 @@ class ProcessedRecord(Record):
 
     This class is used for avoiding reparsing files
     that have been already parsed.
+
+    For an uncompressed file, StopByte is the offset just after the last
+    complete line parsed and PrefixHash the MD5 hash of the bytes before it,
+    so that parsing can resume there if the file grows.
+
+    FileSize, ModifiedTime (in seconds since the epoch) and Inode identify
+    the file as it was when parsed, so that an unchanged file can be
+    skipped without reading it.
     '''
-    def __init__(self):
-        '''
-        Initializes ProcessedRecord
-        '''
-        Record.__init__(self)
+    __slots__ = ()
+
+    DB_FIELDS = ["HostName", "FileName", "Hash", "StopLine", "Parsed",
+                 "StopByte", "PrefixHash", "FileSize", "ModifiedTime",
+                 "Inode"]
+    INT_FIELDS = ["StopLine", "Parsed", "StopByte", "FileSize",
+                  "ModifiedTime", "Inode"]
+    ALL_FIELDS = DB_FIELDS
 
-        self._db_fields = ["HostName", "FileName", "Hash", "StopLine", "Parsed"]
-        self._int_fields = ["StopLine", "Parsed"]
+    @classmethod
+    def from_processed_file(cls, host_name, processed_file):
+        '''Returns a ProcessedRecord of a ProcessedFile of the host host_name.'''
+        record = cls()
+        record.set_field('HostName', host_name)
+        for key, value in zip(ProcessedFile._fields, processed_file):
+            record.set_field(key, value)
+        return record
 
-        self._all_fields = self._db_fields
+    def to_processed_file(self):
+        '''Returns the ProcessedFile of the record.'''
+        return ProcessedFile.from_row([self.get_field(key)
+                                       for key in ProcessedFile._fields])
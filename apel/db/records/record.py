@@ -26,6 +26,11 @@ from datetime import datetime
 import time
 import calendar
 import logging
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2
+    from collections import MutableMapping
 
 log = logging.getLogger(LOGGER_ID)
 
@@ -36,11 +41,267 @@ def get_unix_time(py_date):
     '''Converts a python datetime object into Unix time.'''
     return time.mktime(py_date.timetuple())
 
+# The message values which we accept as null, in lower case.
+NULL_VALUES = frozenset(['none', 'null', ''])
+
 def check_for_null(value):
     '''Check if a string is one of the different message values
     which we accept as null.  This returns True if value is None.'''
-    nulls = ['none', 'null', '']
-    return str(value).lower() in nulls
+    return str(value).lower() in NULL_VALUES
+
+def _to_int(name, value):
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidRecordException('Invalid int value %s in field %s' % (value, name))
+
+def _to_float(name, value):
+    try:
+        return float(value)
+    except ValueError:
+        raise InvalidRecordException('Invalid float value %s in field %s' % (value, name))
+
+def _to_datetime(name, value):
+    # if it is already a datetime, return it
+    if type(value) == datetime:
+        return value
+    # We accept ints or floats as seconds since the epoch
+    try:
+        value = int(value)
+    except ValueError:
+        # Not a datetime or an int, so it has to be a string representation.
+        # We get ISO format dates when parsing CAR or StAR.
+        isofmt = '%Y-%m-%dT%H:%M:%S%Z' # %Z denotes timezone
+        # A trailing Z in the ISO format denotes UTC.  We make this explicit for parsing.
+        dtval = value.replace('Z', 'UTC')
+        try:
+            dt = datetime.utcfromtimestamp(time.mktime(time.strptime(dtval, isofmt)))
+            return dt
+        except (ValueError, OverflowError, OSError): # Failed to parse timestamp
+            raise InvalidRecordException('Unknown datetime format!: %s' % value)
+    try:
+        return datetime.utcfromtimestamp(value)
+    except (ValueError, OverflowError, OSError) as e: # Failed to parse timestamp
+        # Given timestamp is probably out of range
+        raise InvalidRecordException(e)
+
+def _to_dict(name, value):
+    try:
+        return Record._clean_up_dict(value)
+    except ValueError as e:
+        raise InvalidRecordException(e)
+
+# Marks a field which has not been set in a record's value array.
+_MISSING = object()
+
+# The values seen in INTERN_FIELDS, so that all the records which repeat a
+# value hold the same string.
+_interned = {}
+# The pool is emptied when it reaches this size, in case a field turns out
+# to have more distinct values than expected.
+INTERN_POOL_SIZE = 10000
+
+def intern_value(value):
+    '''
+    Returns the pooled copy of value, adding value to the pool if it is
+    the first copy.
+    '''
+    try:
+        return _interned[value]
+    except KeyError:
+        if len(_interned) >= INTERN_POOL_SIZE:
+            _interned.clear()
+        _interned[value] = value
+        return value
+
+# Type converters used by Record.checked, keyed by field category.
+CONVERTERS = {'int': _to_int,
+              'float': _to_float,
+              'datetime': _to_datetime,
+              'dict': _to_dict}
+
+
+class RecordSchema(object):
+    '''
+    Precompiled description of the fields of one record type.
+
+    A schema is built once per Record subclass from its *_FIELDS class
+    attributes and is shared by every instance of that class, so field
+    lookups on the loader and unloader paths are set or dict lookups rather
+    than list scans.  A schema must not be modified: a per-instance change
+    (e.g. CloudRecord.change_field_type) derives a new schema with replace().
+    '''
+    # Field categories, each built from the matching <CATEGORY>_FIELDS
+    # attribute of a Record class.
+    CATEGORIES = ('mandatory', 'msg', 'db', 'ignored', 'all',
+                  'int', 'float', 'datetime', 'dict', 'fqan', 'intern')
+
+    # Schemas made by replace(), keyed by their fields.
+    _variants = {}
+
+    def __init__(self, **fields):
+        '''
+        Takes one iterable of field names per category.  For each category
+        the names are kept in order as <category>_fields and as a frozenset
+        in <category>_set.
+        '''
+        for category in self.CATEGORIES:
+            names = tuple(fields.pop(category, ()))
+            setattr(self, category + '_fields', names)
+            setattr(self, category + '_set', frozenset(names))
+        if fields:
+            raise TypeError('Unknown field categories: %s' % ', '.join(fields))
+
+        # Map each typed field to its converter.  Categories are applied in
+        # reverse order of precedence so that a field listed twice gets the
+        # same type as it did with the if/elif chain this replaces.
+        self.converters = {}
+        for category in ('dict', 'datetime', 'float', 'int'):
+            for name in getattr(self, category + '_fields'):
+                self.converters[name] = CONVERTERS[category]
+
+        # The fields a record of this type can hold, each given a fixed
+        # position in the record's value array.  Ignored fields are never
+        # stored; anything else ends up in the record's overflow dict.
+        content_fields = []
+        for category in ('db', 'msg', 'all', 'int', 'float', 'datetime',
+                         'dict', 'mandatory'):
+            for name in getattr(self, category + '_fields'):
+                if name not in content_fields:
+                    content_fields.append(name)
+        self.content_fields = tuple(content_fields)
+        self.slots = dict((name, index)
+                          for index, name in enumerate(self.content_fields))
+
+        # Precomputed orderings used to build messages and DB tuples.
+        self.msg_layout = tuple((key,
+                                 self.slots[key],
+                                 key in self.datetime_set,
+                                 key in self.dict_set,
+                                 key in self.mandatory_set)
+                                for key in self.msg_fields)
+        self.db_layout = tuple((key, self.slots[key], key in self.mandatory_set)
+                               for key in self.db_fields)
+        # (field, position) pairs for the checks in Record._check_fields.
+        for category in ('mandatory', 'msg', 'int', 'float', 'datetime'):
+            setattr(self, category + '_slots',
+                    tuple((name, self.slots[name])
+                          for name in getattr(self, category + '_fields')))
+        # Stored fields which are nonetheless not allowed in a record.
+        self.unexpected = tuple((name, self.slots[name])
+                                for name in self.content_fields
+                                if name not in self.all_set)
+
+    @classmethod
+    def from_class(cls, record_class):
+        '''Build a schema from the *_FIELDS attributes of a Record class.'''
+        return cls(**dict((category, getattr(record_class, category.upper() + '_FIELDS'))
+                          for category in cls.CATEGORIES))
+
+    def replace(self, **changes):
+        '''
+        Return a schema with the given categories replaced.
+
+        Variants are cached, so all the records that end up with the same
+        fields share a single schema.
+        '''
+        fields = dict((category, getattr(self, category + '_fields'))
+                      for category in self.CATEGORIES)
+        fields.update(changes)
+        key = tuple(tuple(fields[category]) for category in self.CATEGORIES)
+        try:
+            return RecordSchema._variants[key]
+        except KeyError:
+            variant = RecordSchema(**fields)
+            RecordSchema._variants[key] = variant
+            return variant
+
+
+def _schema_fields(category, doc):
+    '''
+    Expose one category of the record's schema as an attribute.  Assigning
+    to it switches the record to a copy-on-write variant of its schema.
+    '''
+    attr = category + '_fields'
+
+    def getter(self):
+        return getattr(self._schema, attr)
+
+    def setter(self, names):
+        self._set_schema(self._schema.replace(**{category: names}))
+
+    return property(getter, setter, doc=doc)
+
+
+class RecordContent(MutableMapping):
+    '''
+    Dictionary view of the values held by a record.
+
+    Records keep their values in a list laid out by their schema rather
+    than in a dict; this view gives the familiar dict interface on top of
+    it.  Keys which the schema doesn't know about are kept in the record's
+    overflow dict so that _check_fields can still reject them.
+    '''
+    __slots__ = ('_record',)
+
+    def __init__(self, record):
+        self._record = record
+
+    def __getitem__(self, key):
+        record = self._record
+        index = record._schema.slots.get(key)
+        if index is None:
+            if record._extra is None:
+                raise KeyError(key)
+            return record._extra[key]
+        value = record._values[index]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        record = self._record
+        index = record._schema.slots.get(key)
+        if index is None:
+            if record._extra is None:
+                record._extra = {}
+            record._extra[key] = value
+        else:
+            record._values[index] = value
+        record._valid = False
+
+    def __delitem__(self, key):
+        record = self._record
+        index = record._schema.slots.get(key)
+        if index is None:
+            if record._extra is None:
+                raise KeyError(key)
+            del record._extra[key]
+        elif record._values[index] is _MISSING:
+            raise KeyError(key)
+        else:
+            record._values[index] = _MISSING
+        record._valid = False
+
+    def __iter__(self):
+        record = self._record
+        for name, value in zip(record._schema.content_fields, record._values):
+            if value is not _MISSING:
+                yield name
+        if record._extra:
+            for name in list(record._extra):
+                yield name
+
+    def __len__(self):
+        record = self._record
+        size = len(record._values) - record._values.count(_MISSING)
+        if record._extra:
+            size += len(record._extra)
+        return size
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 class Record(object):
     '''
@@ -49,41 +310,160 @@ class Record(object):
     The class is designed so that each record type should inherit from this
     one.  There is some logic which is a little tricky used to convert
     the contents of a message into a sensible python format.
+
+    Subclasses describe their content and order with the *_FIELDS class
+    attributes below, from which one RecordSchema per class is built.  To
+    keep large batches of records small, a record holds its values in a
+    list laid out by the schema and has no instance dictionary: subclasses
+    must define __slots__ too.  self._record_content gives a dict-like
+    view of the values.
+
+    A record remembers whether it has passed _check_fields since it was last
+    changed, so that serialising it again doesn't repeat the checks.
     '''
+    __slots__ = ('_schema', '_values', '_extra', '_valid')
+
     # used to protect user DN information
     DN_FIELD = 'GlobalUserName'
     WITHHELD_DN = 'withheld'
 
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ()
+    # All the keys which may be used in messages in the correct order.
+    MSG_FIELDS = ()
+    # The information that goes in the database.
+    DB_FIELDS = ()
+    # Fields which are permitted in a message, but are currently ignored.
+    IGNORED_FIELDS = ()
+    # All possible information, including some which may not go in
+    # a message and fields ignored in received messages
+    ALL_FIELDS = ()
+    # Fields which should contain integers
+    INT_FIELDS = ()
+    # Fields which should contain floating point numbers
+    FLOAT_FIELDS = ()
+    # Fields which should contain datetime (will be stored as a integers)
+    DATETIME_FIELDS = ()
+    # Fields which should contain associative arrays
+    DICT_FIELDS = ()
+    # These fields need special handling as they shouldn't be inserted as
+    # Null into the database
+    FQAN_FIELDS = ("VO", "VOGroup", "VORole")
+    # Fields whose values repeat across most records, so records share one
+    # copy of each value (see intern_value).
+    INTERN_FIELDS = ("Site", "SiteName", "SubmitHost", "MachineName", "Queue",
+                     "VO", "VOGroup", "VORole", "InfrastructureType",
+                     "InfrastructureDescription", "ServiceLevelType",
+                     "HostName")
+
+    _mandatory_fields = _schema_fields('mandatory', 'Mandatory fields.')
+    _msg_fields = _schema_fields('msg', 'Message fields, in message order.')
+    _db_fields = _schema_fields('db', 'Database fields, in column order.')
+    _ignored_fields = _schema_fields('ignored', 'Accepted but ignored fields.')
+    _all_fields = _schema_fields('all', 'All permitted fields.')
+    _int_fields = _schema_fields('int', 'Integer fields.')
+    _float_fields = _schema_fields('float', 'Floating point fields.')
+    _datetime_fields = _schema_fields('datetime', 'Datetime fields.')
+    _dict_fields = _schema_fields('dict', 'Associative array fields.')
+    _fqan_fields = _schema_fields('fqan', 'VOMS attribute fields.')
+    _intern_fields = _schema_fields('intern', 'Fields with pooled values.')
+
     def __init__(self):
         '''
-        Just defines the required lists which give content and order
-        of a particular record.  These fields will be populated by
-        subclasses.
-        '''
-        # Fields which are required by the message format.
-        self._mandatory_fields = []
-        # All the keys which may be used in messages in the correct order.
-        self._msg_fields = []
-        # The information that goes in the database.
-        self._db_fields = []
-        # Fields which are permitted in a message, but are currently ignored.
-        self._ignored_fields = []
-        # All possible information, including some which may not go in
-        # a message and fields ignored in received messages
-        self._all_fields = []
-        # Fields which should contain integers
-        self._int_fields = []
-        # Fields which should contain floating point numbers
-        self._float_fields = []
-        # Fields which should contain datetime (will be stored as a integers)
-        self._datetime_fields = []
-        # Fields which should contain associative arrays
-        self._dict_fields = []
-        # The dictionary into which all the information goes
-        self._record_content = {}
-        # These fields need special handling as they shouldn't be inserted as
-        # Null into the database
-        self._fqan_fields = ["VO", "VOGroup", "VORole"]
+        Attaches the schema shared by all records of this type and creates
+        the empty content of the record.
+        '''
+        self._schema = self.get_schema()
+        self._clear()
+
+    def _clear(self):
+        '''Remove all values from the record.'''
+        # The list into which all the information goes, indexed by the
+        # schema's slots.
+        self._values = [_MISSING] * len(self._schema.content_fields)
+        # Values for fields which the schema doesn't know about.
+        self._extra = None
+        # Whether the values have passed _check_fields since last changed.
+        self._valid = False
+
+    def _get_record_content(self):
+        return RecordContent(self)
+
+    def _set_record_content(self, content):
+        self._clear()
+        RecordContent(self).update(content)
+
+    _record_content = property(_get_record_content, _set_record_content,
+                               doc='Dict-like view of the record\'s values.')
+
+    def __getstate__(self):
+        # Schemas and the missing-value marker belong to one process, so
+        # records are pickled (e.g. for process pools) as plain values.
+        schema = self._schema
+        class_schema = self.get_schema()
+        if schema is class_schema:
+            fields = None
+        else:
+            fields = dict((category, getattr(schema, category + '_fields'))
+                          for category in RecordSchema.CATEGORIES)
+        return fields, dict(self._record_content)
+
+    def __setstate__(self, state):
+        fields, content = state
+        self._schema = self.get_schema()
+        if fields is not None:
+            self._schema = self._schema.replace(**fields)
+        self._set_record_content(content)
+
+    def _set_schema(self, schema):
+        '''
+        Switch this record to another schema, moving its values if the new
+        schema lays them out differently.
+        '''
+        self._valid = False
+        if schema.content_fields == self._schema.content_fields:
+            self._schema = schema
+        else:
+            content = dict(self._record_content)
+            self._schema = schema
+            self._set_record_content(content)
+
+    @classmethod
+    def get_schema(cls):
+        '''
+        Returns the RecordSchema for this class, building it the first time
+        the class is used.
+        '''
+        # Look in the class's own namespace so that a subclass never picks
+        # up the schema of its parent.
+        schema = cls.__dict__.get('_class_schema')
+        if schema is None:
+            schema = RecordSchema.from_class(cls)
+            cls._class_schema = schema
+        return schema
+
+    @classmethod
+    def empty_values(cls):
+        '''
+        Returns a list of values for from_values in which every field is
+        missing.
+        '''
+        return [_MISSING] * len(cls.get_schema().content_fields)
+
+    @classmethod
+    def from_values(cls, values):
+        '''
+        Returns a record holding a list of values, one for each field of the
+        class's schema in the order of its slots, without checking them.
+        Parsers use this to build records directly, so the values must be
+        as checked() would have left them.
+        '''
+        record = cls.__new__(cls)
+        record._schema = cls.get_schema()
+        record._values = values
+        record._extra = None
+        record._valid = False
+        return record
 
     def set_all(self, fielddict):
         '''
@@ -98,10 +478,12 @@ class Record(object):
         '''
         Sets one field in the record's internal storage.
         '''
-        if key in self._db_fields:
-            self._record_content[key] = self.checked(key, value)
+        schema = self._schema
+        if key in schema.db_set:
+            self._values[schema.slots[key]] = self.checked(key, value)
+            self._valid = False
         else:
-            if key not in self._ignored_fields:
+            if key not in schema.ignored_set:
                 raise InvalidRecordException('Unknown field: %s' % key)
 
 
@@ -115,14 +497,19 @@ class Record(object):
         @params: name Name of the field
         @return: Value of the field
         '''
-        try:
-            value = self._record_content[name]
-            return value
-        except KeyError:
-            if name in self._mandatory_fields:
-                raise InvalidRecordException('Missing mandatory field: %s' % name)
-            else:
-                return None
+        schema = self._schema
+        index = schema.slots.get(name)
+        if index is not None:
+            value = self._values[index]
+            if value is not _MISSING:
+                return value
+        elif self._extra and name in self._extra:
+            return self._extra[name]
+
+        if name in schema.mandatory_set:
+            raise InvalidRecordException('Missing mandatory field: %s' % name)
+        else:
+            return None
 
 
     def checked(self, name, value):
@@ -130,65 +517,30 @@ class Record(object):
         Returns value converted to correct type if this is possible.
         Otherwise it raises an error.
         '''
+        schema = self._schema
         try:
             # Convert null equivalents (except VOMS attributes) to None object
-            if name not in self._fqan_fields and check_for_null(value):
+            if name not in schema.fqan_set and check_for_null(value):
                 value = None
             # firstly we must ensure that we do not put None
             # in mandatory field
-            if value is None and name in self._mandatory_fields:
+            if value is None and name in schema.mandatory_set:
                 raise InvalidRecordException('NULL in mandatory field: %s' % str(name))
 
             elif value is None:
                 return value
 
-            if name in self._int_fields: # integer values
-                try:
-                    return int(value)
-                except ValueError:
-                    raise InvalidRecordException('Invalid int value %s in field %s' % (value, name))
-
-            elif name in self._float_fields: # float values
-                try:
-                    return float(value)
-                except ValueError:
-                    raise InvalidRecordException('Invalid float value %s in field %s' % (value, name))
-
-            elif name in self._datetime_fields:
-
-                # if it is already a datetime, return it
-                if type(value) == datetime:
-                    return value
-                # We accept ints or floats as seconds since the epoch
-                try:
-                    value = int(value)
-                except ValueError:
-                    # Not a datetime or an int, so it has to be a string representation.
-                    # We get ISO format dates when parsing CAR or StAR.
-                    isofmt = '%Y-%m-%dT%H:%M:%S%Z' # %Z denotes timezone
-                    # A trailing Z in the ISO format denotes UTC.  We make this explicit for parsing.
-                    dtval = value.replace('Z', 'UTC')
-                    try:
-                        dt = datetime.utcfromtimestamp(time.mktime(time.strptime(dtval, isofmt)))
-                        return dt
-                    except (ValueError, OverflowError, OSError): # Failed to parse timestamp
-                        raise InvalidRecordException('Unknown datetime format!: %s' % value)
-                try:
-                    return datetime.utcfromtimestamp(value)
-                except (ValueError, OverflowError, OSError) as e: # Failed to parse timestamp
-                    # Given timestamp is probably out of range
-                    raise InvalidRecordException(e)
-            elif name in self._dict_fields:
-                try:
-                    return self._clean_up_dict(value)
-                except ValueError as e:
-                    raise InvalidRecordException(e)
-            else:
+            converter = schema.converters.get(name)
+            if converter is None:
+                if name in schema.intern_set:
+                    return intern_value(value)
                 return value
+            return converter(name, value)
         except ValueError:
             raise InvalidRecordException('Invalid content for field: %s (%s)' % (name, str(value)))
 
-    def _clean_up_dict(self, dict_like):
+    @staticmethod
+    def _clean_up_dict(dict_like):
         """Take a dict-like string and return a dict object with float values."""
         # Pull out the combined key:value elements from the string.
         elements = dict_like.strip('{}').split(',')
@@ -208,12 +560,13 @@ class Record(object):
         '''
         Given a tuple from a mysql database, load fields.
         '''
-        if len(tup) != len(self._db_fields):
+        db_fields = self._schema.db_fields
+        if len(tup) != len(db_fields):
             raise ValueError(
                 'Wrong tuple length. Expected %s items but got %s.'
-                % (len(self._db_fields), len(tup))
+                % (len(db_fields), len(tup))
             )
-        self.set_all(dict(zip(self._db_fields, tup)))
+        self.set_all(dict(zip(db_fields, tup)))
 
     def load_from_msg(self, text):
         '''
@@ -225,43 +578,50 @@ class Record(object):
             # log.info("Empty record: can't load.")
             return
 
+        fields = self._read_msg(text, self._schema.dict_set)
+
+        self._clear()
+        self.set_all(fields)
+
+        # Now, go through the logic to fill the contents[] dictionary.
+        # The logic can get a bit involved here.
+
+        self._validate()
+
+    @staticmethod
+    def _read_msg(text, dict_fields):
+        '''
+        Given the text of one record from a message, return its fields as a
+        dictionary of unchecked values.  The benchmark type is taken out of
+        any of dict_fields (used by v0.4 messages) into ServiceLevelType.
+        '''
         lines = text.strip().splitlines()
 
         # remove the bit before ': '
-        self._record_content = {}
+        content = {}
         for line in lines:
             try:
                 key, value = [x.strip() for x in line.split(':', 1)]
 
-                # This loop handles the v0.4 messages that have dictionaries in certain fields
-                # It won't loop or do anything if _dict_fields is empty
-                for field in self._dict_fields:
-                    if field == key:
-
-                        # Retrieve the benchmark type based on the preferntial order set in the extract method
-                        benchmark_type, value = self._extract_benchmark_dict({key: value}, field)
+                # This handles the v0.4 messages that have dictionaries in certain fields
+                if key in dict_fields:
+                    # Retrieve the benchmark type based on the preferntial order set in the extract method
+                    benchmark_type, value = Record._extract_benchmark_dict({key: value}, key)
 
-                        if "ServiceLevelType" not in self._record_content:
-                            # Set the benchmark type if it is its first occurence.
-                            self._record_content["ServiceLevelType"] = benchmark_type
-                        elif self._record_content["ServiceLevelType"] != benchmark_type:
-                            # If a different benchmark type is retrieved from another field, raise a warning
-                            raise InvalidRecordException("Mixture of benchmark types detected")
-                        # Else the ServiceLevelType is already set to benchmark_type so nothing to do.
+                    if "ServiceLevelType" not in content:
+                        # Set the benchmark type if it is its first occurence.
+                        content["ServiceLevelType"] = benchmark_type
+                    elif content["ServiceLevelType"] != benchmark_type:
+                        # If a different benchmark type is retrieved from another field, raise a warning
+                        raise InvalidRecordException("Mixture of benchmark types detected")
+                    # Else the ServiceLevelType is already set to benchmark_type so nothing to do.
 
-                        # Set the field to the value retrieved as that's what needs to do into the database
-                        self._record_content[field] = self.checked(field, value)
-                        break
-
-                self.set_field(key, value)
+                content[key] = value
             except IndexError:
                 raise InvalidRecordException("Record contains a line  "
                                              "without a key-value pair: %s" % line)
 
-        # Now, go through the logic to fill the contents[] dictionary.
-        # The logic can get a bit involved here.
-
-        self._check_fields()
+        return content
 
 
     def get_msg(self, withhold_dns=False, exclude_fields=None):
@@ -283,15 +643,16 @@ class Record(object):
             exclude_fields = set()
 
         # Check that the record is consistent.
-        self._check_fields()
+        self._validate()
         # for certain records, we can replace GlobalUserName with 'withheld'
         # to protect private data
         dn = self.get_field(Record.DN_FIELD)
         if dn is not None and withhold_dns:
             self.set_field(Record.DN_FIELD, Record.WITHHELD_DN)
 
+        values = self._values
         msg = ""
-        for key in self._msg_fields:
+        for key, index, is_datetime, is_dict, is_mandatory in self._schema.msg_layout:
             # Skip fields that are explicitly excluded by configuration.
             if key in exclude_fields:
                 continue
@@ -299,24 +660,26 @@ class Record(object):
             # reset value each time.
             value = None
             try:
-                if key in self._datetime_fields:
+                if values[index] is _MISSING:
+                    raise KeyError(key)
+                if is_datetime:
                     # convert datetime to epoch time for the message
                     # assume that the datetime is UTC
-                    ttuple = self._record_content[key].timetuple()
+                    ttuple = values[index].timetuple()
                     value = str(int(calendar.timegm(ttuple)))
                 else:
-                    value = str(self._record_content[key]) # make sure we have a string
+                    value = str(values[index]) # make sure we have a string
             except (KeyError, AttributeError):
                 # It's only a problem if a mandatory field is missing;
                 # otherwise just don't write the line to the message.
-                if key in self._mandatory_fields:
+                if is_mandatory:
                     raise InvalidRecordException('No mandatory key: %s found' % key)
             if value is None or value.isspace() or value == "":
                 # Don't write a line to the message unless there's something
                 # to say.
                 continue
 
-            if key in self._dict_fields:
+            if is_dict:
                 # Create dictionary fields for v0.4 message formats.
                 benchmark_type = self._record_content['ServiceLevelType']
                 if benchmark_type is None:
@@ -339,18 +702,19 @@ class Record(object):
         # and no field is missing
         # _check_fields method may also check the internal logic inside the
         # record
-        self._check_fields()
+        self._validate()
         # Order is crucial here, so we use the list of DB fields to
         # get the right values, then append the user's DN.
+        values = self._values
         l = []
-        for key in self._db_fields:
-            try:
-                l.append(self._record_content[key])
-            except KeyError:
-                if key in self._mandatory_fields:
+        for key, index, is_mandatory in self._schema.db_layout:
+            value = values[index]
+            if value is _MISSING:
+                if is_mandatory:
                     raise InvalidRecordException('Mandatory field: %s was not found' % key)
                 else:
-                    l.append('None')
+                    value = 'None'
+            l.append(value)
 
         if source is not None:
             l.append(source)
@@ -362,80 +726,102 @@ class Record(object):
     # Private methods below
     ##########################################################################
 
+    def _validate(self):
+        '''
+        Runs _check_fields unless the record has passed it and not been
+        changed since.
+        '''
+        if not self._valid:
+            self._check_fields()
+            # _check_fields fills in and converts values as it goes, so
+            # only mark the record as valid once it has finished.
+            self._valid = True
+
+    @classmethod
+    def _check_batch(cls, batch):
+        '''
+        Makes the checks of _check_fields on every row of a RecordBatch.
+
+        The checks of this class are made a column at a time.  A subclass
+        which adds to _check_fields has each row checked as a separate
+        record unless it overrides this method as well.
+        '''
+        if cls._check_fields is Record._check_fields:
+            batch.check_columns()
+        else:
+            batch.check_rows()
+
     def _check_fields(self):
 
         # shorthand
-        contents = self._record_content
+        values = self._values
+        schema = self._schema
+        mandatory = schema.mandatory_set
 
         # Check that all the required information is present.
-        for key in self._mandatory_fields:
-            if key not in contents:
-                raise InvalidRecordException("Mandatory field " + key + " not specified.")
-            value = contents[key]
-            if check_for_null(value):
+        for key, index in schema.mandatory_slots:
+            value = values[index]
+            if value is _MISSING or check_for_null(value):
                 raise InvalidRecordException("Mandatory field " + key + " not specified.")
 
         # Check that no extra fields are specified.
-        # Is this inefficient?
-        for key in contents:
-            if key not in self._all_fields:
+        for key, index in schema.unexpected:
+            if values[index] is not _MISSING:
+                raise InvalidRecordException("Unexpected field " + key + " in message.")
+        if self._extra:
+            for key in self._extra:
                 raise InvalidRecordException("Unexpected field " + key + " in message.")
 
-        # Fill the dictionary even if we don't have the relevant data.
+        # Fill the record even if we don't have the relevant data.
         # The string values are getting 'None' (not None!) instead of going into the
         # DB as NULL.
-        for key in self._msg_fields:
-            if key not in contents:  # key not already in the dictionary
-                contents[key] = "None"
-            if check_for_null(contents[key]):
-                contents[key] = "None"
-
+        for key, index in schema.msg_slots:
+            value = values[index]
+            if value is _MISSING or check_for_null(value):
+                values[index] = "None"
 
         # Change the null values for integers to None (not 'None'!) -> NULL in the DB.
-        for key in self._int_fields:
-            try:
-                value = contents[key]
-            except KeyError:
+        for key, index in schema.int_slots:
+            value = values[index]
+            if value is _MISSING:
                 value = None
 
             # Check if we have an integer by trying to cast to an int.
             try:
                 value = int(value)
             except (ValueError, TypeError):
-                if key in self._mandatory_fields:
+                if key in mandatory:
                     raise InvalidRecordException("Mandatory int field " + key +
                                     " doesn't contain an integer.")
                 elif check_for_null(value):
-                    contents[key] = None
+                    values[index] = None
                 elif value is not None:
                     raise InvalidRecordException("Int field " + key +
                                     " doesn't contain an integer.")
 
         # Change null values for floats to the null object -> NULL in the DB.
-        for key in self._float_fields:
-            try:
-                value = contents[key]
-            except KeyError:
+        for key, index in schema.float_slots:
+            value = values[index]
+            if value is _MISSING:
                 value = None
 
             # Check if we have an float by trying to cast to a float.
             try:
                 value = float(value)
             except (ValueError, TypeError):
-                if key in self._mandatory_fields:
+                if key in mandatory:
                     raise InvalidRecordException("Mandatory decimal field " + key +
                                     " doesn't contain a float.")
                 elif check_for_null(value):
-                    contents[key] = None
+                    values[index] = None
                 elif value is not None:
                     raise InvalidRecordException("Decimal field " + key +
                                     " doesn't contain a float.")
 
         # Change null values for Datetimes to the null object -> NULL in the DB.
-        for key in self._datetime_fields:
-            try:
-                value = contents[key]
-            except KeyError:
+        for key, index in schema.datetime_slots:
+            value = values[index]
+            if value is _MISSING:
                 value = None
 
             # Check if we have a datetime in this field.
@@ -443,23 +829,24 @@ class Record(object):
             # as there doesn't seem to be a nice function to attempt to
             # cast an object to a datetime.
             if not isinstance(value, datetime):
-                if key in self._mandatory_fields:
+                if key in mandatory:
                     raise InvalidRecordException("Mandatory datetime field " + key +
                                    " doesn't contain a datetime.")
                 elif check_for_null(value):
-                    contents[key] = None
+                    values[index] = None
                 elif value is not None:
                     raise InvalidRecordException("Datetime field " + key +
                                     " doesn't contain an datetime.")
 
-    def _extract_benchmark_dict(self, fielddict, field):
+    @staticmethod
+    def _extract_benchmark_dict(fielddict, field):
         """Extract a preferrred benchmark type and value from a fielddict"""
 
         benchmark_priority = ("hepscore23", "hepspec", "si2k")
 
         if field in fielddict:
             try:
-                cleaned_dict = self._clean_up_dict(fielddict[field])
+                cleaned_dict = Record._clean_up_dict(fielddict[field])
                 # Covert keys to lower case
                 cleaned_dict = {k.lower(): v for k, v in cleaned_dict.items()}
             except ValueError as e:
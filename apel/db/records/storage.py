@@ -36,39 +36,28 @@ class StorageRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
+    __slots__ = ()
 
     MANDATORY_FIELDS = ["RecordId", "CreateTime", "StorageSystem",
-                                  "StartTime", "EndTime",
-                                  "ResourceCapacityUsed"]
+                        "StartTime", "EndTime",
+                        "ResourceCapacityUsed"]
 
     # This list specifies the information that goes in the database.
     DB_FIELDS = ["RecordId", "CreateTime", "StorageSystem", "Site", "StorageShare",
-                       "StorageMedia", "StorageClass", "FileCount", "DirectoryPath",
-                       "LocalUser", "LocalGroup", "UserIdentity",
-                       "Group", "SubGroup", "Role", "StartTime", "EndTime",
-                       "ResourceCapacityUsed", "LogicalCapacityUsed",
-                       "ResourceCapacityAllocated"]
+                 "StorageMedia", "StorageClass", "FileCount", "DirectoryPath",
+                 "LocalUser", "LocalGroup", "UserIdentity",
+                 "Group", "SubGroup", "Role", "StartTime", "EndTime",
+                 "ResourceCapacityUsed", "LogicalCapacityUsed",
+                 "ResourceCapacityAllocated"]
 
     ALL_FIELDS = DB_FIELDS
 
-    def __init__(self):
-        '''Provide the necessary lists containing message information.'''
+    # Fields which are accepted but currently ignored.
+    IGNORED_FIELDS = []
 
-        Record.__init__(self)
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = StorageRecord.MANDATORY_FIELDS
-
-        # This list specifies the information that goes in the database.
-        self._db_fields = StorageRecord.DB_FIELDS
-
-        # Fields which are accepted but currently ignored.
-        self._ignored_fields = []
-
-        self._all_fields = self._db_fields
-        self._datetime_fields = ["CreateTime", "StartTime", "EndTime"]
-        # Fields which will have an integer stored in them
-        self._int_fields = ["FileCount", "ResourceCapacityUsed", "LogicalCapacityUsed", "ResourceCapacityAllocated"]
+    DATETIME_FIELDS = ["CreateTime", "StartTime", "EndTime"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["FileCount", "ResourceCapacityUsed", "LogicalCapacityUsed", "ResourceCapacityAllocated"]
 
     def get_apel_db_insert(self, source=None):
         '''
@@ -31,37 +31,33 @@ class SummaryRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
+    __slots__ = ()
 
-    def __init__(self):
-        '''Populate fields required to load the message.'''
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "Month", "Year", "WallDuration",
+                        "CpuDuration", "NumberOfJobs"]
 
-        super().__init__()
+    # This list allows us to specify the order of lines when we construct
+    # records.
+    MSG_FIELDS = ["Site", "Month", "Year", "GlobalUserName", "VO",
+                  "VOGroup", "VORole", "SubmitHost", "InfrastructureType", "InfrastructureDescription",
+                  "ServiceLevelType", "ServiceLevel", "NodeCount", "Processors", "EarliestEndTime",
+                  "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"]
 
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "Month", "Year", "WallDuration",
-                    "CpuDuration", "NumberOfJobs"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["Month", "Year", "NodeCount", "Processors",
+                  "WallDuration", "CpuDuration", "NumberOfJobs"]
 
-        # This list allows us to specify the order of lines when we construct
-        # records.
-        self._msg_fields = ["Site", "Month", "Year", "GlobalUserName", "VO",
-                            "VOGroup", "VORole", "SubmitHost", "InfrastructureType", "InfrastructureDescription",
-                            "ServiceLevelType", "ServiceLevel", "NodeCount", "Processors", "EarliestEndTime",
-                            "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"]
+    FLOAT_FIELDS = ["ServiceLevel"]
 
-        # Fields which will have an integer stored in them
-        self._int_fields = ["Month", "Year", "NodeCount", "Processors",
-                            "WallDuration", "CpuDuration", "NumberOfJobs"]
+    DATETIME_FIELDS = ["EarliestEndTime", "LatestEndTime"]
 
-        self._float_fields = ["ServiceLevel"]
+    IGNORED_FIELDS = ["UpdateTime"]
 
-        self._datetime_fields = ["EarliestEndTime", "LatestEndTime"]
-
-        self._ignored_fields = ["UpdateTime"]
-
-        # This list specifies the information that goes in the database.
-        self._db_fields = self._msg_fields
-        # All allowed fields.
-        self._all_fields = self._msg_fields
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = MSG_FIELDS
+    # All allowed fields.
+    ALL_FIELDS = MSG_FIELDS
 
 
     def _check_fields(self):
@@ -238,44 +234,40 @@ class SummaryRecord04(SummaryRecord):
     in the message fields, as this is extracted from the associative array
     in ServiceLevel before putting into the database.
     """
+    __slots__ = ()
 
-    def __init__(self):
-        """Populate fields required to load the message."""
-
-        super().__init__()
-
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "Month", "Year", "WallDuration",
-                                  "CpuDuration", "NumberOfJobs"]
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "Month", "Year", "WallDuration",
+                        "CpuDuration", "NumberOfJobs"]
 
-        # This list allows us to specify the order of lines when we construct records.
-        # It differs from SummaryRecord by lacking a separate ServiceLevelType field
-        # as this is included in the dict for ServiceLevel.
-        self._msg_fields = [
-            "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
-            "InfrastructureType", "InfrastructureDescription", "ServiceLevel", "NodeCount", "Processors",
-            "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"
-        ]
+    # This list allows us to specify the order of lines when we construct records.
+    # It differs from SummaryRecord by lacking a separate ServiceLevelType field
+    # as this is included in the dict for ServiceLevel.
+    MSG_FIELDS = [
+        "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
+        "InfrastructureType", "InfrastructureDescription", "ServiceLevel", "NodeCount", "Processors",
+        "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"
+    ]
 
-        # This list specifies the information that goes in the database.
-        self._db_fields = [
-            "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
-            "InfrastructureType", "InfrastructureDescription", "ServiceLevelType", "ServiceLevel", "NodeCount",
-            "Processors", "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"
-        ]
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = [
+        "Site", "Month", "Year", "GlobalUserName", "VO", "VOGroup", "VORole", "SubmitHost",
+        "InfrastructureType", "InfrastructureDescription", "ServiceLevelType", "ServiceLevel", "NodeCount",
+        "Processors", "EarliestEndTime", "LatestEndTime", "WallDuration", "CpuDuration", "NumberOfJobs"
+    ]
 
-        self._ignored_fields = ["UpdateTime"]
+    IGNORED_FIELDS = ["UpdateTime"]
 
-        # All allowed fields. We use _db_fields as that is a superset of _msg_fields.
-        self._all_fields = self._db_fields
+    # All allowed fields. We use DB_FIELDS as that is a superset of MSG_FIELDS.
+    ALL_FIELDS = DB_FIELDS
 
-        # Fields which will have an integer stored in them
-        self._int_fields = ["Month", "Year", "NodeCount", "Processors",
-                            "WallDuration", "CpuDuration", "NumberOfJobs"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["Month", "Year", "NodeCount", "Processors",
+                  "WallDuration", "CpuDuration", "NumberOfJobs"]
 
-        self._float_fields = ["ServiceLevel"]
+    FLOAT_FIELDS = ["ServiceLevel"]
 
-        self._datetime_fields = ["EarliestEndTime", "LatestEndTime"]
+    DATETIME_FIELDS = ["EarliestEndTime", "LatestEndTime"]
 
-        # Fields which should contain associative arrays in the v0.4 message
-        self._dict_fields = ["ServiceLevel"]
+    # Fields which should contain associative arrays in the v0.4 message
+    DICT_FIELDS = ["ServiceLevel"]
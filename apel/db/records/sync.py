@@ -26,23 +26,18 @@ class SyncRecord(Record):
     It stores its information in a dictionary self._record_content.  The keys
     are in the same format as in the messages, and are case-sensitive.
     '''
+    __slots__ = ()
 
-    def __init__(self):
-        '''Populate fields required to load the message.'''
+    # Fields which are required by the message format.
+    MANDATORY_FIELDS = ["Site", "NumberOfJobs", "Month", "Year"]
 
-        Record.__init__(self)
+    # This list allows us to specify the order of lines when we construct records.
+    MSG_FIELDS = ['Site', 'SubmitHost', 'NumberOfJobs', 'Month', 'Year']
 
-        # Fields which are required by the message format.
-        self._mandatory_fields = ["Site", "NumberOfJobs", "Month", "Year"]
+    # Fields which will have an integer stored in them
+    INT_FIELDS = ["NumberOfJobs", "Month", "Year"]
 
-        # This list allows us to specify the order of lines when we construct
-        # records.
-        self._msg_fields = ['Site', 'SubmitHost', 'NumberOfJobs', 'Month', 'Year']
-
-        # Fields which will have an integer stored in them
-        self._int_fields = ["NumberOfJobs", "Month", "Year"]
-
-        # This list specifies the information that goes in the database.
-        self._db_fields = self._msg_fields
-        # All allowed fields.
-        self._all_fields = self._msg_fields
+    # This list specifies the information that goes in the database.
+    DB_FIELDS = MSG_FIELDS
+    # All allowed fields.
+    ALL_FIELDS = MSG_FIELDS
@@ -0,0 +1,200 @@
+'''
+   Copyright (C) 2024 STFC
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Module containing the RecordSpool class, which stores parsed records in
+local files to be loaded into the database later.
+'''
+
+from future.builtins import object, str
+
+import calendar
+from datetime import datetime
+import gzip
+import logging
+import os
+import re
+import time
+
+from apel.db import LOGGER_ID
+from apel.db.apeldb import ApelDbException
+from apel.db.records import BlahdRecord, EventRecord, RecordBatch
+
+log = logging.getLogger(LOGGER_ID)
+
+# The record types which can be spooled, by name.
+SPOOL_TYPES = dict((record_class.__name__, record_class)
+                   for record_class in (BlahdRecord, EventRecord))
+
+# Records written to a spool file before a new one is started.  Each file is
+# loaded in one transaction.
+SPOOL_FILE_RECORDS = 100000
+
+SPOOL_SUFFIX = '.tsv.gz'
+
+# Written for a NULL value, as by MySQL's SELECT ... INTO OUTFILE.
+_NULL = '\\N'
+_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_UNESCAPES = dict((escaped, char) for char, escaped in _ESCAPES.items())
+_ESCAPE = re.compile('[\\\\\t\n\r]')
+_UNESCAPE = re.compile('\\\\[\\\\tnr]')
+
+
+def _encode(value):
+    if value is None:
+        return _NULL
+    if isinstance(value, datetime):
+        return str(calendar.timegm(value.utctimetuple()))
+    value = str(value)
+    if _ESCAPE.search(value):
+        value = _ESCAPE.sub(lambda match: _ESCAPES[match.group()], value)
+    return value
+
+
+class RecordSpool(object):
+    '''
+    Stands in for an ApelDb in the parser, writing the RecordBatches passed
+    to load_records to compressed files in a directory instead of loading
+    them.  load() later loads every file in the directory, each in one
+    transaction, so that parsing and loading can be done at different times
+    or on different machines.
+
+    Each file holds records of one type, as the tuples which would have
+    been loaded: a line giving the record type and whether the records
+    replace those in the database, a line of field names, then a line of
+    tab-separated values for each record.  Files are written under a
+    temporary name and renamed when they are complete, by close().
+    '''
+    def __init__(self, directory, records_per_file=SPOOL_FILE_RECORDS):
+        self.directory = directory
+        self._records_per_file = records_per_file
+        # (file, temporary path, record count) by (record type, replace).
+        self._open = {}
+        self._count = 0
+
+    def load_records(self, batch, replace=True, source=None):
+        '''Writes the records of a RecordBatch to the spool.'''
+        record_class = batch.record_class
+        if record_class.__name__ not in SPOOL_TYPES or source is not None:
+            raise ApelDbException('Cannot spool %s' % record_class.__name__)
+        if len(batch) == 0:
+            return
+
+        rows = batch.get_db_tuples()
+        key = (record_class, replace)
+        spool_file, temp_path, count = self._open.get(key) or self._start(*key)
+        spool_file.write(''.join('\t'.join([_encode(value) for value in row]) + '\n'
+                                 for row in rows).encode('utf-8'))
+        count += len(rows)
+        self._open[key] = (spool_file, temp_path, count)
+        if count >= self._records_per_file:
+            self._finish(key)
+
+    def close(self):
+        '''Completes the spool files which have been written.'''
+        for key in list(self._open):
+            self._finish(key)
+
+    def load(self, apel_db):
+        '''
+        Loads each complete file in the spool into apel_db, in the order they
+        were written, and removes it.  Returns the number of records loaded.
+
+        If a file cannot be loaded, the ApelDbException is raised and it and
+        the later files are left to be loaded next time.
+        '''
+        loaded = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SPOOL_SUFFIX) or name.startswith('.'):
+                continue
+            path = os.path.join(self.directory, name)
+            record_class, replace, batch = read_spool_file(path)
+            log.info('Loading %d %ss from %s', len(batch), record_class.__name__, name)
+            apel_db.load_records(batch, replace=replace)
+            os.remove(path)
+            loaded += len(batch)
+        return loaded
+
+    ##########################################################################
+    # Private methods below
+    ##########################################################################
+
+    def _start(self, record_class, replace):
+        '''Opens a new spool file for records of a type.'''
+        # The names sort in the order the files are written.
+        self._count += 1
+        name = '%.6f-%d-%06d-%s%s' % (time.time(), os.getpid(), self._count,
+                                      record_class.__name__, SPOOL_SUFFIX)
+        temp_path = os.path.join(self.directory, '.' + name + '.tmp')
+        spool_file = gzip.open(temp_path, 'wb')
+        fields = [key for key, _, _ in record_class.get_schema().db_layout]
+        spool_file.write(('%s\t%s\n%s\n' % (record_class.__name__,
+                                            'replace' if replace else 'insert',
+                                            '\t'.join(fields))).encode('utf-8'))
+        return spool_file, temp_path, 0
+
+    def _finish(self, key):
+        '''Closes a spool file and gives it its final name.'''
+        spool_file, temp_path, count = self._open.pop(key)
+        spool_file.close()
+        path = os.path.join(self.directory, os.path.basename(temp_path)[1:-4])
+        os.rename(temp_path, path)
+        log.info('Spooled %d %ss to %s', count, key[0].__name__, path)
+
+
+def read_spool_file(path):
+    '''
+    Returns the record type of a spool file, whether its records replace
+    those in the database, and a RecordBatch of the records.
+    '''
+    with gzip.open(path, 'rb') as spool_file:
+        lines = spool_file.read().decode('utf-8').split('\n')
+
+    try:
+        type_name, mode = lines[0].split('\t')
+        record_class = SPOOL_TYPES[type_name]
+    except (ValueError, KeyError):
+        raise ApelDbException('Not a spool file: %s' % path)
+    schema = record_class.get_schema()
+    fields = lines[1].split('\t')
+    if fields != [key for key, _, _ in schema.db_layout]:
+        raise ApelDbException('Fields of %s do not match %s' % (path, type_name))
+
+    # The values are turned back into those written, by field type.
+    def to_datetime(value):
+        return datetime.utcfromtimestamp(int(value))
+
+    def unescape(value):
+        if '\\' in value:
+            value = _UNESCAPE.sub(lambda match: _UNESCAPES[match.group()], value)
+        return value
+
+    converters = []
+    for field in fields:
+        if field in schema.datetime_set:
+            converters.append(to_datetime)
+        elif field in schema.int_set:
+            converters.append(int)
+        elif field in schema.float_set:
+            converters.append(float)
+        else:
+            converters.append(unescape)
+
+    rows = []
+    for line in lines[2:]:
+        if line:
+            rows.append(tuple(None if value == _NULL else convert(value)
+                              for convert, value in zip(converters, line.split('\t'))))
+    return (record_class, mode == 'replace',
+            RecordBatch.from_db_tuples(record_class, rows))
@@ -14,17 +14,38 @@
    limitations under the License.
 
 A parser for BLAH record file.
-I've used a regular expression here. Maybe import csv would be better?
 
     @author: Konrad Jopek
 '''
 
 from apel.db.records.blahd import BlahdRecord
+from apel.db.records.record import NULL_VALUES, intern_value
 from apel.common import valid_from, valid_until, parse_timestamp
-from apel.common.parsing_utils import parse_fqan
+from apel.common.parsing_utils import decode_fqan
 from apel.parsers import Parser
 
+import datetime
 import re
+import time
+
+
+# The usual form of the timestamps in BLAH logs.
+_TIMESTAMP = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2}) ([0-9]{2}):([0-9]{2}):([0-9]{2})\Z')
+
+
+def _text(value):
+    '''Returns a string field's value as BlahdRecord.checked would.'''
+    if value.lower() in NULL_VALUES:
+        return None
+    return value
+
+
+def _vo_field(value):
+    '''Returns a VO field's value as BlahdRecord.checked would.'''
+    if value is None:
+        return None
+    return intern_value(value)
+
 
 class BlahParser(Parser):
     '''
@@ -34,8 +55,48 @@ class BlahParser(Parser):
     # expression below is used to divide
     # single line from log file into array
     # of values which are later parsed.
+    # It splits lines at every quote, as str.split('"') does.
     LINE_EXPR = re.compile(r'\"|\"_\"')
 
+    # The record fields filled in from each line, in the order the values
+    # are found, with the key in the line they come from.
+    KEYS = (('GlobalUserName', 'userDN'),
+            ('FQAN', 'userFQAN'),
+            ('CE', 'ceID'),
+            ('GlobalJobId', 'jobID'),
+            ('LrmsId', 'lrmsID'))
+
+    def __init__(self, site, machine_name, mpi=False):
+        Parser.__init__(self, site, machine_name, mpi)
+        self._compile_fields()
+
+    def __getstate__(self):
+        # As for SlurmParser, the template holds the record module's marker
+        # for missing values, so it is made again in other processes.
+        state = self.__dict__.copy()
+        del state['_template']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile_fields()
+
+    def _compile_fields(self):
+        '''
+        Works out the slots of the record's values, starting with the fields
+        which are the same for every line.
+        '''
+        slots = BlahdRecord.get_schema().slots
+        self._checker = BlahdRecord()
+        self._template = BlahdRecord.empty_values()
+        for key, value in (('Site', self.site_name),
+                           ('Processed', Parser.UNPROCESSED)):
+            self._template[slots[key]] = self._checker.checked(key, value)
+        self._text_slots = [(slots[field], key) for field, key in self.KEYS]
+        self._time_slots = [slots[field] for field in ('TimeStamp', 'ValidFrom',
+                                                       'ValidUntil')]
+        self._vo_slots = [slots[field] for field in ('VORole', 'VOGroup', 'VO')]
+
     def parse(self, line):
         '''
         Parses single line from accounting log file.
@@ -48,37 +109,57 @@ class BlahParser(Parser):
         Line was split, if you want to rejoin use ' ' as a joiner.
         '''
         data = {}
-        rc = {}
-        record = BlahdRecord()
-
-        #  split file and remove parts which contain only space (like ' ')
-        parts = [x.split('=',1) for x in [y for y in self.LINE_EXPR.split(line) if len(y) > 1]]
-
-        # Simple mapping between keys in a log file and a table's columns
-        mapping = {
-            'TimeStamp'      : lambda x: 'T'.join(x['timestamp'].split()) + 'Z',
-            'GlobalUserName' : lambda x: x['userDN'],
-            'FQAN'           : lambda x: x['userFQAN'],
-            'VO'             : lambda x: parse_fqan(x['userFQAN'])[2],
-            'VOGroup'        : lambda x: parse_fqan(x['userFQAN'])[1],
-            'VORole'         : lambda x: parse_fqan(x['userFQAN'])[0],
-            'CE'             : lambda x: x['ceID'],
-            'GlobalJobId'    : lambda x: x['jobID'],
-            'LrmsId'         : lambda x: x['lrmsID'],
-            'Site'           : lambda x: self.site_name,
-            'ValidFrom'      : lambda x: valid_from(parse_timestamp(x['timestamp'])),
-            'ValidUntil'     : lambda x: valid_until(parse_timestamp(x['timestamp'])),
-            'Processed'      : lambda x: Parser.UNPROCESSED}
-
-        for key, value in parts:
-            # Store only the first value encountered. This is mainly for the
-            # userFQAN field as the first occurence of this is the primary FQAN.
-            if key not in data:
-                data[key] = value
-
-        for key in mapping:
-            rc[key] = mapping[key](data)
-
-        record.set_all(rc)
-
-        return record
+        #  split file and skip parts which contain only space (like ' ')
+        for part in line.split('"'):
+            if len(part) > 1:
+                key, value = part.split('=', 1)
+                # Store only the first value encountered. This is mainly for the
+                # userFQAN field as the first occurence of this is the primary FQAN.
+                if key not in data:
+                    data[key] = value
+
+        timestamp = data['timestamp']
+        values = list(self._template)
+        for slot, key in self._text_slots:
+            values[slot] = _text(data[key])
+
+        for slot, value in zip(self._time_slots, self._parse_times(timestamp)):
+            values[slot] = value
+
+        for slot, value in zip(self._vo_slots, decode_fqan(data['userFQAN'])):
+            values[slot] = _vo_field(value)
+
+        return BlahdRecord.from_values(values)
+
+    def _parse_times(self, timestamp):
+        '''
+        Returns the TimeStamp, ValidFrom and ValidUntil of a line from its
+        timestamp, which is in UTC.
+
+        The usual form, '2012-05-20 23:59:47', is converted directly.  Any
+        other is parsed with parse_timestamp, and TimeStamp is converted as
+        BlahdRecord converts ISO 8601 strings.  This goes through the local
+        time, as time.mktime does, which is also done for the usual form so
+        that TimeStamp is the same either way.
+        '''
+        match = _TIMESTAMP.match(timestamp)
+        utc = None
+        if match is not None:
+            fields = [int(field) for field in match.groups()]
+            try:
+                utc = datetime.datetime(*fields)
+            except ValueError:
+                pass
+        if utc is None:
+            utc = parse_timestamp(timestamp)
+        valid = valid_from(utc), valid_until(utc)
+
+        try:
+            if match is None:
+                raise ValueError(timestamp)
+            local = datetime.datetime.utcfromtimestamp(
+                time.mktime(tuple(fields) + (0, 0, 0)))
+        except (ValueError, OverflowError, EnvironmentError):
+            local = self._checker.checked('TimeStamp',
+                                          'T'.join(timestamp.split()) + 'Z')
+        return (local,) + valid
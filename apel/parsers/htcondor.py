@@ -21,6 +21,7 @@ import logging
 
 from apel.db.records.event import EventRecord
 from apel.parsers import Parser
+from apel.parsers.parser import decode_fields
 
 
 log = logging.getLogger(__name__)
@@ -30,10 +31,43 @@ class HTCondorParser(Parser):
     '''
     First implementation of the APEL parser for HTCondor
     '''
+    # The fields of a line which go into a record as strings.
+    _TEXT_FIELDS = (0, 1, 5, 6)
+    # The format and job attribute of each field of a line, as condor_history
+    # is asked for them.
+    HISTORY_FORMAT = (('%s|', 'GlobalJobId'),
+                      ('%s|', 'Owner'),
+                      ('%d|', 'RemoteWallClockTime'),
+                      ('%d|', 'RemoteUserCpu'),
+                      ('%d|', 'RemoteSysCpu'),
+                      ('%d|', 'JobStartDate'),
+                      ('%d|', 'EnteredCurrentStatus'),
+                      ('%d|', 'ResidentSetSize_RAW'),
+                      ('%d|', 'ImageSize_RAW'),
+                      ('%d|', 'RequestCpus'))
+
     def __init__(self, site, machine_name, mpi):
         Parser.__init__(self, site, machine_name, mpi)
         log.info('Site: %s; batch system: %s' % (self.site_name, self.machine_name))
 
+    @classmethod
+    def history_command(cls, command, path, since=None):
+        '''
+        Returns the arguments of a condor_history call which writes a line,
+        in the format parsed, for each job in a history file which ran and
+        completed, from the time since (in seconds since the epoch) onwards
+        if it is given.
+
+        command is the list of arguments which runs condor_history.
+        '''
+        constraint = '(JobStartDate>0)&&(CompletionDate>0)'
+        if since is not None:
+            constraint += '&&(EnteredCurrentStatus>=%d)' % since
+        args = list(command) + ['-file', path, '-constraint', constraint]
+        for fmt, attribute in cls.HISTORY_FORMAT:
+            args.extend(['-format', fmt, attribute])
+        return args + ['-format', '\\n', 'EMPTY']
+
     def parse(self, line):
         '''
         Parses single line from accounting log file.
@@ -41,8 +75,21 @@ class HTCondorParser(Parser):
         # condor_history -constraint "JobStartDate > 0" -format "%s|" GlobalJobId -format "%s|" Owner -format "%d|" RemoteWallClockTime -format "%d|" RemoteUserCpu -format "%d|" RemoteSysCpu -format "%d|" JobStartDate -format "%d|" EnteredCurrentStatus -format "%d|" ResidentSetSize_RAW -format "%d|" ImageSize_RAW -format "%d|\n" RequestCpus
         # arcce.rl.ac.uk#2376.0#71589|tatls011|287|107|11|1435671643|1435671930|26636|26832|1|1|
 
-        values = line.strip().split('|')
+        return self._parse_values(line.strip().split('|'))
 
+    def parse_bytes(self, line):
+        '''
+        Parses single line from accounting log file without decoding it first.
+        Only the fields which are kept as strings are decoded, as int() and
+        float() take bytes.
+        '''
+        return self._parse_values(decode_fields(line.strip().split(b'|'),
+                                                self._TEXT_FIELDS))
+
+    def _parse_values(self, values):
+        '''
+        Makes a record from the fields of a line.
+        '''
         # Set scaling factor using value from log if appended to log line.
         cputmult = float(1.0)
         if len(values) > 10 and values[10]:
@@ -26,6 +26,43 @@ from apel.parsers import Parser
 
 log = logging.getLogger(__name__)
 
+# An unquoted field, as matched by LSFParser.EXPR.
+_NUMBER = re.compile(r'-?\d+(?:\.\d*)?')
+
+
+def split_fields(line):
+    '''
+    Splits a line from an accounting log into its fields, unquoting the
+    strings, with the same result as tokenising it with LSFParser.EXPR.
+
+    The line is split at the quotes, so that the pieces are outside and
+    inside quotes in turn, and only the numbers are found with a regular
+    expression.  An empty piece between two quoted pieces is a doubled
+    quote inside a string.  If there is an odd number of quotes, EXPR
+    would have to backtrack to find the end of a string, so the line is
+    tokenised with it instead.
+    '''
+    pieces = line.split('"')
+    if len(pieces) % 2 == 0:
+        return [x[0].startswith('"') and x[0][1:-1].replace('""', '"') or x[0]
+                for x in LSFParser.EXPR.findall(line)]
+
+    findall = _NUMBER.findall
+    fields = findall(pieces[0])
+    last = len(pieces) - 1
+    i = 1
+    while i < last:
+        value = pieces[i]
+        i += 1
+        while not pieces[i] and i < last:
+            value += '"' + pieces[i + 1]
+            i += 2
+        # Empty strings have always been kept with their quotes.
+        fields.append(value or '""')
+        fields.extend(findall(pieces[i]))
+        i += 1
+    return fields
+
 
 class LSFParser(Parser):
     '''
@@ -74,13 +111,7 @@ class LSFParser(Parser):
 
     def parse(self, line):
 
-        # correct handling of double quotes
-        # expression <condition and expr1 or expr2> in Python
-        # means the same as <condition ? expr1 : expr2> in C
-        # the later implementations of Python introduced syntax:
-        # <expr1 if condition else expr2>
-        items = [x[0].startswith('"') and x[0][1:-1].replace('""', '"') or x[0]
-                for x in self.EXPR.findall(line)]
+        items = split_fields(line)
 
         if items[0] != 'JOB_FINISH':
             return None
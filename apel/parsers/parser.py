@@ -25,6 +25,20 @@ log = logging.getLogger(__name__)
 class ParserException(Exception):
     pass
 
+
+def decode_fields(values, indices):
+    '''
+    Decodes from UTF-8 the items at the given indices of a list of byte
+    strings split from a line, in place, and returns the list.  The other
+    items are left as bytes.
+    '''
+    size = len(values)
+    for index in indices:
+        if index < size:
+            values[index] = values[index].decode('utf-8')
+    return values
+
+
 class Parser(object):
     ''' The base class for all parsers '''
 
@@ -52,6 +66,17 @@ class Parser(object):
         '''
         raise NotImplementedError('Unimplemented error from base class.')
 
+    def parse_bytes(self, line):
+        '''
+        Parses a single line from a log file, as read from the file without
+        being decoded.  Parsers which split lines on ASCII delimiters can
+        override this to decode only the fields they use.
+
+        @param line: Line to be parsed, as bytes
+        @return: Filled EventRecord/BlahdRecord
+        '''
+        return self.parse(line.decode('utf-8'))
+
     def recognize(self, line):
         '''
         Method to recognize if the given line of file can be parsed with this parser
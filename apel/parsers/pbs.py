@@ -45,7 +45,6 @@ class PBSParser(Parser):
 
         Please notice, that we use two different separators: ';' and ' '
         '''
-        data = {}
         unused_date, status, jobName, rest = line.split(';')
 
         # we accept only 'E' status
@@ -53,6 +52,26 @@ class PBSParser(Parser):
         if status != 'E':
             return None
 
+        return self._parse_fields(jobName, rest)
+
+    def parse_bytes(self, line):
+        '''
+        Parses single line from PBS log file without decoding it first, so
+        that lines for other events are rejected without being decoded.
+        '''
+        unused_date, status, jobName, rest = line.split(b';')
+
+        if status != b'E':
+            return None
+
+        return self._parse_fields(jobName.decode('utf-8'), rest.decode('utf-8'))
+
+    def _parse_fields(self, jobName, rest):
+        '''
+        Makes a record from the job name and the key=value pairs of an 'E'
+        line.
+        '''
+        data = {}
         for item in rest.split():
             key, value = item.split('=', 1)
             data[key] = value
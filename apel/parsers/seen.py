@@ -0,0 +1,155 @@
+'''
+   Copyright (C) 2024 STFC
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Module containing the SeenIndex class.
+'''
+
+from future.builtins import object, range
+
+import calendar
+import errno
+from hashlib import md5
+import logging
+import os
+import struct
+import time
+
+from apel.db.records import BlahdRecord, EventRecord
+
+log = logging.getLogger(__name__)
+
+# The fields which identify a record, as the primary key of its table does,
+# and the field which dates it, by record type.
+KEYS = {EventRecord: (('MachineName', 'JobName', 'StopTime'), 'StopTime'),
+        BlahdRecord: (('TimeStamp', 'Site', 'LrmsId', 'CE'), 'TimeStamp')}
+
+# Each entry of the index file: the MD5 digest of a record's key and the
+# time of the record, in seconds since the epoch.
+_ENTRY = struct.Struct('!16sq')
+
+
+class SeenIndex(object):
+    '''
+    The keys of the records loaded by a parser, kept in a file between runs
+    so that records which are parsed again, from another copy of a log or
+    an overlapping query, can be dropped before they are loaded.
+
+    A record is identified by the MD5 digest of the fields of its table's
+    primary key (see KEYS), so that two records are only taken to be the
+    same if the database would take them to be the same.  Records of other
+    types are never dropped.
+
+    Only records from the last retention seconds, by the time of the record,
+    are kept in the index.  Older records are always loaded, leaving the
+    database to drop any duplicates as before.
+    '''
+    def __init__(self, path, retention, now=None):
+        self.path = path
+        if now is None:
+            now = time.time()
+        self._oldest = int(now - retention)
+        self._seen = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as index_file:
+                data = index_file.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+
+        seen = self._seen
+        oldest = self._oldest
+        for offset in range(0, len(data) - _ENTRY.size + 1, _ENTRY.size):
+            digest, when = _ENTRY.unpack_from(data, offset)
+            if when >= oldest:
+                seen[digest] = when
+        log.debug('Loaded %d keys of records seen from %s', len(seen), self.path)
+
+    def keys(self, batch):
+        '''
+        Returns a list of the (digest, time) of each row of a batch, or None
+        if records of its type aren't indexed.
+        '''
+        try:
+            fields, time_field = KEYS[batch.record_class]
+        except KeyError:
+            return None
+
+        columns = [batch.column(field) for field in fields]
+        times = batch.column(time_field)
+        keys = []
+        for row, when in enumerate(times):
+            key = '\0'.join(str(column[row]) for column in columns)
+            if when is None or not hasattr(when, 'utctimetuple'):
+                when = None
+            else:
+                when = calendar.timegm(when.utctimetuple())
+            keys.append((md5(key.encode('utf-8')).digest(), when))
+        return keys
+
+    def drop_seen(self, batch):
+        '''
+        Returns the rows of a batch which haven't been seen, as a batch, and
+        the keys to add once they are loaded.  Rows which repeat a key
+        earlier in the batch are dropped too.
+        '''
+        keys = self.keys(batch)
+        if keys is None:
+            return batch, []
+
+        seen = self._seen
+        in_batch = set()
+        rows = []
+        new_keys = []
+        for row, (digest, when) in enumerate(keys):
+            if digest in seen or digest in in_batch:
+                continue
+            in_batch.add(digest)
+            rows.append(row)
+            new_keys.append((digest, when))
+
+        if len(rows) < len(keys):
+            log.debug('Dropped %d records seen before', len(keys) - len(rows))
+            batch = batch.select(rows)
+        return batch, new_keys
+
+    def add(self, keys):
+        '''
+        Adds keys returned by keys() or drop_seen() to the index, leaving
+        out those of records older than the retention.
+        '''
+        seen = self._seen
+        oldest = self._oldest
+        for digest, when in keys:
+            if when is not None and when >= oldest:
+                seen[digest] = when
+
+    def save(self):
+        '''
+        Writes the index to its file, replacing the old one in one step.
+        '''
+        temp_path = self.path + '.tmp'
+        pack = _ENTRY.pack
+        with open(temp_path, 'wb') as index_file:
+            index_file.write(b''.join(pack(digest, when)
+                                      for digest, when in sorted(self._seen.items())))
+        os.rename(temp_path, self.path)
+        log.debug('Saved %d keys of records seen to %s', len(self._seen), self.path)
@@ -18,13 +18,21 @@
 
 from apel.db.records.event import EventRecord
 from apel.parsers import Parser
+from apel.parsers.parser import decode_fields
 
+from io import BytesIO
+import json
 import logging
+import os
 import subprocess
-import xml.dom.minidom
+import time
+import xml.etree.ElementTree as ElementTree
 
 log = logging.getLogger(__name__)
 
+# The multipliers of a node with none defined.
+_NO_MULTIPLIERS = (1.0, 1.0)
+
 class MultiplierError(Exception):
     pass
 
@@ -46,17 +54,60 @@ class SGEParser(Parser):
 
     Line was splitted, if you want to rejoin use empty string as a joiner.
     '''
+    # The fields of a line used as strings: the host name, group, owner and
+    # job number.
+    _TEXT_FIELDS = (1, 2, 3, 5)
 
     def __init__(self, site, machine_name, mpi):
         Parser.__init__(self, site, machine_name, mpi)
         if self._mpi:
             log.warning('SGE MPI accounting may be incomplete.')
-        self.multipliers = self._load_multipliers()
+        # The multipliers are loaded when they're first needed, so that the
+        # cache can be set up first.
+        self._multipliers = None
+        # The (cputmult, wallmult) of each node.
+        self._node_multipliers = None
+        self._multiplier_cache = None
+        self._multiplier_ttl = 0
 
         # This should be set to True in parser.py for versions of Grid Engine
         # using millisecond timestamps (i.e. Univa Grid Engine 8.2.0+).
         self._ms_timestamps = False
 
+    def __getstate__(self):
+        # The multipliers are loaded before the parser is passed to other
+        # processes, so that they aren't loaded by each of them.
+        self._get_node_multipliers()
+        return self.__dict__
+
+    @property
+    def multipliers(self):
+        '''
+        A dictionary {hostname: {cputmult: <value>, wallmult: <value>}},
+        loaded by _load_multipliers when it is first used.
+        '''
+        if self._multipliers is None:
+            self.multipliers = self._load_multipliers()
+        return self._multipliers
+
+    @multipliers.setter
+    def multipliers(self, multipliers):
+        self._multipliers = multipliers
+        self._node_multipliers = dict(
+            (node, (values.get('cputmult', 1.0), values.get('wallmult', 1.0)))
+            for node, values in multipliers.items())
+
+    def set_multiplier_cache(self, path, ttl):
+        """
+        Keep the multipliers from qhost in a file, using them instead of
+        running qhost until they are ttl seconds old.  If qhost fails, older
+        multipliers from the file are used.
+        """
+        log.info('Will cache multipliers from qhost in %s for %d seconds.',
+                 path, ttl)
+        self._multiplier_cache = path
+        self._multiplier_ttl = ttl
+
     def set_ms_timestamps(self, use_ms):
         """
         Set _ms_timestamps to True or False.
@@ -70,56 +121,114 @@ class SGEParser(Parser):
 
     def _load_multipliers(self):
         '''
-        Returns a dictionary {hostname: {cputmult: <value>, wallmult: <value>}}.
+        Returns a dictionary {hostname: {cputmult: <value>, wallmult: <value>}},
+        from the cache if it is fresh enough and otherwise from qhost.
 
         Hosts with no cputmult/wallmult definitions are ignored.
         '''
-        d = {}
+        cache = self._multiplier_cache
+        cached = None
+        if cache is not None:
+            try:
+                age = time.time() - os.stat(cache).st_mtime
+                with open(cache) as cache_file:
+                    cached = json.load(cache_file)
+            except (EnvironmentError, ValueError) as e:
+                log.debug('No cached multipliers in %s: %s', cache, e)
+            else:
+                if age < self._multiplier_ttl:
+                    log.debug('Using multipliers cached in %s', cache)
+                    return cached
+
         try:
             p = subprocess.Popen(["qhost", "-F", "-xml"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             out, err = p.communicate()
             if p.returncode != 0:
                 raise MultiplierError(err)
         except (OSError, MultiplierError):
+            if cached is not None:
+                log.warning("Unable to retrieve multipliers from qhost. Will "
+                            "use those cached in %s.", cache)
+                return cached
             log.warning("Unable to retrieve multipliers from qhost. Will default "
                         "to '1.0'.")
             return {}
 
-        xml_str = xml.dom.minidom.parseString(out)
-        hosts = xml_str.getElementsByTagName("host")
-
-        for host in hosts:
-            host_name = host.getAttribute("name")
-            for resource in host.getElementsByTagName("resourcevalue"):
-                resource_name = resource.getAttribute("name")
-                if resource_name in ["cputmult", "wallmult"]:
-                    try:
-                        resource_value = float(resource.childNodes[0].data)
-                        d[host_name][resource_name] = resource_value
-                    except ValueError:
-                        pass # float conversion
-                    except KeyError:
-                        d[host_name] = {resource_name: resource_value}
+        d = self._read_qhost_xml(out)
+
+        if cache is not None:
+            try:
+                with open(cache + '.tmp', 'w') as cache_file:
+                    json.dump(d, cache_file)
+                os.rename(cache + '.tmp', cache)
+            except EnvironmentError as e:
+                log.warning('Unable to cache multipliers in %s: %s', cache, e)
         return d
 
+    def _read_qhost_xml(self, out):
+        '''
+        Returns the multipliers in the XML written by qhost, which is read an
+        element at a time.
+        '''
+        if not isinstance(out, bytes):
+            out = out.encode('utf-8')
+
+        d = {}
+        host_name = None
+        for event, element in ElementTree.iterparse(BytesIO(out),
+                                                    events=('start', 'end')):
+            if element.tag == 'host':
+                if event == 'start':
+                    host_name = element.get('name')
+                else:
+                    element.clear()
+            elif (event == 'end' and element.tag == 'resourcevalue'
+                    and element.get('name') in ('cputmult', 'wallmult')):
+                try:
+                    d.setdefault(host_name, {})[element.get('name')] = float(element.text)
+                except (TypeError, ValueError):
+                    pass # float conversion
+        return d
+
+    def _get_node_multipliers(self):
+        '''
+        Returns a dictionary {hostname: (cputmult, wallmult)}.
+        '''
+        if self._node_multipliers is None:
+            self.multipliers = self._load_multipliers()
+        return self._node_multipliers
+
     def _get_cpu_multiplier(self, node):
         '''
         Returns a given node's cputmult complex. Defaults to 1.
         '''
-        return self.multipliers.get(node, self.multipliers).get("cputmult", 1.0)
+        return self._get_node_multipliers().get(node, _NO_MULTIPLIERS)[0]
 
     def _get_wall_multiplier(self, node):
         '''
         Returns a given node's wallmult complex. Defaults to 1.
         '''
-        return self.multipliers.get(node, self.multipliers).get("wallmult", 1.0)
+        return self._get_node_multipliers().get(node, _NO_MULTIPLIERS)[1]
 
     def parse(self, line):
         '''
         Parses single line from accounting log file.
         '''
-        values = line.split(':')
+        return self._parse_values(line.split(':'))
 
+    def parse_bytes(self, line):
+        '''
+        Parses single line from accounting log file without decoding it first.
+        Only the fields which are kept as strings, or used to look up the
+        multipliers, are decoded, as int() and float() take bytes.
+        '''
+        return self._parse_values(decode_fields(line.split(b':'),
+                                                self._TEXT_FIELDS))
+
+    def _parse_values(self, values):
+        '''
+        Makes a record from the fields of a line.
+        '''
         if self._mpi:
             procs = int(values[34])
         else:
@@ -132,13 +241,16 @@ class SGEParser(Parser):
         else:
             divisor = 1
 
+        cputmult, wallmult = self._get_node_multipliers().get(values[1],
+                                                              _NO_MULTIPLIERS)
+
         mapping = {'Site'           : lambda x: self.site_name,
                   'JobName'         : lambda x: x[5],
                   'LocalUserID'     : lambda x: x[3],
                   'LocalUserGroup'  : lambda x: x[2],
                   # int() can't parse strings like '1.000'
-                  'WallDuration'    : lambda x: int(round(float(x[13]))*self._get_wall_multiplier(x[1])),
-                  'CpuDuration'     : lambda x: int(round(float(x[36]))*self._get_cpu_multiplier(x[1])),
+                  'WallDuration'    : lambda x: int(round(float(x[13]))*wallmult),
+                  'CpuDuration'     : lambda x: int(round(float(x[36]))*cputmult),
                   'StartTime'       : lambda x: int(round(float(x[9])/divisor)),
                   'StopTime'        : lambda x: int(round(float(x[10])/divisor)),
                   'Infrastructure'  : lambda x: "APEL-CREAM-SGE",
@@ -17,6 +17,7 @@
 '''
 from apel.common import parse_time
 from apel.db.records.event import EventRecord
+from apel.db.records.record import NULL_VALUES, intern_value
 from apel.parsers import Parser
 
 import time
@@ -37,13 +38,190 @@ def parse_local_timestamp(datetime_string):
     return datetime.datetime.utcfromtimestamp(unix_time)
 
 
+# The start of each minute seen by cached_local_timestamp, in UTC, keyed by
+# the start of the timestamps, as in '2013-06-01T10:00', and the local time
+# zone they were converted in, as set by time.tzset.
+_minutes = {}
+_zone = None
+# The cache is emptied when it reaches this size.
+MINUTE_CACHE_SIZE = 50000
+# The end of a timestamp after the minute, as in ':05', and the time it adds
+# to the minute.  time.strptime accepts up to 61 seconds.
+_SECONDS = dict((':%02d' % seconds, datetime.timedelta(seconds=seconds))
+                for seconds in range(62))
+
+
+def cached_local_timestamp(datetime_string):
+    '''
+    As parse_local_timestamp, but converting each minute only once.
+    Changes between summer and winter time happen on the hour, so the
+    seconds can be added to the converted minute.
+
+    The minutes are converted again if the local time zone changes.
+    '''
+    global _zone
+    seconds = _SECONDS.get(datetime_string[16:])
+    if seconds is None:
+        return parse_local_timestamp(datetime_string)
+
+    zone = (time.timezone, time.altzone, time.tzname)
+    if zone != _zone:
+        _minutes.clear()
+        _zone = zone
+
+    minute = datetime_string[:16]
+    start = _minutes.get(minute)
+    if start is None:
+        # This checks the timestamp, as parse_local_timestamp always has.
+        start = parse_local_timestamp(datetime_string) - seconds
+        if len(_minutes) >= MINUTE_CACHE_SIZE:
+            _minutes.clear()
+        _minutes[minute] = start
+    return start + seconds
+
+
+def _text(value):
+    '''Returns a string field as EventRecord.checked would.'''
+    if value.lower() in NULL_VALUES:
+        return None
+    return value
+
+
+def _queue(value):
+    '''
+    Returns the Queue field as EventRecord.checked would, leaving it out if
+    it is empty so that the record handles it (usually by inserting the
+    string 'None').
+    '''
+    if value == '':
+        return _MISSING
+    if value.lower() in NULL_VALUES:
+        return None
+    return intern_value(value)
+
+
+def _duration(value):
+    '''
+    Returns a duration in seconds as parse_time does, taking the common
+    h:m:s form without calling it.
+    '''
+    if '-' not in value:
+        try:
+            hours, minutes, seconds = value.split(':')
+            return 3600*int(hours) + 60*int(minutes) + int(seconds)
+        except ValueError:
+            pass
+    return parse_time(value)
+
+
+def _cpu_time(value):
+    '''
+    Returns the CPU time in seconds, given either CPUTimeRAW, which is a
+    plain integer, or TotalCPU, which has the form d-h:m:s, h:m:s or m:s.s.
+    '''
+    if ':' not in value:
+        return int(value)
+    return _duration(value)
+
+
+def _memory(value):
+    '''Strip unit prefix and return memory size as int in KB.'''
+    if not value:
+        return None
+    multiplier = _UNIT_PREFIXES.get(value[-1:])
+    if multiplier is not None:
+        number = value[:-1]
+        if number.isdigit():
+            return int(number) * multiplier
+        return int(float(number) * multiplier)
+    elif value == '0':
+        raise ValueError("Incorrect memory value of 0. Should be blank or non-zero.")
+    else:
+        raise ValueError("Unsupported unit prefix '%s'. Expected one of [KMGTP]." % value[-1:])
+
+
+# Accepted prefixes and their multiples of KB.
+_UNIT_PREFIXES = {'K': 1, 'M': 1024, 'G': 1024**2, 'T': 1024**3, 'P': 1024**4}
+
+# The value of a field left out of a record.
+_MISSING = EventRecord.empty_values()[0]
+
+
 class SlurmParser(Parser):
     '''
     First implementation of the APEL parser for SLURM
     '''
+    # These statuses indicate the job has stopped and resources were used.
+    ENDED_STATES = ('CANCELLED', 'COMPLETED', 'FAILED', 'NODE_FAIL',
+                    'PREEMPTED', 'TIMEOUT')
+    # The record field made from each column of a line, and how.
+    COLUMNS = (('JobName', 0, _text),
+               ('LocalUserID', 2, _text),
+               ('LocalUserGroup', 3, _text),
+               # SLURM gives timestamps which are in system time.
+               ('StartTime', 4, cached_local_timestamp),
+               ('StopTime', 5, cached_local_timestamp),
+               ('WallDuration', 6, _duration),
+               ('CpuDuration', 7, _cpu_time),
+               ('Queue', 8, _queue),
+               ('Processors', 9, int),
+               ('NodeCount', 10, int),
+               ('MemoryReal', 12, _memory),  # KB
+               ('MemoryVirtual', 13, _memory))  # KB
+
+    # The columns of the lines read, as sacct is asked for them.
+    SACCT_FORMAT = ('JobID,JobName,User,Group,Start,End,Elapsed,CPUTimeRAW,'
+                    'Partition,NCPUS,NNodes,NodeList,MaxRSS,MaxVMSize,State')
+
     def __init__(self, site, machine_name, mpi):
         Parser.__init__(self, site, machine_name, mpi)
         log.info('Site: %s; batch system: %s', self.site_name, self.machine_name)
+        self._compile_columns()
+
+    @classmethod
+    def sacct_command(cls, command, start, end):
+        """
+        Returns the arguments of a sacct call which writes a line, in the
+        format parsed, for each job of any user which ended between the
+        timestamps start and end, given in system time.
+
+        command is the list of arguments which runs sacct.
+        """
+        return list(command) + ['-P', '-n', '--allusers',
+                                '--format=' + cls.SACCT_FORMAT,
+                                '--state=' + ','.join(cls.ENDED_STATES),
+                                '--starttime=' + start, '--endtime=' + end]
+
+    def __getstate__(self):
+        # The compiled columns hold the record module's marker for missing
+        # values, which is only valid in this process, so they are compiled
+        # again when the parser is unpickled (e.g. by a process pool).
+        state = self.__dict__.copy()
+        for name in ('_template', '_columns'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile_columns()
+
+    def _compile_columns(self):
+        """
+        Compile COLUMNS to the slots of the record's values, which start
+        with the fields that are the same for every line.
+        """
+        slots = EventRecord.get_schema().slots
+        checker = EventRecord()
+        self._template = EventRecord.empty_values()
+        for key, value in (('Site', self.site_name),
+                           ('MachineName', self.machine_name),
+                           ('Infrastructure', 'APEL-CREAM-SLURM')):
+            self._template[slots[key]] = checker.checked(key, value)
+        self._columns = [(slots[key], column, convert)
+                         for key, column, convert in self.COLUMNS]
+        self._cpu_slot = slots['CpuDuration']
+        self._start_slot = slots['StartTime']
+        self._stop_slot = slots['StopTime']
 
     def parse(self, line):
         """Parse single line from accounting log file."""
@@ -58,77 +236,23 @@ class SlurmParser(Parser):
         # log.info('line: %s' % (line));
         values = line.strip().split('|')
 
-        # These statuses indicate the job has stopped and resources were used.
-        if values[14] not in ('CANCELLED', 'COMPLETED', 'FAILED',
-                              'NODE_FAIL', 'PREEMPTED', 'TIMEOUT'):
+        if values[14] not in self.ENDED_STATES:
             return None
 
-        # Select CPU time parsing function based on field used.
-        if ':' not in values[7]:
-            # CPUTimeRAW used which is a plain integer (as a string).
-            cput_function = int
-        else:
-            # TotalCPU used which has the form d-h:m:s, h:m:s or m:s.s.
-            cput_function = parse_time
-
-        rmem = self._normalise_memory(values[12])
-
-        vmem = self._normalise_memory(values[13])
-
-        mapping = {'Site'            : lambda x: self.site_name,
-                   'MachineName'     : lambda x: self.machine_name,
-                   'Infrastructure'  : lambda x: "APEL-CREAM-SLURM",
-                   'JobName'         : lambda x: x[0],
-                   'LocalUserID'     : lambda x: x[2],
-                   'LocalUserGroup'  : lambda x: x[3],
-                   'WallDuration'    : lambda x: parse_time(x[6]),
-                   'CpuDuration'     : lambda x: cput_function(x[7]),
-                   # SLURM gives timestamps which are in system time.
-                   'StartTime'       : lambda x: parse_local_timestamp(x[4]),
-                   'StopTime'        : lambda x: parse_local_timestamp(x[5]),
-                   'Queue'           : lambda x: x[8],
-                   'MemoryReal'      : lambda x: rmem,  # KB
-                   'MemoryVirtual'   : lambda x: vmem,  # KB
-                   'Processors'      : lambda x: int(x[9]),
-                   'NodeCount'       : lambda x: int(x[10])
-                   }
-
-        rc = {}
-
-        for key in mapping:
-            rc[key] = mapping[key](values)
-
-        # Delete the Queue key if empty and let the Record class handle it
-        # (usually by inserting the string 'None').
-        if rc['Queue'] == '':
-            del rc['Queue']
+        return self._parse_values(values)
+
+    def _parse_values(self, values):
+        """Make a record from the fields of a line for a job which has ended."""
+        record_values = list(self._template)
+        for slot, column, convert in self._columns:
+            record_values[slot] = convert(values[column])
 
         # Input checking
-        if int(rc['CpuDuration']) < 0:
+        if record_values[self._cpu_slot] < 0:
             raise ValueError('Negative CpuDuration value')
         # No negative WallDuration test as parse_time prevents that.
 
-        if rc['StopTime'] < rc['StartTime']:
+        if record_values[self._stop_slot] < record_values[self._start_slot]:
             raise ValueError('StopTime less than StartTime')
 
-        record = EventRecord()
-        record.set_all(rc)
-        return record
-
-    def _normalise_memory(self, mem):
-        """Strip unit prefix and return memory size as int in KB."""
-
-        # Accepted prefixes and their power of 1024 relative to KB.
-        unit_prefixes = {'K': 0, 'M': 1, 'G': 2, 'T': 3, 'P': 4}
-
-        if mem:
-            if mem[-1:] in unit_prefixes:
-                mem = int(float(mem[:-1]) * 1024**unit_prefixes[mem[-1:]])
-            elif mem == '0':
-                raise ValueError("Incorrect memory value of 0. Should be blank or non-zero.")
-            else:
-                raise ValueError("Unsupported unit prefix '%s'. Expected one of [KMGTP]." % mem[-1:])
-        else:
-            mem = None
-
-        return mem
+        return EventRecord.from_values(record_values)
@@ -27,14 +27,27 @@
 from __future__ import print_function
 from future import standard_library
 standard_library.install_aliases()
-from future.builtins import str
+from future.builtins import str, zip
 
+import calendar
+import errno
+import json
 import logging.config
+import mmap
+import collections
+import itertools
+import multiprocessing
 import os
+import queue
+import shlex
+import subprocess
 import sys
 import re
+import tempfile
+import threading
+import time
 import gzip
-import bz2
+from hashlib import md5
 from argparse import ArgumentParser
 try:
     # Renamed ConfigParser to configparser in Python 3
@@ -44,21 +57,40 @@ except ImportError:
 
 from apel import __version__
 from apel.db import ApelDb, ApelDbException
-from apel.db.records import ProcessedRecord
-from apel.common import calculate_hash, set_up_logging, LOG_BREAK
+from apel.db.records import ProcessedRecord, RecordBatch
+from apel.db.spool import RecordSpool
+from apel.common import (calculate_hash, decode_fqan, detect_compression,
+                         gzip_size, open_log, iter_lines, Bzip2Reader,
+                         HashingReader, set_up_logging,
+                         LOG_BREAK)
 from apel.common.exceptions import install_exc_handler, default_handler
+from apel.parsers import Parser
 from apel.parsers.blah import BlahParser
 from apel.parsers.lsf import LSFParser
 from apel.parsers.sge import SGEParser
 from apel.parsers.pbs import PBSParser
 from apel.parsers.slurm import SlurmParser
+from apel.parsers.seen import SeenIndex
 from apel.parsers.htcondor import HTCondorParser
 
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
 
 LOGGER_ID = 'parser'
 # How many records should be put/fetched to/from database
 # in single query
 BATCH_SIZE = 1000
+# How many parsed batches may wait to be loaded while the database catches up
+WRITER_QUEUE_SIZE = 4
+# How long the daemon waits, in seconds, for more changes to the logs after
+# one is seen, so that a burst of writes is parsed at once
+SETTLE_TIME = 1
+# With a pool of workers, uncompressed files are split into byte ranges of
+# about this size to be parsed in parallel.
+RANGE_SIZE = 32 * 1024 * 1024
 DB_BACKEND = 'mysql'
 PARSERS = {
            'PBS': PBSParser,
@@ -88,135 +120,622 @@ def find_sub_dirs(dirpath):
     return alldirs
 
 
-def parse_file(parser, apel_db, fp, replace):
+class ParseResult(object):
+    '''
+    Counts of the lines in one log file, and of the errors raised while
+    parsing them.
+
+    If parsing resumed part way through the file, first_line is the first
+    line parsed and the counts are of the lines from there on.  For an
+    uncompressed file, stop_byte and prefix_hash are where parsing can
+    resume next time (see ProcessedRecord).  file_hash is the hash of the
+    whole file as calculate_hash gives it, found while the file was read.
+
+    If failures is a list, the lines which failed to parse are kept in it as
+    (line number, error) instead of being logged, so that they can be
+    logged by the process which adds them up.
+    '''
+    def __init__(self, first_line=1):
+        self.first_line = first_line
+        # The number of the last line read.
+        self.lines = first_line - 1
+        self.parsed = 0
+        self.failed = 0
+        self.ignored = 0
+        # we will save information about errors
+        # default behaviour: show the list of errors with information
+        # how many times given error was raised
+        self.exceptions = {}
+        self.stop_byte = None
+        self.prefix_hash = None
+        self.file_hash = None
+        self.failures = None
+
+    def add(self, other):
+        '''
+        Adds the counts of a ParseResult for the lines which follow those
+        counted so far, logging the lines it kept as failures.
+        '''
+        log = logging.getLogger(LOGGER_ID)
+        for line_number, error in other.failures or ():
+            log.debug('Error %s on line %d', error, self.lines + line_number)
+        self.lines += other.lines
+        self.parsed += other.parsed
+        self.failed += other.failed
+        self.ignored += other.ignored
+        for error, count in other.exceptions.items():
+            self.exceptions[error] = self.exceptions.get(error, 0) + count
+
+    def log_summary(self, parser):
+        '''Log how the lines of the file were handled.'''
+        log = logging.getLogger(LOGGER_ID)
+        if self.first_line > 1:
+            log.info('Resumed parsing at line %d', self.first_line)
+        if self.lines == 1:
+            log.info('Ignored empty file.')
+        elif self.parsed == 0:
+            log.warning('Failed to parse file.  Is %s correct?', parser.__class__.__name__)
+        else:
+            log.info('Parsed %d lines', self.parsed)
+            log.info('Ignored %d lines (incomplete jobs)', self.ignored)
+            log.info('Failed to parse %d lines', self.failed)
+
+            for error in self.exceptions:
+                log.error('%s raised %d times', error, self.exceptions[error])
+
+
+class LogReader(object):
+    '''
+    Iterates over the complete lines of an uncompressed log file, keeping
+    the offset just after the last one read and the MD5 hash of the bytes
+    up to there.  A partial last line, which may still be being written,
+    is read but not returned, so that it is parsed once it is complete.
+    '''
+    def __init__(self, fp, offset=0, md=None):
+        self._fp = fp
+        self.offset = offset
+        self._md = md5() if md is None else md
+
+    def __iter__(self):
+        for line in self._fp:
+            if not line.endswith(b'\n'):
+                # Only the last line of a file can be partial, and it is
+                # still read so that the whole file is hashed.
+                for _ in self._fp:
+                    pass
+                return
+            self.offset += len(line)
+            self._md.update(line)
+            yield line
+
+    @property
+    def prefix_hash(self):
+        '''The MD5 hash of the bytes before offset.'''
+        return self._md.hexdigest()
+
+
+def parse_lines(parser, fp, result):
     '''
-    Parses file from blah/batch system
+    Parses the lines of a file from blah/batch system, yielding the records
+    in RecordBatches of up to BATCH_SIZE records.
 
     @param parser: parser object of correct type
-    @param apel_db: object to access APEL database
     @param fp: file object with log
-    @return: number of correctly parsed files from file,
-             total number of lines in file
+    @param result: ParseResult in which to count the lines
     '''
     log = logging.getLogger(LOGGER_ID)
-    records = []
-
-    # we will save information about errors
-    # default behaviour: show the list of errors with information
-    # how many times given error was raised
-    exceptions = {}
+    # Records are gathered column by column and loaded BATCH_SIZE at a time.
+    batch = None
 
-    line_number = 0
-    parsed = 0
-    failed = 0
-    ignored = 0
+    # The lines are passed to the parser undecoded, so that parsers which
+    # split them on ASCII delimiters need only decode the fields they use.
+    if isinstance(parser, Parser):
+        parse = parser.parse_bytes
+    else:
+        parse = lambda line: parser.parse(line.decode('utf-8'))
 
-    for line_number, line in enumerate(fp, start=1):
-        line = line.decode('utf-8')
+    for line_number, line in enumerate(fp, start=result.first_line):
+        result.lines = line_number
 
         try:
-            record = parser.parse(line)
+            record = parse(line)
         except Exception as e:
-            log.debug('Error %s on line %d', e, line_number)
-            failed += 1
-            if str(e) in exceptions:
-                exceptions[str(e)] += 1
+            if result.failures is None:
+                log.debug('Error %s on line %d', e, line_number)
+            else:
+                result.failures.append((line_number, str(e)))
+            result.failed += 1
+            if str(e) in result.exceptions:
+                result.exceptions[str(e)] += 1
             else:
-                exceptions[str(e)] = 1
+                result.exceptions[str(e)] = 1
         else:
             if record is not None:
-                records.append(record)
-                parsed += 1
+                if batch is None:
+                    batch = RecordBatch(type(record))
+                batch.append_record(record)
+                result.parsed += 1
             else:
-                ignored += 1
-            if len(records) % BATCH_SIZE == 0 and len(records) != 0:
-                apel_db.load_records(records, replace=replace)
-                del records
-                records = []
-
-    apel_db.load_records(records, replace=replace)
-
-    if line_number == 1:
-        log.info('Ignored empty file.')
-    elif parsed == 0:
-        log.warning('Failed to parse file.  Is %s correct?', parser.__class__.__name__)
+                result.ignored += 1
+            if batch is not None and len(batch) == BATCH_SIZE:
+                yield batch
+                batch = None
+
+    if batch is not None:
+        yield batch
+
+
+def load_batch(apel_db, batch, replace, seen=None):
+    '''
+    Loads a batch of parsed records into the database.
+
+    If a SeenIndex is given, records it has seen before are dropped first,
+    unless they are to replace those in the database, and the keys of the
+    records are added to it once they are loaded.
+    '''
+    if seen is None:
+        apel_db.load_records(batch, replace=replace)
+        return
+
+    if replace:
+        keys = seen.keys(batch) or []
     else:
-        log.info('Parsed %d lines', parsed)
-        log.info('Ignored %d lines (incomplete jobs)', ignored)
-        log.info('Failed to parse %d lines', failed)
+        batch, keys = seen.drop_seen(batch)
+    if len(batch) > 0:
+        apel_db.load_records(batch, replace=replace)
+    seen.add(keys)
+
+
+class BatchWriter(object):
+    '''
+    Loads RecordBatches in a background thread, so that the next batch is
+    parsed while the last one is written to the database.
+
+    Batches are loaded in the order they are put, and at most
+    WRITER_QUEUE_SIZE of them wait to be loaded before put blocks.  The
+    writer is the only user of the database connection until it is closed.
+
+    A group of batches, such as those of one file, is ended by mark, whose
+    callback is passed the first error raised loading them, or None once
+    they have all been loaded.  The batches after an error are dropped up to
+    the next mark.  close raises any error after the last mark, or raised
+    by a callback.
+    '''
+    def __init__(self, load):
+        self._load = load
+        self._queue = queue.Queue(WRITER_QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, batch):
+        '''Queues a batch to be loaded.'''
+        self._queue.put((batch, None))
+
+    def mark(self, callback):
+        '''
+        Queues callback to be called, in the writer's thread, with the error
+        raised loading the batches since the last mark, or None.
+        '''
+        self._queue.put((None, callback))
+
+    def close(self):
+        '''
+        Waits for the queued batches to be loaded, raising any error since
+        the last mark.
+        '''
+        self._queue.put((None, None))
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        error = None
+        while True:
+            batch, callback = self._queue.get()
+            if batch is not None:
+                if error is None:
+                    try:
+                        self._load(batch)
+                    except Exception as e:
+                        error = e
+            elif callback is not None:
+                try:
+                    callback(error)
+                except Exception as e:
+                    # Raised by close, rather than stopping the thread.
+                    if self._error is None:
+                        self._error = e
+                error = None
+            else:
+                if self._error is None:
+                    self._error = error
+                return
+
+
+def read_log_file(path, function):
+    '''
+    Returns the result of calling function with the file at path opened as
+    a bzip2 file, a gzip file or a regular file, as its first bytes show.
+    '''
+    with open_log(path) as fp:
+        return function(fp)
+
+
+def resume_log_file(path, stop_byte, prefix_hash):
+    '''
+    Opens the file at path to carry on reading from stop_byte, if the file
+    still starts with the bytes whose MD5 hash is prefix_hash.
+
+    Returns the open file, the MD5 hash object of the bytes before
+    stop_byte and the number of lines in them, or None if the file has
+    changed.
+    '''
+    fp = open(path, 'rb')
+    try:
+        md = md5()
+        lines = 0
+        remaining = stop_byte
+        while remaining > 0:
+            # 128kiB buffer
+            data = fp.read(min(remaining, 131072))
+            if not data:
+                break
+            md.update(data)
+            lines += data.count(b'\n')
+            remaining -= len(data)
+    except Exception:
+        fp.close()
+        raise
+
+    if remaining > 0 or md.hexdigest() != prefix_hash:
+        fp.close()
+        return None
+
+    return fp, md, lines
+
+
+def parse_ranges(pool, path, fp, md, load, result):
+    '''
+    Parses an uncompressed log file from the current position of fp in byte
+    ranges of about RANGE_SIZE, split at line ends, which the workers of
+    pool parse in parallel.  The RecordBatches of each range are passed to
+    load, and its lines counted in result, in the order of the file.
+
+    md is the MD5 hash object of the bytes before the current position, to
+    be carried on to the hash of the whole file.
+    '''
+    start = fp.tell()
+    mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        size = len(mapped)
+        # The end of the last complete line.  A partial line after it is
+        # parsed once it is complete (see LogReader).
+        stop_byte = mapped.rfind(b'\n') + 1
+        ranges = []
+        while start < stop_byte:
+            end = mapped.find(b'\n', min(start + RANGE_SIZE, stop_byte) - 1) + 1
+            ranges.append((start, end))
+            start = end
+
+        # One range more than the workers is kept in flight, so that they
+        # don't wait on the range being loaded while the rest of the file
+        # isn't parsed ahead of it.
+        results = imap_bounded(pool, _parse_range_in_worker,
+                               [(path, start, end) for start, end in ranges],
+                               pool_size(pool) + 1)
+        for (start, end), (batches, part) in zip(ranges, results):
+            for batch in batches:
+                load(batch)
+            result.add(part)
+            # The hash is found here while the workers parse later ranges.
+            md.update(mapped[start:min(end, stop_byte)])
+
+        result.stop_byte = stop_byte
+        result.prefix_hash = md.hexdigest()
+        md.update(mapped[stop_byte:size])
+        result.file_hash = md.hexdigest()
+    finally:
+        mapped.close()
+
+    return result
+
+
+def parse_log_file(parser, path, load, resume=None, pool=None):
+    '''
+    Parses the log file at path, passing each RecordBatch of its records to
+    load, and returns a ParseResult.
+
+    The file is read once, to parse it and to find its hash at the same
+    time.
+
+    resume is the (StopByte, PrefixHash) of an earlier parse of the file.
+    If the file still starts with the bytes parsed then, only the lines
+    after them are parsed.
+
+    If a pool is given, an uncompressed file with more than RANGE_SIZE bytes
+    to parse is parsed by its workers (see parse_ranges).
+    '''
+    def parse(reader, hasher, result):
+        for batch in parse_lines(parser, reader, result):
+            load(batch)
+        if isinstance(reader, LogReader):
+            result.stop_byte = reader.offset
+            result.prefix_hash = reader.prefix_hash
+        result.file_hash = hasher.hexdigest()
+        return result
+
+    def parse_uncompressed(fp, md, result):
+        offset = fp.tell()
+        if pool is not None and os.fstat(fp.fileno()).st_size - offset > RANGE_SIZE:
+            return parse_ranges(pool, path, fp, md, load, result)
+        # Uncompressed files are read through a memory map, and only the
+        # place reached in them is kept.  The hash of the whole file carries
+        # on from that of any bytes skipped.
+        hasher = HashingReader(iter_lines(fp), md.copy())
+        return parse(LogReader(hasher, offset, md), hasher, result)
+
+    if resume is not None:
+        resumed = resume_log_file(path, *resume)
+        if resumed is not None:
+            fp, md, lines = resumed
+            with fp:
+                return parse_uncompressed(fp, md, ParseResult(first_line=lines + 1))
+
+    def parse_whole(fp):
+        if isinstance(fp, gzip.GzipFile):
+            hasher = HashingReader(fp)
+            return parse(hasher, hasher, ParseResult())
+        return parse_uncompressed(fp, md5(), ParseResult())
+
+    # A bzip2 file is decompressed here, as its hash is that of its
+    # compressed bytes (see calculate_hash).
+    if detect_compression(path) == 'bz2':
+        with open(path, 'rb') as fp:
+            reader = Bzip2Reader(fp)
+            return parse(reader, reader, ParseResult())
+    return read_log_file(path, parse_whole)
+
+
+def imap_bounded(pool, function, iterable, window):
+    '''
+    Yields the results of function for each item of iterable, in order, as
+    pool.imap does, but with at most window calls given to the pool ahead
+    of the results read.  Unlike imap, the results waiting to be read can't
+    pile up in memory while the reader is held up, as by the database.
+    '''
+    iterator = iter(iterable)
+    pending = collections.deque(pool.apply_async(function, (item,))
+                                for item in itertools.islice(iterator, window))
+    while pending:
+        result = pending.popleft().get()
+        # The next call is given to the pool before the result is used.
+        for item in itertools.islice(iterator, 1):
+            pending.append(pool.apply_async(function, (item,)))
+        yield result
+
+
+def pool_size(pool):
+    '''Returns the number of worker processes of a multiprocessing pool.'''
+    # The pool doesn't make this public.
+    return pool._processes
+
 
-        for error in exceptions:
-            log.error('%s raised %d times', error, exceptions[error])
+# The parser used by the worker processes of a pool made by handle_parsing.
+_worker_parser = None
 
-    return parsed, line_number
+def _init_worker(parser):
+    '''Set up a worker process to parse files with the given parser.'''
+    global _worker_parser
+    _worker_parser = parser
 
 
-def scan_dir(parser, dirpath, reparse, expr, apel_db, processed):
+def _parse_in_worker(args):
+    '''
+    Parses a file in a worker process, given its path and where to resume.
+    Returns a list of RecordBatches and the ParseResult, or Nones and the
+    error if the file could not be read.
+    '''
+    path, resume = args
+    batches = []
+    try:
+        result = parse_log_file(_worker_parser, path, batches.append, resume)
+    except IOError as e:
+        return (None, None), e
+    return (batches, result), None
+
+
+def _parse_range_in_worker(args):
+    '''
+    Parses a byte range of a file in a worker process, given the path of
+    the file and the start and end of the range.  Returns a list of
+    RecordBatches and a ParseResult, in which the lines are numbered from
+    the start of the range and those which failed are kept, not logged.
+    '''
+    path, start, end = args
+    result = ParseResult()
+    result.failures = []
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        batches = list(parse_lines(_worker_parser, iter_lines(fp, end), result))
+    return batches, result
+
+
+def file_identity(path):
+    '''
+    Returns the size, modification time (in whole seconds) and inode of a
+    file, which are taken to identify it unless it changes.  Its name is not
+    part of its identity, so that a log renamed by rotation is still
+    recognised.
+    '''
+    st = os.stat(path)
+    return st.st_size, int(st.st_mtime), st.st_ino
+
+
+class ProcessedIndex(object):
+    '''
+    The files parsed in earlier runs, indexed once per run so that scan_dir
+    can look files up without searching the whole list for each.
+
+    The files may be given as the ProcessedFiles read by
+    read_processed_files, or as ProcessedRecords.  A ProcessedRecord is only
+    made for a ProcessedFile when the file is found, which is the same
+    record each time.
+    '''
+
+    def __init__(self, processed, host_name=None):
+        self._host_name = host_name
+        # The record of each file given as one, or made for it so far.
+        self._records = {}
+        # The first file with each hash.
+        self._by_hash = {}
+        # The files which haven't changed since they were parsed, by
+        # identity (see file_identity).  A file which has been renamed, as
+        # log rotation does, keeps its identity.
+        self._by_identity = {}
+        # The sizes of the files with an identity, and the names of those
+        # without, which was not recorded before version 2.6.0.
+        self.sizes = set()
+        self.unidentified = set()
+        # The sizes modulo 2**32, as a gzip file records that of its content.
+        self._gzip_sizes = set()
+        # The furthest each uncompressed file has been parsed, so that a
+        # file which has grown since can be resumed from there.
+        self._furthest = {}
+
+        for pf in processed:
+            if isinstance(pf, ProcessedRecord):
+                record = pf
+                pf = record.to_processed_file()
+                self._records.setdefault(pf, record)
+            self._by_hash.setdefault(pf.Hash, pf)
+
+            identity = (pf.FileSize, pf.ModifiedTime, pf.Inode)
+            if None not in identity:
+                self._by_identity.setdefault(identity, pf)
+                self.sizes.add(identity[0])
+                self._gzip_sizes.add(identity[0] % 2**32)
+            else:
+                self.unidentified.add(pf.FileName)
+
+            if pf.StopByte and pf.PrefixHash is not None:
+                furthest = self._furthest.get(pf.FileName)
+                if furthest is None or pf.StopByte > furthest.StopByte:
+                    self._furthest[pf.FileName] = pf
+
+    def by_identity(self, identity):
+        '''Returns the record of the file with an identity, if there is one.'''
+        return self._record(self._by_identity.get(identity))
+
+    def by_hash(self, file_hash):
+        '''Returns the record of the first file with a hash, if there is one.'''
+        return self._record(self._by_hash.get(file_hash))
+
+    def furthest(self, path):
+        '''
+        Returns the record of the furthest the uncompressed file at path has
+        been parsed, if it has been.
+        '''
+        return self._record(self._furthest.get(path))
+
+    def may_have_hash(self, path, identity):
+        '''
+        Returns whether the file at path, which has not been found by its
+        identity, could have the hash of a processed file.  If not, the file
+        is parsed without reading it first to find its hash, which is found
+        while it is parsed.
+
+        A file can only have the same hash as another one of the same size,
+        as its hash is that of its bytes (see calculate_hash).  The hash of
+        a gzip file is that of its content, so it could be a file parsed
+        before it was compressed if the size of its content, as recorded at
+        its end, is the size of one.
+        '''
+        if path in self.unidentified or identity[0] in self.sizes:
+            return True
+        if detect_compression(path) == 'gzip':
+            return gzip_size(path) in self._gzip_sizes
+        return False
+
+    def _record(self, pf):
+        '''Returns the ProcessedRecord of a file, making it the first time.'''
+        if pf is None:
+            return None
+        record = self._records.get(pf)
+        if record is None:
+            record = ProcessedRecord.from_processed_file(self._host_name, pf)
+            self._records[pf] = record
+        return record
+
+
+def scan_dir(parser, dirpath, reparse, expr, apel_db, processed, pool=None,
+             seen=None):
     '''
     Check all files in a directory and parse them if:
      - the names match the regular expression
      - the file is not already in the list of processed files
 
      Add newly parsed files to the processed files list and return it.
+
+     If a multiprocessing pool set up by handle_parsing is given, the files
+     are parsed by its workers while the records are loaded here, in the
+     same order as without the pool.
+
+     The processed files may be given as a ProcessedIndex, which
+     ParsingTask builds once for all the directories it scans.
+
+     If a SeenIndex is given, it is used to drop records loaded before.
     '''
     skipped_warning_flag = False
     log = logging.getLogger(LOGGER_ID)
     updated = []
+    # (path, name, identity, previous record) of each file to parse
+    to_parse = []
+
+    if not isinstance(processed, ProcessedIndex):
+        processed = ProcessedIndex(processed)
+
     try:
         log.info('Scanning directory: %s', dirpath)
 
         for item in sorted(os.listdir(dirpath)):
             abs_file = os.path.join(dirpath, item)
             if os.path.isfile(abs_file) and expr.match(item):
-                # first, calculate the hash of the file:
-                file_hash = calculate_hash(abs_file)
-                found = False
+                identity = file_identity(abs_file)
+                # A file which hasn't changed since it was parsed needn't
+                # be read to find its hash.
+                pf = processed.by_identity(identity)
+                # Otherwise the file is only read first to find its hash if
+                # it could match a processed file; if not, the hash is found
+                # while it is parsed.
+                if (pf is None and not reparse
+                        and processed.may_have_hash(abs_file, identity)):
+                    # next, try to find corresponding entry
+                    # in database
+                    pf = processed.by_hash(calculate_hash(abs_file))
+                    if pf is not None and pf.get_field('FileName') == abs_file:
+                        # Record the identity, so the file needn't be read
+                        # next time.
+                        pf.set_field('FileSize', identity[0])
+                        pf.set_field('ModifiedTime', identity[1])
+                        pf.set_field('Inode', identity[2])
+
+                found = pf is not None
                 unparsed = False
-                # next, try to find corresponding entry
-                # in database
-                for pf in processed:
-                    if pf.get_field('Hash') == file_hash:
-                        # we found corresponding record
-                        # we will leave this record unmodified
-                        updated.append(pf)
-                        found = True
-                        # Check for zero parsed lines so we can warn later on.
-                        if pf.get_field('Parsed') == 0:
-                            unparsed = True
-                        break  # If we find a match, no need to keep checking.
-
-                if reparse or not found:
-                    try:
-                        log.info('Parsing file: %s', abs_file)
-                        # try to open as a bzip2 file, then as a gzip file,
-                        # and if it fails try as a regular file
-                        #
-                        # bz2/gzip doesn't raise an exception when trying
-                        # to open a non-gzip file.  Only a read (such as
-                        # during parsing) does that.  For files of a wrong
-                        # format we will get IOError, empty files can
-                        # give EOFError as well.
-                        for method in (bz2.BZ2File, gzip.open, open):
-                            try:
-                                with method(abs_file, 'rb') as fp:
-                                    parsed, total = parse_file(parser, apel_db,
-                                                               fp, reparse)
-                                break
-                            except (IOError, EOFError):
-                                if method == open:
-                                    raise
-                    except IOError as e:
-                        log.error('Cannot parse file %s: %s', item, e)
-                    except ApelDbException as e:
-                        log.error('Failed to parse %s due to a database problem: %s', item, e)
-                    else:
-                        pr = ProcessedRecord()
-                        pr.set_field('HostName', parser.machine_name)
-                        pr.set_field('Hash', file_hash)
-                        pr.set_field('FileName', abs_file)
-                        pr.set_field('StopLine', total)
-                        pr.set_field('Parsed', parsed)
-                        updated.append(pr)
+                if found:
+                    # we found corresponding record
+                    # we will leave this record unmodified
+                    updated.append(pf)
+                    # Check for zero parsed lines so we can warn later on.
+                    if pf.get_field('Parsed') == 0:
+                        unparsed = True
+
+                if reparse:
+                    to_parse.append((abs_file, item, identity, None))
+                elif not found:
+                    to_parse.append((abs_file, item, identity,
+                                     processed.furthest(abs_file)))
                 elif unparsed:
                     if not skipped_warning_flag:
                         log.info("Files skipped: rerun at DEBUG log level to see details.")
@@ -231,6 +750,90 @@ def scan_dir(parser, dirpath, reparse, expr, apel_db, processed):
             elif os.path.isfile(abs_file):
                 log.debug('Filename does not match pattern: %s', item)
 
+        def loaded(item, pr):
+            # The writer calls this once the batches of a file are loaded, so
+            # that the file is only recorded if all its records were loaded.
+            def callback(error):
+                if error is None:
+                    if pr is not None:
+                        updated.append(pr)
+                elif isinstance(error, ApelDbException):
+                    log.error('Failed to parse %s due to a database problem: %s',
+                              item, error)
+                else:
+                    log.error('Failed to load the records of %s: %s', item, error)
+            return callback
+
+        def resume_point(pf):
+            if pf is None:
+                return None
+            return pf.get_field('StopByte'), pf.get_field('PrefixHash')
+
+        # Large uncompressed files are split into ranges to be parsed by the
+        # workers, and the other files are each parsed by one of them.
+        split = [pool is not None and identity[0] > RANGE_SIZE
+                 and detect_compression(path) is None
+                 for path, _, identity, _ in to_parse]
+        whole = [(path, resume_point(pf))
+                 for (path, _, _, pf), is_split in zip(to_parse, split)
+                 if not is_split]
+        if pool is not None and len(whole) > 1:
+            # The workers return the files in order, with no more files
+            # parsed than there are workers ahead of those being loaded.
+            results = imap_bounded(pool, _parse_in_worker, whole, pool_size(pool))
+        else:
+            results = None
+
+        # The records are loaded by another thread while the next batch, or
+        # the next file, is parsed.
+        writer = BatchWriter(lambda batch: load_batch(apel_db, batch, reparse, seen))
+        load = writer.put
+        try:
+            for (abs_file, item, identity, pf), is_split in zip(to_parse, split):
+                pr = None
+                try:
+                    log.info('Parsing file: %s', abs_file)
+                    if results is None or is_split:
+                        result = parse_log_file(parser, abs_file, load,
+                                                resume_point(pf), pool)
+                    else:
+                        (batches, result), error = next(results)
+                        if error is not None:
+                            raise error
+                        for batch in batches:
+                            load(batch)
+                    result.log_summary(parser)
+                except IOError as e:
+                    log.error('Cannot parse file %s: %s', item, e)
+                else:
+                    parsed = result.parsed
+                    if result.first_line > 1:
+                        # Add the lines parsed before.
+                        parsed += pf.get_field('Parsed') or 0
+                    pr = ProcessedRecord()
+                    pr.set_field('HostName', parser.machine_name)
+                    pr.set_field('Hash', result.file_hash)
+                    pr.set_field('FileName', abs_file)
+                    pr.set_field('StopLine', result.lines)
+                    pr.set_field('Parsed', parsed)
+                    pr.set_field('StopByte', result.stop_byte)
+                    pr.set_field('PrefixHash', result.prefix_hash)
+                    pr.set_field('FileSize', identity[0])
+                    pr.set_field('ModifiedTime', identity[1])
+                    pr.set_field('Inode', identity[2])
+                # Any batches of a file which couldn't be read are still
+                # loaded, as before, but the file isn't recorded.
+                writer.mark(loaded(item, pr))
+        except BaseException:
+            # The error which stopped the parsing is raised, not any error
+            # the writer raises as it is closed.
+            try:
+                writer.close()
+            except Exception as e:
+                log.error('Failed to load records: %s', e)
+            raise
+        writer.close()
+
         return updated
 
     except KeyError as e:
@@ -238,96 +841,834 @@ def scan_dir(parser, dirpath, reparse, expr, apel_db, processed):
         log.fatal('Check the section for %s , %s', parser, e)
         sys.exit(1)
 
-def handle_parsing(log_type, apel_db, cp):
+def read_watermark(path):
     '''
-    Create the appropriate parser, and scan the configured directory
-    for log files, parsing them.
+    Returns the time, in seconds since the epoch, saved in a watermark file,
+    or None if there is no file.
+    '''
+    try:
+        with open(path) as watermark_file:
+            text = watermark_file.read()
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    try:
+        return int(text.strip())
+    except ValueError:
+        raise ParserConfigException('Invalid watermark in %s: %r' % (path, text))
 
-    Update the database with the parsed files.
+
+def replace_file(path, text):
+    '''
+    Writes a file, replacing any previous one in one step so that it is never
+    left half written.
+    '''
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as new_file:
+        new_file.write(text)
+    os.rename(temp_path, path)
+
+
+def write_watermark(path, watermark):
+    '''Saves a time in a watermark file.'''
+    replace_file(path, '%d\n' % watermark)
+
+
+def utc_offset(timestamp):
+    '''
+    Returns the offset from UTC, in seconds, of the local time at a time in
+    seconds since the epoch.
+    '''
+    return calendar.timegm(time.localtime(timestamp)) - int(timestamp)
+
+
+def query_sacct(parser, apel_db, command, start, end, seen=None):
+    '''
+    Runs sacct for the jobs which ended between two times, in seconds since
+    the epoch, loading the records parsed from its output as it is written.
+
+    Raises IOError if sacct can't be run or fails.
     '''
     log = logging.getLogger(LOGGER_ID)
-    log.info('Setting up parser for %s files', log_type)
-    if log_type == 'blah':
-        section = 'blah'
+    # sacct takes local times, and may take one which is repeated when the
+    # clocks go back as the later of the two, so the window starts earlier
+    # by any change of the UTC offset near its start.  The jobs found again
+    # are only loaded once.
+    start -= abs(utc_offset(start + 86400) - utc_offset(start - 86400))
+    start, end = [time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t))
+                  for t in (start, end)]
+    log.info('Querying sacct for jobs which ended from %s to %s', start, end)
+
+    result = ParseResult()
+    errors = tempfile.TemporaryFile()
+    try:
+        try:
+            proc = subprocess.Popen(parser.sacct_command(command, start, end),
+                                    stdout=subprocess.PIPE, stderr=errors)
+        except OSError as e:
+            raise IOError('Cannot run %s: %s' % (command[0], e))
+        try:
+            for batch in parse_lines(parser, proc.stdout, result):
+                load_batch(apel_db, batch, False, seen)
+        finally:
+            proc.stdout.close()
+            status = proc.wait()
+        if status != 0:
+            errors.seek(0)
+            raise IOError('%s exited with status %d: %s'
+                          % (command[0], status,
+                             errors.read().decode('utf-8', 'replace').strip()))
+    finally:
+        errors.close()
+
+    if result.lines == 0:
+        log.info('No jobs ended in this window.')
     else:
-        section = 'batch'
+        result.log_summary(parser)
+
+
+def parse_sacct(parser, apel_db, command, watermark_path, window, delay,
+                now=None, seen=None):
+    '''
+    Queries sacct for the jobs which have ended since the watermark, in time
+    windows of at most window seconds, ending delay seconds before now to
+    allow for jobs which are still being written to the SLURM database.
+
+    The end of each window is saved as the watermark once its records are
+    loaded, so each window is queried once.  Consecutive windows share their
+    boundary second, and overlap further where the clocks change (see
+    query_sacct); a job which ended then is found by both queries, but is
+    only loaded once as the records are inserted without replacement.
+    If there is no watermark, one window before the end is queried.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    if now is None:
+        now = int(time.time())
+    end = now - delay
+
+    start = read_watermark(watermark_path)
+    if start is None:
+        start = end - window
+        log.info('No sacct watermark found in %s', watermark_path)
 
-    site = cp.get('site_info', 'site_name')
-    if site is None or site == '':
-        raise ParserConfigException('Site name must be configured.')
+    while start < end:
+        stop = min(start + window, end)
+        try:
+            query_sacct(parser, apel_db, command, start, stop, seen)
+        except IOError as e:
+            log.error('Failed to query sacct: %s', e)
+            break
+        except ApelDbException as e:
+            log.error('Failed to query sacct due to a database problem: %s', e)
+            break
+        write_watermark(watermark_path, stop)
+        start = stop
+
+
+def read_cursors(path):
+    '''
+    Returns the cursors saved in a file by write_cursors, or an empty dict if
+    there is no file.
+    '''
+    try:
+        with open(path) as cursor_file:
+            text = cursor_file.read()
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return {}
+        raise
+    try:
+        return dict((name, (cursor['time'], set(cursor['jobs'])))
+                    for name, cursor in json.loads(text).items())
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ParserConfigException('Invalid cursors in %s' % path)
+
+
+def write_cursors(path, cursors):
+    '''
+    Saves the cursor of each history file: the latest completion time of
+    the jobs read from it, and the IDs of the jobs which completed then.
+    '''
+    replace_file(path, json.dumps(dict((name, {'time': completed,
+                                               'jobs': sorted(jobs)})
+                                       for name, (completed, jobs) in cursors.items()),
+                                  indent=1, sort_keys=True))
+
+
+class HistoryReader(object):
+    '''
+    Iterates over the lines written by condor_history, leaving out the jobs
+    already read at the time of the cursor given and moving the cursor on
+    to the last job read.
+
+    condor_history writes the newest jobs first, so the jobs are checked
+    against the cursor as it was given, while the latest time seen and the
+    jobs at that time are gathered separately.
+    '''
+    def __init__(self, fp, cursor=None):
+        self._fp = fp
+        if cursor is None:
+            self.cursor = (None, set())
+        else:
+            self.cursor = cursor
 
-    machine_name = cp.get('site_info', 'lrms_server')
-    if machine_name is None or machine_name == '':
-        raise ParserConfigException('LRMS hostname must be configured.')
+    def __iter__(self):
+        since, read = self.cursor
+        completed, jobs = since, set(read)
+        for line in self._fp:
+            fields = line.split(b'|', 7)
+            try:
+                job_completed = int(fields[6])
+            except (IndexError, ValueError):
+                # Left for the parser to report.
+                yield line
+                continue
+            job = fields[0].decode('utf-8', 'replace')
+            if job_completed == since and job in read:
+                continue
+            if completed is None or job_completed > completed:
+                completed, jobs = job_completed, set([job])
+            elif job_completed == completed:
+                jobs.add(job)
+            self.cursor = (completed, jobs)
+            yield line
 
-    processed_files = []
-    updated_files = []
-    # get all processed records from generator
-    for record_list in apel_db.get_records(ProcessedRecord):
-        processed_files.extend(
-                [record for record in record_list
-                 if record.get_field('HostName') == machine_name])
 
-    root_dir = cp.get(section, 'dir')
+def query_condor_history(parser, apel_db, command, path, cursor, seen=None):
+    '''
+    Runs condor_history on a history file for the jobs which completed since
+    a cursor, loading the records parsed from its output as it is written.
+    Returns the cursor moved on to the last job read.
+
+    Raises IOError if condor_history can't be run or fails.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    log.info('Reading HTCondor history file: %s', path)
+    since = None if cursor is None else cursor[0]
+    args = parser.history_command(command, path, since)
 
+    result = ParseResult()
+    reader = None
+    errors = tempfile.TemporaryFile()
     try:
-        reparse = cp.getboolean(section, 'reparse')
-        if reparse:
-            log.warning('Parser will reparse all logfiles found.')
-    except ConfigParser.NoOptionError:
-        reparse = False
+        try:
+            proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=errors)
+        except OSError as e:
+            raise IOError('Cannot run %s: %s' % (command[0], e))
+        try:
+            reader = HistoryReader(proc.stdout, cursor)
+            for batch in parse_lines(parser, reader, result):
+                load_batch(apel_db, batch, False, seen)
+        finally:
+            proc.stdout.close()
+            status = proc.wait()
+        if status != 0:
+            errors.seek(0)
+            raise IOError('%s exited with status %d: %s'
+                          % (command[0], status,
+                             errors.read().decode('utf-8', 'replace').strip()))
+    finally:
+        errors.close()
+
+    if result.lines == 0:
+        log.info('No jobs completed since the last run.')
+    else:
+        result.log_summary(parser)
+    return reader.cursor
+
+
+def parse_condor_history(parser, apel_db, command, history_dir, cursor_path,
+                         seen=None):
+    '''
+    Reads the jobs which have completed since the last run from each of the
+    HTCondor history files in a directory and its subdirectories.
+
+    The cursor of each file is saved once its records are loaded, so only the
+    jobs which completed after it are read next time, and files which
+    haven't been modified since are not read at all.  A file with no cursor
+    of its own, such as one rotated since the last run, starts from the
+    latest cursor in its directory, as its jobs completed before those still
+    in the current history file.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    cursors = read_cursors(cursor_path)
+
+    paths = []
+    for directory in find_sub_dirs(history_dir):
+        for item in sorted(os.listdir(directory)):
+            path = os.path.join(directory, item)
+            if item.startswith('history') and os.path.isfile(path):
+                paths.append(path)
+
+    # The cursors of files which are no longer there are dropped.
+    updated = dict((path, cursors[path]) for path in paths if path in cursors)
+    latest = {}
+    for path, cursor in updated.items():
+        directory = os.path.dirname(path)
+        if directory not in latest or cursor[0] > latest[directory][0]:
+            latest[directory] = cursor
+
+    for path in paths:
+        cursor = cursors.get(path, latest.get(os.path.dirname(path)))
+        if cursor is not None:
+            # Copied, so that the cursor inherited by a file isn't changed.
+            cursor = (cursor[0], set(cursor[1]))
+            if file_identity(path)[1] < cursor[0]:
+                log.debug('Skipping history file (no new jobs): %s', path)
+                continue
+        try:
+            cursor = query_condor_history(parser, apel_db, command, path, cursor,
+                                          seen)
+        except IOError as e:
+            log.error('Cannot read history file %s: %s', path, e)
+        except ApelDbException as e:
+            log.error('Failed to read %s due to a database problem: %s', path, e)
+        if cursor is not None and cursor[0] is not None:
+            updated[path] = cursor
+        # Saved after each file, so that the jobs loaded from it aren't read
+        # again if a later file fails.
+        write_cursors(cursor_path, updated)
+
 
+def get_query_options(cp, switch, defaults):
+    '''
+    If the batch option switch is set, returns a dict of the options for
+    querying the batch system, given as (option, default) pairs; otherwise
+    returns None.
+    '''
     try:
-        mpi = cp.getboolean(section, 'parallel')
+        if not cp.getboolean('batch', switch):
+            return None
     except ConfigParser.NoOptionError:
-        mpi = False
+        return None
 
-    try:
-        parser = PARSERS[log_type](site, machine_name, mpi)
-    except (NotImplementedError) as e:
-        raise ParserConfigException(e)
-    except KeyError as e:
-        raise ParserConfigException("Not a valid parser type: %s" % e)
+    options = {}
+    for option, default in defaults:
+        try:
+            options[option] = cp.get('batch', option)
+        except ConfigParser.NoOptionError:
+            options[option] = default
+    return options
+
+
+class ParsingTask(object):
+    '''
+    The parsing of the logs of one type, set up from the configuration.
+
+    The processed files are read from the database once, unless they are
+    given, and kept up to date in memory as files are parsed, so that the
+    task can be run again for each change by the parser daemon.
+    '''
+    def __init__(self, log_type, apel_db, cp, spool=None, processed=None):
+        log = logging.getLogger(LOGGER_ID)
+        log.info('Setting up parser for %s files', log_type)
+        self.log_type = log_type
+        self.apel_db = apel_db
+        self.spool = spool
+        if log_type == 'blah':
+            section = 'blah'
+        else:
+            section = 'batch'
+
+        site = cp.get('site_info', 'site_name')
+        if site is None or site == '':
+            raise ParserConfigException('Site name must be configured.')
+
+        machine_name = cp.get('site_info', 'lrms_server')
+        if machine_name is None or machine_name == '':
+            raise ParserConfigException('LRMS hostname must be configured.')
+
+        # The ProcessedFiles by hash, the key of the ProcessedFiles table, as
+        # last loaded.
+        self.machine_name = machine_name
+        if processed is None:
+            processed = read_processed_files(apel_db, machine_name)
+        self._processed = dict(processed)
+        self._index = ProcessedIndex(self._processed.values(), machine_name)
+
+        self.root_dir = cp.get(section, 'dir')
 
-    # Set parser specific options
-    if log_type == 'LSF':
         try:
-            parser.set_scaling(cp.getboolean('batch', 'scale_host_factor'))
+            self.reparse = cp.getboolean(section, 'reparse')
+            if self.reparse:
+                log.warning('Parser will reparse all logfiles found.')
         except ConfigParser.NoOptionError:
-            log.warning("Option 'scale_host_factor' not found in section 'batch"
-                        "'. Will default to 'false'.")
-    elif log_type == 'SGE':
+            self.reparse = False
+
         try:
-            parser.set_ms_timestamps(cp.getboolean('batch', 'ge_ms_timestamps'))
+            mpi = cp.getboolean(section, 'parallel')
         except ConfigParser.NoOptionError:
-            log.warning("Option 'ge_ms_timestamps' not found in section 'batch'"
-                        " . Will default to 'false'.")
+            mpi = False
 
-    # regular expressions for blah log files and for batch log files
-    try:
-        prefix = cp.get(section, 'filename_prefix')
-        expr = re.compile('^' + prefix + '.*')
-    except ConfigParser.NoOptionError:
         try:
-            expr = re.compile(cp.get(section, 'filename_pattern'))
+            parser = PARSERS[log_type](site, machine_name, mpi)
+        except (NotImplementedError) as e:
+            raise ParserConfigException(e)
+        except KeyError as e:
+            raise ParserConfigException("Not a valid parser type: %s" % e)
+        self.parser = parser
+
+        # Set parser specific options
+        if log_type == 'LSF':
+            try:
+                parser.set_scaling(cp.getboolean('batch', 'scale_host_factor'))
+            except ConfigParser.NoOptionError:
+                log.warning("Option 'scale_host_factor' not found in section 'batch"
+                            "'. Will default to 'false'.")
+        elif log_type == 'SGE':
+            try:
+                parser.set_ms_timestamps(cp.getboolean('batch', 'ge_ms_timestamps'))
+            except ConfigParser.NoOptionError:
+                log.warning("Option 'ge_ms_timestamps' not found in section 'batch'"
+                            " . Will default to 'false'.")
+            if cp.has_option('batch', 'sge_multiplier_cache'):
+                try:
+                    ttl = cp.getint('batch', 'sge_multiplier_ttl')
+                except ConfigParser.NoOptionError:
+                    log.warning("Option 'sge_multiplier_ttl' not found in section "
+                                "'batch'. Will default to '86400'.")
+                    ttl = 86400
+                except ValueError as e:
+                    raise ParserConfigException('Invalid sge_multiplier_ttl: %s' % e)
+                parser.set_multiplier_cache(cp.get('batch', 'sge_multiplier_cache'), ttl)
+
+        # SLURM and HTCondor can be queried instead of reading log files.
+        self.sacct = self.history = None
+        if log_type == 'SLURM':
+            self.sacct = get_query_options(cp, 'sacct',
+                                           (('sacct_command', 'sacct'),
+                                            ('sacct_watermark', '/var/lib/apel/sacct_watermark'),
+                                            ('sacct_window', '86400'),
+                                            ('sacct_delay', '300')))
+        elif log_type == 'HTCondor':
+            self.history = get_query_options(cp, 'condor_history',
+                                             (('condor_history_command', 'condor_history'),
+                                              ('history_dir', '/var/lib/condor/spool'),
+                                              ('history_cursor', '/var/lib/apel/htcondor_cursor')))
+        # Read even if the log directory doesn't exist yet, as the daemon
+        # waits for it to appear.
+        self.subdirs = False
+        if self.sacct is None and self.history is None:
+            try:
+                self.subdirs = cp.getboolean(section, 'subdirs')
+            except ConfigParser.NoOptionError:
+                pass
+        elif self.sacct is not None:
+            try:
+                self.window = int(self.sacct['sacct_window'])
+                self.delay = int(self.sacct['sacct_delay'])
+            except ValueError as e:
+                raise ParserConfigException('Invalid sacct option: %s' % e)
+            if self.window <= 0:
+                raise ParserConfigException('sacct_window must be positive.')
+
+        # regular expressions for blah log files and for batch log files
+        try:
+            prefix = cp.get(section, 'filename_prefix')
+            self.expr = re.compile('^' + prefix + '.*')
         except ConfigParser.NoOptionError:
-            log.warning('No pattern specified for %s log file names.', log_type)
-            log.warning('Parser will try to parse all files in directory')
-            expr = re.compile('(.*)')
+            try:
+                self.expr = re.compile(cp.get(section, 'filename_pattern'))
+            except ConfigParser.NoOptionError:
+                log.warning('No pattern specified for %s log file names.', log_type)
+                log.warning('Parser will try to parse all files in directory')
+                self.expr = re.compile('(.*)')
 
-    if os.path.isdir(root_dir):
-        if cp.getboolean(section, 'subdirs'):
-            to_scan = find_sub_dirs(root_dir)
+        try:
+            self.workers = cp.getint(section, 'workers')
+        except ConfigParser.NoOptionError:
+            self.workers = 1
+        self._pool = None
+
+        # The records loaded in recent runs, so that they aren't loaded again.
+        self.seen = None
+        try:
+            self.seen_path = cp.get(section, 'seen_index')
+        except ConfigParser.NoOptionError:
+            self.seen_path = None
+        if self.seen_path:
+            try:
+                retention = cp.getint(section, 'seen_retention')
+            except ConfigParser.NoOptionError:
+                retention = 30
+            except ValueError as e:
+                raise ParserConfigException('Invalid seen_retention: %s' % e)
+            try:
+                self.seen = SeenIndex(self.seen_path, retention * 24 * 3600)
+            except IOError as e:
+                log.warning('Cannot read index of records seen %s: %s', self.seen_path, e)
+                log.warning('Duplicate records will be left to the database.')
+
+        # Where the parsed records go.
+        if spool is not None:
+            log.info('Parsed records will be written to the spool in %s', spool.directory)
+            self._records_db = spool
         else:
-            to_scan = [root_dir]
-        for directory in to_scan:
-            updated_files.extend(scan_dir(parser, directory, reparse, expr, apel_db, processed_files))
-    else:
-        log.warning('Directory for %s logs was not set correctly, omitting', log_type)
+            self._records_db = apel_db
+
+    def queries(self):
+        '''
+        Returns whether the batch system is queried, rather than log files
+        parsed.
+        '''
+        return self.sacct is not None or self.history is not None
+
+    def directories(self):
+        '''
+        Returns the directories holding the log files to parse, which are
+        none if the batch system is queried instead or the log directory
+        doesn't exist.
+        '''
+        if self.queries() or not os.path.isdir(self.root_dir):
+            return []
+        if self.subdirs:
+            return find_sub_dirs(self.root_dir)
+        return [self.root_dir]
+
+    def run(self, directories=None):
+        '''
+        Parses the new log files, or queries the batch system, and updates
+        the database with the parsed files.
+
+        If directories are given, only the log files in them are parsed.
+        '''
+        log = logging.getLogger(LOGGER_ID)
+        parser = self.parser
+        records_db = self._records_db
+        updated_files = []
+
+        if self.sacct is not None:
+            parse_sacct(parser, records_db, shlex.split(self.sacct['sacct_command']),
+                        self.sacct['sacct_watermark'], self.window, self.delay,
+                        seen=self.seen)
+        elif self.history is not None:
+            parse_condor_history(parser, records_db,
+                                 shlex.split(self.history['condor_history_command']),
+                                 self.history['history_dir'],
+                                 self.history['history_cursor'], self.seen)
+        elif os.path.isdir(self.root_dir):
+            if directories is None:
+                directories = self.directories()
+
+            if self.workers > 1 and self._pool is None:
+                log.info('Parsing files with %d worker processes', self.workers)
+                self._pool = multiprocessing.Pool(self.workers, _init_worker, (parser,))
+            for directory in directories:
+                updated_files.extend(scan_dir(parser, directory, self.reparse,
+                                              self.expr, records_db, self._index,
+                                              self._pool, self.seen))
+        else:
+            log.warning('Directory for %s logs was not set correctly, omitting',
+                        self.log_type)
+
+        # The files are only recorded as parsed once their records are spooled.
+        if self.spool is not None:
+            self.spool.close()
+
+        # Only the files which are new, or have changed, need to be recorded.
+        changed = []
+        for pf in updated_files:
+            processed_file = pf.to_processed_file()
+            if self._processed.get(processed_file.Hash) != processed_file:
+                changed.append((pf, processed_file))
+        self.apel_db.load_records([pf for pf, _ in changed])
+        for _, processed_file in changed:
+            self._processed[processed_file.Hash] = processed_file
+        if changed:
+            self._index = ProcessedIndex(self._processed.values(), self.machine_name)
+        # Files are only reparsed once.
+        self.reparse = False
+
+        if self.seen is not None:
+            try:
+                self.seen.save()
+            except IOError as e:
+                log.warning('Cannot save index of records seen %s: %s', self.seen_path, e)
+        log.debug('FQAN cache: %(hits)d hits, %(misses)d misses, hit rate %(hit_rate).2f',
+                  decode_fqan.stats())
+        log.info('Finished parsing %s log files.', self.log_type)
+
+    def close(self):
+        '''Stops the worker processes, if there are any.'''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def read_processed_files(apel_db, machine_name):
+    '''
+    Returns the files parsed on the host machine_name, as a dict of
+    ProcessedFiles by hash.
+    '''
+    return apel_db.get_processed_files(machine_name)
+
+
+def handle_parsing(log_type, apel_db, cp, spool=None, processed=None):
+    '''
+    Create the appropriate parser, and scan the configured directory
+    for log files, parsing them.
+
+    Update the database with the parsed files.
+
+    If a RecordSpool is given, the parsed records are written to it instead
+    of the database, which is still used to keep track of the parsed files.
+    The ProcessedFiles read by read_processed_files may be given, so that
+    they are only read once for several log types.
+    '''
+    task = ParsingTask(log_type, apel_db, cp, spool, processed)
+    try:
+        task.run()
+    finally:
+        task.close()
+
+
+def connect_db(cp):
+    '''Returns an ApelDb for the database configured in the db section.'''
+    return ApelDb(DB_BACKEND,
+                  cp.get('db', 'hostname'),
+                  cp.getint('db', 'port'),
+                  cp.get('db', 'username'),
+                  cp.get('db', 'password'),
+                  cp.get('db', 'name'))
+
+
+def _parse_section(log_type, cp, spool, processed):
+    '''
+    Parses the logs of one type in a process of its own, with its own
+    connection to the database.  Exits with status 1 if parsing fails.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    try:
+        handle_parsing(log_type, connect_db(cp), cp, spool, processed)
+    except (ParserConfigException, ConfigParser.NoOptionError) as e:
+        log.fatal('Parser misconfigured: %s', e)
+        sys.exit(1)
+    except ApelDbException as e:
+        log.fatal('Database exception while parsing %s logs: %s', log_type, e)
+        sys.exit(1)
+
+
+def parse_sections(log_types, apel_db, cp, spool=None):
+    '''
+    Parses the logs of each of log_types, reading the processed files from
+    the database once for all of them.  Several log types are parsed at the
+    same time, each by a process of its own.
+
+    Returns whether the logs of every type were parsed.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    processed = read_processed_files(apel_db, cp.get('site_info', 'lrms_server'))
+
+    if len(log_types) == 1:
+        try:
+            handle_parsing(log_types[0], apel_db, cp, spool, processed)
+        except (ParserConfigException, ConfigParser.NoOptionError) as e:
+            log.fatal('Parser misconfigured: %s', e)
+            return False
+        return True
+
+    processes = [multiprocessing.Process(target=_parse_section, name=log_type,
+                                         args=(log_type, cp, spool, processed))
+                 for log_type in log_types]
+    for process in processes:
+        process.start()
+    succeeded = True
+    for log_type, process in zip(log_types, processes):
+        process.join()
+        if process.exitcode != 0:
+            log.fatal('Failed to parse %s logs.', log_type)
+            succeeded = False
+    return succeeded
+
+
+class DirectoryWatcher(object):
+    '''
+    Waits for the files in a set of directories to change.
+
+    inotify is used if pyinotify is installed.  Otherwise the size,
+    modification time and inode of each file are compared every interval
+    seconds.  find_directories is called for the directories to watch each
+    time, so that new subdirectories are watched too.
+    '''
+    def __init__(self, find_directories, interval):
+        self._find_directories = find_directories
+        self.interval = interval
+        self._changed = set()
+        if pyinotify is not None:
+            self._manager = pyinotify.WatchManager()
+            self._notifier = pyinotify.Notifier(self._manager, self._event)
+            self._watched = set()
+            self._watch()
+        else:
+            self._notifier = None
+            self._snapshot = self._scan()
+
+    def wait(self):
+        '''
+        Returns the set of directories in which files have changed, waiting
+        for at most interval seconds for a change.
+        '''
+        if self._notifier is None:
+            time.sleep(self.interval)
+            snapshot = self._scan()
+            changed = set(directory for directory, files in snapshot.items()
+                          if self._snapshot.get(directory) != files)
+            self._snapshot = snapshot
+            return changed
 
-    apel_db.load_records(updated_files)
-    log.info('Finished parsing %s log files.', log_type)
+        # The events of a burst of writes are gathered before returning.
+        timeout = self.interval * 1000
+        while self._notifier.check_events(timeout):
+            self._notifier.read_events()
+            self._notifier.process_events()
+            timeout = SETTLE_TIME * 1000
+        self._watch()
+        changed, self._changed = self._changed, set()
+        return changed
 
+    def _event(self, event):
+        self._changed.add(event.path)
+
+    def _watch(self):
+        '''Adds watches for any new directories, which count as changed.'''
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MODIFY
+                | pyinotify.IN_MOVED_TO | pyinotify.IN_CREATE)
+        for directory in self._find_directories():
+            if directory not in self._watched:
+                self._manager.add_watch(directory, mask)
+                self._watched.add(directory)
+                self._changed.add(directory)
+
+    def _scan(self):
+        '''Returns the identity of each file, by directory and name.'''
+        snapshot = {}
+        for directory in self._find_directories():
+            files = {}
+            try:
+                for name in os.listdir(directory):
+                    path = os.path.join(directory, name)
+                    if os.path.isfile(path):
+                        files[name] = file_identity(path)
+            except OSError:
+                # The file was removed while the directory was listed.
+                continue
+            snapshot[directory] = files
+        return snapshot
+
+
+def watch_logs(tasks, interval):
+    '''
+    Runs each ParsingTask, then runs it again for the directories in which
+    files change, or every interval seconds if it queries the batch system.
+    A task whose log directory doesn't exist is run once it appears.
+    Only returns by raising, as SystemExit is when the daemon is stopped.
+    '''
+    log = logging.getLogger(LOGGER_ID)
+    watcher = DirectoryWatcher(lambda: [directory for task in tasks
+                                        for directory in task.directories()],
+                               interval)
+    # The directories of each task still to parse, or None for all of them,
+    # when each task which queries the batch system was last run, and the
+    # tasks waiting for their log directory to appear.
+    pending = dict((task, None) for task in tasks)
+    last_run = dict((task, None) for task in tasks)
+    missing = set()
+    while True:
+        now = time.time()
+        for task in tasks:
+            if task.queries():
+                if last_run[task] is not None and now - last_run[task] < interval:
+                    continue
+                directories = None
+            elif not task.directories():
+                if task not in missing:
+                    log.info('Waiting for the %s log directory %s to be created',
+                             task.log_type, task.root_dir)
+                    missing.add(task)
+                pending[task] = None
+                continue
+            else:
+                missing.discard(task)
+                directories = pending[task]
+                if directories is not None:
+                    if not directories:
+                        continue
+                    directories = sorted(directories)
+            last_run[task] = now
+            try:
+                task.run(directories)
+            except (ApelDbException, IOError) as e:
+                # The directories are parsed again next time.
+                log.error('Failed to parse %s logs: %s', task.log_type, e)
+            else:
+                pending[task] = set()
+
+        changed = watcher.wait()
+        for task in tasks:
+            if pending[task] is not None:
+                pending[task].update(directory for directory in task.directories()
+                                     if directory in changed)
+
+
+def run_as_daemon(apel_db, cp, spool=None):
+    '''
+    Runs the parser as a daemon, which parses the configured logs as they
+    are written.
+    '''
+    from daemon.daemon import DaemonContext
+
+    log = logging.getLogger(LOGGER_ID)
+    try:
+        pidfile = cp.get('daemon', 'pidfile')
+        interval = cp.getint('daemon', 'interval')
+    except (ConfigParser.Error, ValueError) as e:
+        log.fatal('Daemon misconfigured: %s', e)
+        sys.exit(1)
+
+    if os.path.exists(pidfile):
+        log.fatal('Cannot start the parser daemon.  Pidfile %s already exists.', pidfile)
+        sys.exit(1)
+
+    log.info('The parser will run as a daemon.')
+    if pyinotify is None:
+        log.info('pyinotify is not installed, so the logs will be checked every %d seconds.',
+                 interval)
+    # We need to preserve the file descriptor for any log files.
+    rootlogger = logging.getLogger()
+    log_files = [x.stream for x in rootlogger.handlers]
+
+    with DaemonContext(files_preserve=log_files):
+        tasks = []
+        try:
+            with open(pidfile, 'w') as pid_file:
+                pid_file.write('%d\n' % os.getpid())
+
+            processed = read_processed_files(apel_db, cp.get('site_info', 'lrms_server'))
+            if cp.getboolean('blah', 'enabled'):
+                tasks.append(ParsingTask('blah', apel_db, cp, spool, processed))
+            if cp.getboolean('batch', 'enabled'):
+                tasks.append(ParsingTask(cp.get('batch', 'type'), apel_db, cp, spool,
+                                         processed))
+            watch_logs(tasks, interval)
+
+        except SystemExit as e:
+            log.info('Received the shutdown signal: %s', e)
+        except (ParserConfigException, ConfigParser.NoOptionError) as e:
+            log.fatal('Parser misconfigured: %s', e)
+        except Exception:
+            log.exception('Unexpected exception. Traceback follows...')
+        finally:
+            log.info('The parser daemon will shut down.')
+            for task in tasks:
+                task.close()
+            try:
+                os.remove(pidfile)
+            except OSError as e:
+                log.warning('Failed to remove pidfile %s: %s', pidfile, e)
+
+    log.info(LOG_BREAK)
 
 def main():
     '''
@@ -347,6 +1688,12 @@ def main():
     arg_parser.add_argument('-l', '--log_config',
                             help='DEPRECATED - Location of logging config file',
                             default=None)
+    arg_parser.add_argument('-d', '--daemon',
+                            help='Run as a daemon, parsing the logs as they are written',
+                            action='store_true')
+    arg_parser.add_argument('--load-spool',
+                            help='Load the records in the spool into the database, then exit',
+                            action='store_true')
     arg_parser.add_argument('-v', '--version',
                             action='version',
                             version=ver)
@@ -385,12 +1732,7 @@ def main():
 
     # database connection
     try:
-        apel_db = ApelDb(DB_BACKEND,
-                         cp.get('db', 'hostname'),
-                         cp.getint('db', 'port'),
-                         cp.get('db', 'username'),
-                         cp.get('db', 'password'),
-                         cp.get('db', 'name'))
+        apel_db = connect_db(cp)
         apel_db.test_connection()
         log.info('Connection to DB established')
     except KeyError as e:
@@ -403,28 +1745,55 @@ def main():
         log.info(LOG_BREAK)
         sys.exit(1)
 
-    log.info(LOG_BREAK)
-    # blah parsing
+    # The records may be written to a spool, to be loaded later.
     try:
-        if cp.getboolean('blah', 'enabled'):
-            handle_parsing('blah', apel_db, cp)
-    except (ParserConfigException, ConfigParser.NoOptionError) as e:
-        log.fatal('Parser misconfigured: %s', e)
-        log.fatal('Parser will exit.')
+        spool_dir = cp.get('spool', 'dir')
+        spool_enabled = cp.getboolean('spool', 'enabled')
+    except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+        spool_dir = None
+        spool_enabled = False
+
+    if options.load_spool:
+        if spool_dir is None:
+            log.fatal('The spool directory is not configured.')
+            sys.exit(1)
+        try:
+            loaded = RecordSpool(spool_dir).load(apel_db)
+        except (ApelDbException, IOError, OSError) as e:
+            log.fatal('Cannot load the spool: %s', e)
+            log.info(LOG_BREAK)
+            sys.exit(1)
+        log.info('Loaded %d records from the spool in %s', loaded, spool_dir)
         log.info(LOG_BREAK)
-        sys.exit(1)
+        sys.exit(0)
+
+    spool = None
+    if spool_enabled:
+        spool = RecordSpool(spool_dir)
+
+    if options.daemon:
+        run_as_daemon(apel_db, cp, spool)
+        sys.exit(0)
 
     log.info(LOG_BREAK)
-    # batch parsing
+    # blah and batch parsing, at the same time if both are enabled
     try:
+        log_types = []
+        if cp.getboolean('blah', 'enabled'):
+            log_types.append('blah')
         if cp.getboolean('batch', 'enabled'):
-            handle_parsing(cp.get('batch', 'type'), apel_db, cp)
+            log_types.append(cp.get('batch', 'type'))
+        succeeded = not log_types or parse_sections(log_types, apel_db, cp, spool)
     except (ParserConfigException, ConfigParser.NoOptionError) as e:
         log.fatal('Parser misconfigured: %s', e)
+        succeeded = False
+    if not succeeded:
         log.fatal('Parser will exit.')
         log.info(LOG_BREAK)
         sys.exit(1)
 
+    log.info(LOG_BREAK)
+
     log.info('Parser has completed.')
     log.info(LOG_BREAK)
     sys.exit(0)
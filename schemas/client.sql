@@ -704,6 +704,11 @@ CREATE TABLE ProcessedFiles (
   Hash        VARCHAR(64),
   StopLine    INT,
   Parsed      INT,
+  StopByte    BIGINT,
+  PrefixHash  VARCHAR(64),
+  FileSize    BIGINT,
+  ModifiedTime BIGINT,
+  Inode       BIGINT,
   PRIMARY KEY (HostName,Hash)
   );
 
@@ -723,10 +728,17 @@ CREATE PROCEDURE ReplaceProcessedFile(
   fileName VARCHAR(255),
   hash     VARCHAR(64),
   stopLine INT,
-  parsed   INT)
+  parsed   INT,
+  stopByte BIGINT,
+  prefixHash VARCHAR(64),
+  fileSize BIGINT,
+  modifiedTime BIGINT,
+  inode    BIGINT)
 BEGIN
-  REPLACE INTO ProcessedFiles(HostName, FileName, Hash, StopLine, Parsed)
-  VALUES (hostName, fileName, hash, stopLine, parsed);
+  REPLACE INTO ProcessedFiles(HostName, FileName, Hash, StopLine, Parsed, StopByte, PrefixHash,
+                              FileSize, ModifiedTime, Inode)
+  VALUES (hostName, fileName, hash, stopLine, parsed, stopByte, prefixHash,
+          fileSize, modifiedTime, inode);
 END //
 DELIMITER ;
 
@@ -817,4 +829,5 @@ CREATE VIEW VJobRecords AS
 -- View on ProcessedFiles
 DROP VIEW IF EXISTS VProcessedFiles;
 CREATE VIEW VProcessedFiles AS
-    SELECT HostName, FileName, Hash, StopLine, Parsed FROM ProcessedFiles;
+    SELECT HostName, FileName, Hash, StopLine, Parsed, StopByte, PrefixHash,
+           FileSize, ModifiedTime, Inode FROM ProcessedFiles;
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+#   Copyright (C) 2024 STFC
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+'''
+    Benchmarks for the batch system parsers on synthetic log files.
+
+    A log file of the given number of lines is written for each parser, in
+    the format the parser reads, and every line of it is parsed as the
+    parser client would, from bytes.  No database is needed.
+
+    The results, in lines per second, are written as JSON so that two
+    releases can be compared:
+
+        python scripts/benchmark_parsers.py -o before.json
+        python scripts/benchmark_parsers.py -o after.json -c before.json
+'''
+
+from __future__ import print_function
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from apel import __version__
+    from apel.common import iter_lines
+    from apel.parsers import BlahParser, LSFParser, SlurmParser
+except ImportError:
+    print('The apel package must be in the PYTHONPATH.')
+    print('Exiting.')
+    sys.exit(1)
+
+
+def slurm_lines(count, rand):
+    '''
+    Yields sacct lines in the format documented in SlurmParser.parse, for
+    jobs ending over about a month, most of which have finished.
+    '''
+    states = ['COMPLETED'] * 8 + ['FAILED', 'CANCELLED', 'RUNNING', 'PENDING']
+    start = 1700000000
+    for job in range(count):
+        start += rand.randint(0, 5)
+        wall = rand.randint(1, 86400)
+        yield '%d|job_%d|user%03d|group%02d|%s|%s|%s|%d|%s|%d|1|wn%04d|%dK|%dK|%s\n' % (
+            1000000 + job, job, rand.randint(0, 200), rand.randint(0, 20),
+            time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start)),
+            time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start + wall)),
+            '%02d:%02d:%02d' % (wall // 3600, wall // 60 % 60, wall % 60),
+            rand.randint(0, wall * 8), rand.choice(['grid', 'long', 'short']),
+            rand.choice([1, 8]), rand.randint(0, 2000),
+            rand.randint(1000, 4000000), rand.randint(1000, 8000000),
+            rand.choice(states))
+
+
+def blah_lines(count, rand):
+    '''
+    Yields the lines of a BLAH accounting log for jobs of a few VOs, with
+    several FQANs for some users.
+    '''
+    fqans = ['/atlas/Role=pilot/Capability=NULL', '/atlas/Role=production/Capability=NULL',
+             '/cms/Role=NULL/Capability=NULL', '/lhcb/Role=pilot/Capability=NULL',
+             '/dteam/Role=NULL/Capability=NULL']
+    submitted = 1700000000
+    for job in range(count):
+        submitted += rand.randint(0, 3)
+        fqan = rand.choice(fqans)
+        extra = ''.join(' "userFQAN=%s/sub%d/Role=NULL/Capability=NULL"' % (fqan.split('/Role')[0], n)
+                        for n in range(rand.choice([0, 0, 2])))
+        yield ('"timestamp=%s" "userDN=/DC=org/DC=example/OU=Users/CN=user%03d" '
+               '"userFQAN=%s"%s "ceID=ce01.example.org:8443/cream-pbs-%s" '
+               '"jobID=CREAM%09d" "lrmsID=%d.batch.example.org" "localUser=%d" '
+               '"clientID=cream_%09d"\n'
+               % (time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(submitted)),
+                  rand.randint(0, 200), fqan, extra, rand.choice(['grid', 'long']),
+                  job, 1000000 + job, 40000 + rand.randint(0, 200), job))
+
+
+# The job script of a CREAM job, which LSF writes with the job's record.
+LSF_COMMAND = ('#!/bin/bash;# LSF job wrapper generated by lsf_submit.sh;'
+               '#BSUB -L /bin/bash;#BSUB -J cream_%(job)d;#BSUB -q %(queue)s;'
+               '#BSUB -n %(cpus)d;#BSUB -f ""/var/cream_sandbox/%(user)s/'
+               'CREAM%(job)d/CREAM%(job)d_jobWrapper.sh > CREAM%(job)d_jobWrapper.sh"";'
+               'old_home=`pwd`;new_home=${old_home}/home_cream_%(job)d;mkdir $new_home;'
+               'trap \'wait $job_pid; cd $old_home; rm -rf $new_home; exit 255\' 1 2 3 15 24;'
+               'mv ""CREAM%(job)d_jobWrapper.sh"" ""$new_home/CREAM%(job)d_jobWrapper.sh"" &> /dev/null;'
+               'export HOME=$new_home;cd $new_home;'
+               '$new_home/CREAM%(job)d_jobWrapper.sh > ""out_cream_%(job)d_StandardOutput"" '
+               '2> ""err_cream_%(job)d_StandardError"" & job_pid=$!;wait $job_pid;'
+               'user_retcode=$?;cd $old_home; exit $user_retcode')
+
+# A JOB_FINISH record from lsb.acct of LSF 9, as described in
+# LSFParser.parse, with the host of each slot the job ran on.
+LSF_RECORD = ('"JOB_FINISH" "9.11" %(stop)d %(job)d 386919 36175899 %(cpus)d %(submit)d 0 0 '
+              '%(start)d "%(user)s" "%(queue)s" "" "" "" "ce01.example.org" "" "/dev/null" '
+              '"/dev/null" "" "%(submit)d.%(job)d" 0 %(cpus)d %(hosts)s 64 %(factor).1f '
+              '"cream_%(job)d" "%(command)s" %(utime).6f %(stime).6f 5296 0 -1 0 0 26452 0 0 0 16 -1 '
+              '0 0 0 242 171 -1 "" "default" 0 %(cpus)d "/bin/bash" "" 0 %(rmem)d %(rswap)d '
+              '"" "" "" "" 0 "" 0 "" -1 "/%(user)s" "" "" "" -1 "" "" 6160 "" %(start)d "" "" 0 '
+              '0 -1 0 441780 "select[ type == any] order[-ut] rusage[r1m=0.91:duration=2m]" '
+              '"" -1 "" -1 0 "" 0 0 "" 25 "" 0 ""\n')
+
+
+def lsf_lines(count, rand):
+    '''
+    Yields lsb.acct lines for CREAM jobs on one or more hosts, with a few
+    other events between them.
+    '''
+    stop = 1700000000
+    for job in range(count):
+        if rand.random() < 0.02:
+            yield '"JOB_RESIZE" "9.11" %d %d 0 0 0 0 0 ""\n' % (stop, 1000000 + job)
+            continue
+        stop += rand.randint(0, 5)
+        wall = rand.randint(1, 86400)
+        cpus = rand.choice([1, 1, 8, 16])
+        values = {'job': 1000000 + job, 'stop': stop, 'start': stop - wall,
+                  'submit': stop - wall - rand.randint(0, 600), 'cpus': cpus,
+                  'user': 'user%03d' % rand.randint(0, 200),
+                  'queue': rand.choice(['grid', 'long', 'short']),
+                  'factor': rand.choice([1.0, 8.5, 10.0]),
+                  'utime': rand.uniform(0, wall * cpus),
+                  'stime': rand.uniform(0, 100),
+                  'rmem': rand.randint(1000, 4000000),
+                  'rswap': rand.randint(1000, 8000000)}
+        # One host for each slot, in blocks of up to eight slots.
+        first = rand.randint(0, 2000)
+        values['hosts'] = ' '.join('"wn%04d"' % (first + slot // 8)
+                                   for slot in range(cpus))
+        values['command'] = LSF_COMMAND % values
+        yield LSF_RECORD % values
+
+
+# The parsers benchmarked, with the function which writes their lines.
+PARSERS = {'BLAH': (BlahParser, blah_lines),
+           'LSF': (LSFParser, lsf_lines),
+           'SLURM': (SlurmParser, slurm_lines)}
+
+
+def run(lines, repeat):
+    '''
+    Parse a synthetic log file with each parser, returning a dict of the
+    best rate, in lines per second, by parser.
+    '''
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for name, (parser_class, make_lines) in sorted(PARSERS.items()):
+            path = os.path.join(directory, name)
+            with open(path, 'w') as log_file:
+                log_file.writelines(make_lines(lines, random.Random(0)))
+
+            parser = parser_class('TestSite', 'batch.example.org', False)
+            parse_bytes = parser.parse_bytes
+            best = None
+            for _ in range(repeat):
+                with open(path, 'rb') as log_file:
+                    start = time.time()
+                    for line in iter_lines(log_file):
+                        parse_bytes(line)
+                    elapsed = time.time() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            results[name] = lines / best
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def compare(results, baseline):
+    '''Print the rate of each parser relative to a previous run.'''
+    print('%-10s %12s %12s %7s' % ('Parser', 'Before', 'After', 'Speedup'))
+    for name, after in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            print('%-10s %12s %12.0f' % (name, '-', after))
+        else:
+            print('%-10s %12.0f %12.0f %7.2f' % (name, before, after, after / before))
+
+
+def main():
+    '''Parse the command line, run the benchmarks and write the results.'''
+    arg_parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    arg_parser.add_argument('-o', '--output', default='benchmark_parsers.json',
+                            help='file to write the JSON results to')
+    arg_parser.add_argument('-c', '--compare', metavar='BASELINE',
+                            help='JSON results of an earlier run to compare with')
+    arg_parser.add_argument('-l', '--lines', type=int, default=1000000,
+                            help='lines in each synthetic log file')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=3,
+                            help='timings of each parser, of which the best is kept')
+    options = arg_parser.parse_args()
+
+    results = run(options.lines, options.repeat)
+    output = {'apel_version': '.'.join(str(x) for x in __version__),
+              'python_version': platform.python_version(),
+              'lines': options.lines,
+              'repeat': options.repeat,
+              'unit': 'lines per second',
+              'results': results}
+
+    with open(options.output, 'w') as json_file:
+        json.dump(output, json_file, indent=2, sort_keys=True)
+    print('Results written to %s' % options.output)
+
+    if options.compare:
+        with open(options.compare) as json_file:
+            baseline = json.load(json_file)['results']
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
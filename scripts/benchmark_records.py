@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+#   Copyright (C) 2024 STFC
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+'''
+    Micro-benchmarks for the record code on the loader and unloader paths.
+
+    Each record type is timed loading a message (load_from_msg), checking
+    and converting its fields one at a time (checked), running its checks
+    (_check_fields), and writing it out as a message, a DB tuple and, where
+    the type has one, a usage record (get_ur).  No database is needed.
+
+    The memory allocated for each record loaded from a message is measured
+    as well, where tracemalloc is available, with and without the values of
+    the fields in INTERN_FIELDS pooled.
+
+    The results, in microseconds per call and bytes per record, are written
+    as JSON so that two releases can be compared:
+
+        python scripts/benchmark_records.py -o before.json
+        python scripts/benchmark_records.py -o after.json -c before.json
+'''
+
+from __future__ import print_function
+
+from argparse import ArgumentParser
+import json
+import platform
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    # Only in Python 3.4 and later.
+    tracemalloc = None
+
+try:
+    from apel import __version__
+    from apel.db.records import record as record_module
+    from apel.db.records import (BlahdRecord, CloudRecord, CloudSummaryRecord,
+                                 EventRecord, JobRecord, JobRecord04,
+                                 NormalisedSummaryRecord,
+                                 NormalisedSummaryRecord04, StorageRecord,
+                                 SummaryRecord, SummaryRecord04, SyncRecord)
+except ImportError:
+    print('The apel package must be in the PYTHONPATH.')
+    print('Exiting.')
+    sys.exit(1)
+
+
+# One valid record of each type, as (field, message value) pairs.
+_JOB = [('Site', 'RAL-LCG2'),
+        ('SubmitHost', 'ce01.example.org:8443/cream-pbs-grid'),
+        ('MachineName', 'batch01.example.org'),
+        ('Queue', 'grid'),
+        ('LocalJobId', '31564872'),
+        ('LocalUserId', 'atlasprd019'),
+        ('GlobalUserName', '/C=UK/O=eScience/OU=CLRC/L=RAL/CN=test user'),
+        ('FQAN', '/atlas/Role=production/Capability=NULL'),
+        ('WallDuration', '234256'),
+        ('CpuDuration', '2345'),
+        ('Processors', '2'),
+        ('NodeCount', '1'),
+        ('StartTime', '1234567890'),
+        ('EndTime', '1234567899'),
+        ('InfrastructureDescription', 'APEL-CREAM-PBS'),
+        ('InfrastructureType', 'grid'),
+        ('MemoryReal', '1000'),
+        ('MemoryVirtual', '2000')]
+
+_SUMMARY = [('Site', 'RAL-LCG2'),
+            ('Month', '3'),
+            ('Year', '2010'),
+            ('GlobalUserName', '/C=UK/O=eScience/OU=CLRC/L=RAL/CN=test user'),
+            ('VO', 'atlas'),
+            ('VOGroup', '/atlas'),
+            ('VORole', 'Role=production'),
+            ('SubmitHost', 'ce01.example.org:8443/cream-pbs-grid'),
+            ('NodeCount', '1'),
+            ('Processors', '2'),
+            ('EarliestEndTime', '1268000000'),
+            ('LatestEndTime', '1269000000'),
+            ('WallDuration', '234256'),
+            ('CpuDuration', '2345'),
+            ('NumberOfJobs', '100')]
+
+SAMPLES = {
+    JobRecord: _JOB + [('ServiceLevelType', 'HEPSPEC'),
+                       ('ServiceLevel', '10.5')],
+    JobRecord04: _JOB + [('ServiceLevel', '{hepspec: 10.5}')],
+    SummaryRecord: _SUMMARY + [('InfrastructureType', 'grid'),
+                               ('ServiceLevelType', 'HEPSPEC'),
+                               ('ServiceLevel', '10.5')],
+    SummaryRecord04: _SUMMARY + [('InfrastructureType', 'grid'),
+                                 ('ServiceLevel', '{hepspec: 10.5}')],
+    NormalisedSummaryRecord: _SUMMARY + [('Infrastructure', 'grid'),
+                                         ('NormalisedWallDuration', '2459688'),
+                                         ('NormalisedCpuDuration', '24622')],
+    NormalisedSummaryRecord04: _SUMMARY + [('Infrastructure', 'grid'),
+                                           ('NormalisedWallDuration', '{hepspec: 2459688}'),
+                                           ('NormalisedCpuDuration', '{hepspec: 24622}')],
+    SyncRecord: [('Site', 'RAL-LCG2'),
+                 ('SubmitHost', 'ce01.example.org:8443/cream-pbs-grid'),
+                 ('NumberOfJobs', '100'),
+                 ('Month', '3'),
+                 ('Year', '2010')],
+    CloudRecord: [('VMUUID', '2012-12-04 09:15:01+00:00 CESNET vm-0'),
+                  ('SiteName', 'CESNET'),
+                  ('CloudComputeService', 'OpenNebula Service A'),
+                  ('MachineName', 'one-0'),
+                  ('LocalUserId', '5'),
+                  ('LocalGroupId', '1'),
+                  ('GlobalUserName', '/C=UK/O=eScience/OU=CLRC/L=RAL/CN=test user'),
+                  ('FQAN', '/ops/Role=NULL/Capability=NULL'),
+                  ('Status', 'completed'),
+                  ('StartTime', '1318840264'),
+                  ('EndTime', '1318848076'),
+                  ('SuspendDuration', '0'),
+                  ('WallDuration', '7812'),
+                  ('CpuDuration', '7812'),
+                  ('CpuCount', '1'),
+                  ('NetworkType', 'NULL'),
+                  ('NetworkInbound', '0'),
+                  ('NetworkOutbound', '0'),
+                  ('Memory', '1000'),
+                  ('Disk', '0'),
+                  ('BenchmarkType', 'HEPSPEC'),
+                  ('Benchmark', '10.5'),
+                  ('ImageId', 'image-0'),
+                  ('CloudType', 'OpenNebula')],
+    CloudSummaryRecord: [('SiteName', 'CESNET'),
+                         ('CloudComputeService', 'OpenNebula Service A'),
+                         ('Month', '10'),
+                         ('Year', '2011'),
+                         ('GlobalUserName', '/C=UK/O=eScience/OU=CLRC/L=RAL/CN=test user'),
+                         ('VO', 'ops'),
+                         ('VOGroup', '/ops'),
+                         ('VORole', 'Role=NULL'),
+                         ('Status', 'completed'),
+                         ('CloudType', 'OpenNebula'),
+                         ('ImageId', 'image-0'),
+                         ('EarliestStartTime', '1318840264'),
+                         ('LatestStartTime', '1318848076'),
+                         ('WallDuration', '7812'),
+                         ('CpuDuration', '7812'),
+                         ('CpuCount', '1'),
+                         ('NetworkInbound', '0'),
+                         ('NetworkOutbound', '0'),
+                         ('Memory', '1000'),
+                         ('Disk', '0'),
+                         ('BenchmarkType', 'HEPSPEC'),
+                         ('Benchmark', '10.5'),
+                         ('NumberOfVMs', '1')],
+    StorageRecord: [('RecordId', 'host.example.org/sr/87912469269276'),
+                    ('CreateTime', '1289293612'),
+                    ('StorageSystem', 'host.example.org'),
+                    ('Site', 'MySite'),
+                    ('StorageShare', 'pool-003'),
+                    ('StorageMedia', 'disk'),
+                    ('StorageClass', 'replicated'),
+                    ('FileCount', '42'),
+                    ('DirectoryPath', '/home/projectA'),
+                    ('LocalUser', 'johndoe'),
+                    ('LocalGroup', 'projectA'),
+                    ('UserIdentity', '/O=Grid/OU=example.org/CN=John Doe'),
+                    ('Group', 'binarydataproject.example.org'),
+                    ('StartTime', '1286789500'),
+                    ('EndTime', '1286790100'),
+                    ('ResourceCapacityUsed', '14728'),
+                    ('LogicalCapacityUsed', '13617')],
+    EventRecord: [('Site', 'RAL-LCG2'),
+                  ('JobName', '31564872.batch01.example.org'),
+                  ('LocalUserID', 'atlasprd019'),
+                  ('LocalUserGroup', 'atlas'),
+                  ('WallDuration', '234256'),
+                  ('CpuDuration', '2345'),
+                  ('StartTime', '1234567890'),
+                  ('StopTime', '1234567899'),
+                  ('Infrastructure', 'APEL-CREAM-PBS'),
+                  ('MachineName', 'batch01.example.org'),
+                  ('Queue', 'grid'),
+                  ('MemoryReal', '1000'),
+                  ('MemoryVirtual', '2000'),
+                  ('Processors', '2'),
+                  ('NodeCount', '1')],
+    BlahdRecord: [('TimeStamp', '2012-05-20T23:59:47Z'),
+                  ('GlobalUserName', '/C=UK/O=eScience/OU=CLRC/L=RAL/CN=test user'),
+                  ('FQAN', '/atlas/Role=production/Capability=NULL'),
+                  ('VO', 'atlas'),
+                  ('VOGroup', '/atlas'),
+                  ('VORole', 'Role=production'),
+                  ('CE', 'ce01.example.org:8443/cream-pbs-grid'),
+                  ('GlobalJobId', 'CREAM410741480'),
+                  ('LrmsId', '9575064.lrms1'),
+                  ('Site', 'RAL-LCG2'),
+                  ('ValidFrom', '2012-04-20T23:59:47Z'),
+                  ('ValidUntil', '2012-06-19T23:59:47Z'),
+                  ('Processed', '0')],
+}
+
+
+def get_cases(record_type, fields):
+    '''
+    Returns a list of (name, function) pairs, one for each operation timed
+    for the record type.
+    '''
+    text = '\n'.join('%s: %s' % field for field in fields)
+
+    loaded = record_type()
+    loaded.load_from_msg(text)
+
+    # The values load_from_msg passes on to be checked, with the benchmark
+    # taken out of any dictionary fields.
+    msg_values = record_type._read_msg(text, record_type.get_schema().dict_set)
+
+    # The converted values before the checks, which _check_fields changes.
+    unchecked = record_type()
+    unchecked.set_all(msg_values)
+    unchecked_values = list(unchecked._values)
+
+    def load_from_msg():
+        record_type().load_from_msg(text)
+
+    def checked():
+        for name, value in msg_values.items():
+            loaded.checked(name, value)
+
+    def check_fields():
+        unchecked._values[:] = unchecked_values
+        unchecked._check_fields()
+
+    cases = [('load_from_msg', load_from_msg),
+             ('checked', checked),
+             ('_check_fields', check_fields),
+             ('get_msg', loaded.get_msg),
+             ('get_db_tuple', loaded.get_db_tuple)]
+    if hasattr(loaded, 'get_ur'):
+        cases.append(('get_ur', loaded.get_ur))
+    return cases
+
+
+def run(number, repeat):
+    '''
+    Time every operation on every record type, returning a dict of dicts of
+    the best time, in microseconds per call, by record type and operation.
+    '''
+    results = {}
+    for record_type, fields in sorted(SAMPLES.items(), key=lambda x: x[0].__name__):
+        timings = {}
+        for name, function in get_cases(record_type, fields):
+            best = min(timeit.repeat(function, number=number, repeat=repeat))
+            timings[name] = best / number * 1e6
+        results[record_type.__name__] = timings
+    return results
+
+
+def bytes_per_record(factory, count):
+    '''Return the average bytes allocated by each of count records.'''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = [factory() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del records
+    return (after - before) // count
+
+
+def memory(count):
+    '''
+    Measure the memory of records loaded from a message, returning a dict
+    of the bytes allocated per record by record type, as 'interned', and,
+    for the types with fields in INTERN_FIELDS, as 'plain' without the
+    values of those fields pooled.
+    '''
+    intern_value = record_module.intern_value
+    results = {}
+    for record_type, fields in sorted(SAMPLES.items(), key=lambda x: x[0].__name__):
+        text = '\n'.join('%s: %s' % field for field in fields)
+
+        def load():
+            record = record_type()
+            record.load_from_msg(text)
+            return record
+
+        results[record_type.__name__] = {'interned': bytes_per_record(load, count)}
+        if record_type.get_schema().intern_fields:
+            record_module.intern_value = lambda value: value
+            try:
+                results[record_type.__name__]['plain'] = bytes_per_record(load, count)
+            finally:
+                record_module.intern_value = intern_value
+    return results
+
+
+def compare_memory(results, baseline):
+    '''
+    Print the memory of each record type relative to a previous run, and
+    without the values of INTERN_FIELDS pooled.
+    '''
+    print('%-28s %10s %10s %7s %10s' % ('Record type', 'Before', 'After', 'Ratio',
+                                         'Plain'))
+    for record_type, sizes in sorted(results.items()):
+        after = sizes['interned']
+        before = baseline.get(record_type, {}).get('interned')
+        plain = sizes.get('plain')
+        plain = '-' if plain is None else str(plain)
+        if before is None:
+            print('%-28s %10s %10d %7s %10s' % (record_type, '-', after, '', plain))
+        else:
+            print('%-28s %10d %10d %7.2f %10s' % (record_type, before, after,
+                                                  float(after) / before, plain))
+
+
+def compare(results, baseline):
+    '''Print the time of each operation relative to a previous run.'''
+    print('%-28s %-15s %10s %10s %7s' % ('Record type', 'Operation', 'Before',
+                                          'After', 'Ratio'))
+    for record_type in sorted(results):
+        for name, after in sorted(results[record_type].items()):
+            before = baseline.get(record_type, {}).get(name)
+            if before is None:
+                print('%-28s %-15s %10s %10.2f' % (record_type, name, '-', after))
+            else:
+                print('%-28s %-15s %10.2f %10.2f %7.2f' % (record_type, name,
+                                                           before, after,
+                                                           after / before))
+
+
+def main():
+    '''Parse the command line, run the benchmarks and write the results.'''
+    arg_parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    arg_parser.add_argument('-o', '--output', default='benchmark_records.json',
+                            help='file to write the JSON results to')
+    arg_parser.add_argument('-c', '--compare', metavar='BASELINE',
+                            help='JSON results of an earlier run to compare with')
+    arg_parser.add_argument('-n', '--number', type=int, default=1000,
+                            help='calls of each operation per timing')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=5,
+                            help='timings of each operation, of which the best is kept')
+    arg_parser.add_argument('-m', '--memory-count', type=int, default=1000,
+                            help='records of each type loaded to measure their memory')
+    options = arg_parser.parse_args()
+
+    results = run(options.number, options.repeat)
+    output = {'apel_version': '.'.join(str(x) for x in __version__),
+              'python_version': platform.python_version(),
+              'number': options.number,
+              'repeat': options.repeat,
+              'unit': 'microseconds per call',
+              'results': results}
+    if tracemalloc is not None:
+        output['memory_count'] = options.memory_count
+        output['memory_unit'] = 'bytes per record'
+        output['memory'] = memory(options.memory_count)
+
+    with open(options.output, 'w') as json_file:
+        json.dump(output, json_file, indent=2, sort_keys=True)
+    print('Results written to %s' % options.output)
+
+    if options.compare:
+        with open(options.compare) as json_file:
+            baseline = json.load(json_file)
+        compare(results, baseline['results'])
+        if 'memory' in output:
+            print()
+            compare_memory(output['memory'], baseline.get('memory', {}))
+    elif 'memory' in output:
+        compare_memory(output['memory'], {})
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 #! /bin/sh
 
+# This script exports the jobs in the HTCondor history files modified in the
+# last two months, for parsing by an APEL client, each time it is run.
+# Alternatively, the parser can read the history files itself, only reading
+# the jobs which have completed since it last ran, by setting
+# 'condor_history = true' in parser.cfg.
+
 CONDOR_LOCATION=/usr
 OUTPUT_LOCATION=/var/log/accounting
 
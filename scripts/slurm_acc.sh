@@ -2,6 +2,9 @@
 
 # This script can be run to extract usage accounting data from SLURM for later
 # parsing by an APEL client. There is a choice of sacct commands to run below.
+#
+# Alternatively, the parser can run sacct itself, once for all the jobs which
+# have ended since it last ran, by setting 'sacct = true' in parser.cfg.
 
 
 sleep 2
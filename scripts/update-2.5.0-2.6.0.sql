@@ -0,0 +1,47 @@
+-- This script contains a SQL block that can update
+-- APEL version 2.5.0 databases of the following types to 2.6.0:
+--  - Client Grid Accounting Database
+
+-- UPDATE SCRIPT FOR CLIENT SCHEMA
+
+-- This section will:
+-- - Add the StopByte and PrefixHash columns to ProcessedFiles, so that the
+--   parser can resume parsing a file that has grown since it was parsed.
+-- - Add the FileSize, ModifiedTime and Inode columns to ProcessedFiles, so
+--   that the parser can skip unchanged files without reading them.
+-- - Update the ReplaceProcessedFile procedure and the VProcessedFiles view
+--   to match this change.
+
+ALTER TABLE ProcessedFiles
+  ADD StopByte BIGINT AFTER Parsed,
+  ADD PrefixHash VARCHAR(64) AFTER StopByte,
+  ADD FileSize BIGINT AFTER PrefixHash,
+  ADD ModifiedTime BIGINT AFTER FileSize,
+  ADD Inode BIGINT AFTER ModifiedTime
+;
+
+DROP PROCEDURE IF EXISTS ReplaceProcessedFile;
+DELIMITER //
+CREATE PROCEDURE ReplaceProcessedFile(
+  hostName VARCHAR(255),
+  fileName VARCHAR(255),
+  hash     VARCHAR(64),
+  stopLine INT,
+  parsed   INT,
+  stopByte BIGINT,
+  prefixHash VARCHAR(64),
+  fileSize BIGINT,
+  modifiedTime BIGINT,
+  inode    BIGINT)
+BEGIN
+  REPLACE INTO ProcessedFiles(HostName, FileName, Hash, StopLine, Parsed, StopByte, PrefixHash,
+                              FileSize, ModifiedTime, Inode)
+  VALUES (hostName, fileName, hash, stopLine, parsed, stopByte, prefixHash,
+          fileSize, modifiedTime, inode);
+END //
+DELIMITER ;
+
+DROP VIEW IF EXISTS VProcessedFiles;
+CREATE VIEW VProcessedFiles AS
+    SELECT HostName, FileName, Hash, StopLine, Parsed, StopByte, PrefixHash,
+           FileSize, ModifiedTime, Inode FROM ProcessedFiles;
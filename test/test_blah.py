@@ -171,5 +171,26 @@ class ParserBlahTest(unittest.TestCase):
                                  "'%s' != '%s' for key '%s'" %
                                  (cont[key], cases[line][key], key))
 
+    def test_timestamp_forms(self):
+        """Check that other forms of timestamp give the same times."""
+        line = ('"timestamp=%s" "userDN=/C=CA/O=Grid/CN=Someone" '
+                '"userFQAN=/atlas/Role=pilot/Capability=NULL" '
+                '"ceID=ce1.triumf.ca:8443/cream-pbs-atlas" "jobID=CREAM663276716" '
+                '"lrmsID=15876368.ce1.triumf.ca" "localUser=41200"')
+        fields = ('TimeStamp', 'ValidFrom', 'ValidUntil')
+        expected = [self.parser.parse(line % '2014-05-18 00:00:58').get_field(field)
+                    for field in fields]
+        self.assertEqual(expected, [datetime.datetime(2014, 5, 18, 0, 0, 58),
+                                    datetime.datetime(2014, 5, 17, 0, 0, 58),
+                                    datetime.datetime(2014, 6, 15, 0, 0, 58)])
+        record = self.parser.parse(line % '2014-05-18T00:00:58')
+        self.assertEqual([record.get_field(field) for field in fields], expected)
+
+        self.assertRaises(ParseError, self.parser.parse,
+                          line % '2014-02-30 00:00:58')
+        self.assertRaises(KeyError, self.parser.parse,
+                          line.replace('"jobID=CREAM663276716" ', '') % '2014-05-18 00:00:58')
+
+
 if __name__ == '__main__':
     unittest.main()
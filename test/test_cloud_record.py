@@ -275,5 +275,27 @@ CloudComputeService: Test Service'''
         except Exception as e:
             self.fail('_check_fields method failed: %s [%s]' % (str(e), str(type(e))))
 
+    def test_change_field_type(self):
+        """Check that changing a field type only affects that record."""
+        record = CloudRecord()
+        other = CloudRecord()
+
+        record.change_field_type('CpuCount', 'float', 'int')
+        self.assertIn('CpuCount', record._int_fields)
+        self.assertNotIn('CpuCount', record._float_fields)
+        record.set_field('CpuCount', '2')
+        self.assertEqual(record.get_field('CpuCount'), 2)
+        self.assertTrue(isinstance(record.get_field('CpuCount'), int))
+
+        # Other records still use the unchanged class schema.
+        self.assertIs(other._schema, CloudRecord.get_schema())
+        other.set_field('CpuCount', '2')
+        self.assertTrue(isinstance(other.get_field('CpuCount'), float))
+
+        # Records making the same change share one schema variant.
+        third = CloudRecord()
+        third.change_field_type('CpuCount', 'float', 'int')
+        self.assertIs(third._schema, record._schema)
+
 if __name__ == '__main__':
     unittest.main()
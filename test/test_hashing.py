@@ -1,8 +1,12 @@
+import bz2
+import gzip
+from hashlib import md5
 import tempfile
 import unittest
 import os
 
-from apel.common import calculate_hash
+from apel.common import (calculate_hash, detect_compression, gzip_size, iter_lines,
+                         Bzip2Reader)
 
 
 class HashingTest(unittest.TestCase):
@@ -23,5 +27,98 @@ class HashingTest(unittest.TestCase):
 
         os.unlink(tmpname)
 
+    def test_compressed_hash(self):
+        '''
+        Check that gzipping a file doesn't change its hash, and that a bzip2
+        file is hashed as it is, as before.
+        '''
+        data = b'01010101' * 200
+        data_hash = '3d1eb00cc63828b36882f076f35c8cdd'
+
+        for method, compression in ((bz2.BZ2File, 'bz2'), (gzip.open, 'gzip'),
+                                    (open, None)):
+            tmpname = tempfile.mktemp('hashtest')
+            try:
+                with method(tmpname, 'wb') as fp:
+                    fp.write(data)
+                self.assertEqual(detect_compression(tmpname), compression)
+                if compression == 'bz2':
+                    with open(tmpname, 'rb') as fp:
+                        self.assertEqual(md5(fp.read()).hexdigest(),
+                                         calculate_hash(tmpname))
+                else:
+                    self.assertEqual(data_hash, calculate_hash(tmpname))
+            finally:
+                os.unlink(tmpname)
+
+    def test_bzip2_reader(self):
+        '''
+        Check that a bzip2 file of several streams is read as lines and
+        hashed as calculate_hash does.
+        '''
+        tmpname = tempfile.mktemp('hashtest')
+        try:
+            with open(tmpname, 'wb') as fp:
+                fp.write(bz2.compress(b'one\ntwo\n') + bz2.compress(b'three'))
+            with open(tmpname, 'rb') as fp:
+                reader = Bzip2Reader(fp)
+                self.assertEqual(list(reader), [b'one\n', b'two\n', b'three'])
+            self.assertEqual(reader.hexdigest(), calculate_hash(tmpname))
+        finally:
+            os.unlink(tmpname)
+
+    def test_bzip2_reader_boundary(self):
+        '''
+        Check that a stream is still read when a read ends one or two bytes
+        into it, and that trailing bytes after the last stream are ignored.
+        '''
+        class ChunkReader(object):
+            def __init__(self, chunks):
+                self._chunks = list(chunks)
+
+            def read(self, size):
+                return self._chunks.pop(0) if self._chunks else b''
+
+        first = bz2.compress(b'one\n')
+        second = bz2.compress(b'two\n')
+        for split in (1, 2):
+            for trailing in (b'', b'\0\0\0'):
+                reader = Bzip2Reader(ChunkReader([first + second[:split],
+                                                  second[split:] + trailing]))
+                self.assertEqual(list(reader), [b'one\n', b'two\n'])
+                self.assertEqual(reader.hexdigest(),
+                                 md5(first + second + trailing).hexdigest())
+
+    def test_gzip_size(self):
+        '''Check that the size of a gzip file's content is read from its end.'''
+        tmpname = tempfile.mktemp('hashtest')
+        try:
+            with gzip.open(tmpname, 'wb') as fp:
+                fp.write(b'01010101' * 200)
+            self.assertEqual(gzip_size(tmpname), 1600)
+            open(tmpname, 'wb').close()
+            self.assertIsNone(gzip_size(tmpname))
+        finally:
+            os.unlink(tmpname)
+
+    def test_iter_lines(self):
+        '''Check that lines are read from a memory map of a file.'''
+        tmpname = tempfile.mktemp('hashtest')
+        try:
+            with open(tmpname, 'wb') as fp:
+                fp.write(b'one\ntwo\nthree')
+            with open(tmpname, 'rb') as fp:
+                self.assertEqual(list(iter_lines(fp)), [b'one\n', b'two\n', b'three'])
+                fp.seek(4)
+                self.assertEqual(list(iter_lines(fp)), [b'two\n', b'three'])
+
+            # An empty file can't be mapped.
+            open(tmpname, 'wb').close()
+            with open(tmpname, 'rb') as fp:
+                self.assertEqual(list(iter_lines(fp)), [])
+        finally:
+            os.unlink(tmpname)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -8,6 +8,8 @@ from apel.db.records import JobRecord, JobRecord04, InvalidRecordException
 import unittest
 import datetime
 
+import mock
+
 
 class TestJobRecord(unittest.TestCase):
     '''Tests for the JobRecord class.'''
@@ -64,6 +66,50 @@ class TestJobRecord(unittest.TestCase):
         except:
             self.fail('Minimal record was not accepted!')
 
+    def test_validate_once(self):
+        '''
+        Tests that serialising an unchanged record only checks it once.
+        '''
+        msg = (
+            'Site: some_site\n'
+            'LocalJobId: localjob\n'
+            'FQAN: /atlas/Role=production/Capability=NULL\n'
+            'WallDuration: 3600\n'
+            'CpuDuration: 3600\n'
+            'StartTime: 1234\n'
+            'EndTime: 14234\n'
+            'ServiceLevelType: HEPSPEC\n'
+            'ServiceLevel: 10.0\n'
+        )
+        record = JobRecord()
+        with mock.patch.object(JobRecord, '_check_fields',
+                               autospec=True,
+                               side_effect=JobRecord._check_fields) as check:
+            record.load_from_msg(msg)
+            self.assertEqual(check.call_count, 1)
+
+            tup = record.get_db_tuple()
+            record.get_msg()
+            self.assertEqual(record.get_db_tuple(), tup)
+            self.assertEqual(check.call_count, 1)
+
+            # A change means the record has to be checked again.
+            record.set_field('WallDuration', 7200)
+            self.assertEqual(record.get_db_tuple()[11], 7200)
+            self.assertEqual(check.call_count, 2)
+
+            record._record_content['CpuDuration'] = 7200
+            record.get_msg()
+            self.assertEqual(check.call_count, 3)
+
+    def test_validate_failure(self):
+        '''
+        Tests that a record which failed its checks is checked again.
+        '''
+        record = JobRecord()
+        self.assertRaises(InvalidRecordException, record.get_db_tuple)
+        self.assertRaises(InvalidRecordException, record.get_db_tuple)
+
     def test_get_ur(self):
         """Check that get_ur outputs correct XML."""
         jr = JobRecord()
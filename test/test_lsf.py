@@ -4,6 +4,7 @@ import datetime
 import unittest
 
 from apel.parsers import LSFParser
+from apel.parsers.lsf import split_fields
 
 
 class ParserLSFTest(unittest.TestCase):
@@ -112,6 +113,24 @@ class ParserLSFTest(unittest.TestCase):
             for key in list(cases[line].keys()):
                 self.assertEqual(cont[key], cases[line][key], "%s != %s for key %s" % (cont[key], cases[line][key], key))
 
+    def test_split_fields(self):
+        """Check that lines are split as LSFParser.EXPR splits them."""
+        lines = (
+            '"JOB_FINISH" "5.1" 1089407406 -1 3.3 277.210000 "" "a b" 0""',
+            # Doubled quotes inside strings, and fields not separated.
+            '"a ""quoted"" b" """" """a""" "x""y"1 2"z"',
+            # Unmatched quotes, for which EXPR backtracks.
+            '"a"" b"" 1',
+            '"unterminated 12 -3.',
+            # Text and numbers which aren't fields.
+            'text 12ab .5 -- 1-2 "s"',
+            '',
+        )
+        for line in lines:
+            expected = [x[0].startswith('"') and x[0][1:-1].replace('""', '"') or x[0]
+                        for x in LSFParser.EXPR.findall(line)]
+            self.assertEqual(split_fields(line), expected, line)
+
     def test_invalid_expr(self):
         # two fields are not separated by space
         line = ('"JOB_FINISH" "5.1" 1089407406 699195 283 33554482 1 1089290023 0 0 1089406862 '
@@ -8,17 +8,62 @@ try:
 except ImportError:
     import ConfigParser
 import gzip
+import multiprocessing
 import os
 import re
 import shutil
+import stat
+import sys
 import tempfile
+import threading
+import time
 import unittest
 
 import mock
 
+from apel.db.records import EventRecord, ProcessedFile
+from apel.db.spool import RecordSpool, read_spool_file
+from apel.parsers import HTCondorParser, SlurmParser
+from apel.parsers.seen import SeenIndex
 import bin.parser
 
 
+# Stands in for sacct, writing its arguments to a file and canned output.
+FAKE_SACCT = """#!%s
+import sys
+with open(sys.argv[1], 'a') as calls:
+    calls.write(' '.join(sys.argv[2:]) + '\\n')
+if sys.argv[2] == 'fail':
+    sys.stderr.write('sacct: error: Problem talking to the database\\n')
+    sys.exit(1)
+sys.stdout.write(
+    '1007|cream_612883006|dteam005|dteam|2013-03-27T17:13:41|2013-03-27T17:13:44|00:00:03|3|prod|1|1|cert-40|||COMPLETED\\n'
+    '1007.batch|batch|||2013-03-27T17:13:41|2013-03-27T17:13:44|00:00:03|3||1|1|cert-40|1000K|2000K|COMPLETED\\n'
+    '1008|cream_612883007|dteam005|dteam|2013-03-27T17:13:41|Unknown|00:00:03|3|prod|1|1|cert-40|||RUNNING\\n')
+"""
+
+
+# Stands in for condor_history, writing its arguments to a file and the lines
+# of the history file which match the constraint on EnteredCurrentStatus.
+FAKE_CONDOR_HISTORY = """#!%s
+import re
+import sys
+with open(sys.argv[1], 'a') as calls:
+    calls.write(' '.join(sys.argv[2:]) + '\\n')
+path = sys.argv[sys.argv.index('-file') + 1]
+constraint = sys.argv[sys.argv.index('-constraint') + 1]
+since = re.search('EnteredCurrentStatus>=([0-9]+)', constraint)
+# Like condor_history, the newest jobs are written first.
+for line in reversed(open(path).readlines()):
+    if since is None or int(line.split('|')[6]) >= int(since.group(1)):
+        sys.stdout.write(line)
+"""
+
+
+def history_line(job, completed):
+    """Returns the condor_history line for a job."""
+    return '%s|user|100|50|5|500|%d|1000|2000|1|\n' % (job, completed)
+
 
 class ParserTest(unittest.TestCase):
 
@@ -28,10 +73,53 @@ class ParserTest(unittest.TestCase):
         self.mock_db = self.patcher.start()
 
         self.mock_parser = mock.Mock()
+        # The parsed records are gathered into a RecordBatch of their type,
+        # so the parser has to return real records.
+        record = EventRecord()
+        record.set_all({'Site': 'TestSite', 'JobName': '1', 'WallDuration': 10})
+        self.mock_parser.parse.return_value = record
 
     def test_parse_empty_file(self):
         """An empty file should be ignored and no errors raised."""
-        bin.parser.parse_file(None, self.mock_db, self.tf, False)
+        dir_path = tempfile.mkdtemp()
+        try:
+            open(os.path.join(dir_path, 'log'), 'wb').close()
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db, [])
+        finally:
+            shutil.rmtree(dir_path)
+
+        self.mock_parser.parse.assert_not_called()
+        self.mock_db.load_records.assert_not_called()
+        self.assertEqual(processed[0].get_field('StopLine'), 0)
+
+    def test_parse_file_seen(self):
+        """Records in the index of those seen before aren't loaded again."""
+        record = EventRecord()
+        record.set_all({'Site': 'TestSite', 'MachineName': 'ce01', 'JobName': '1',
+                        'LocalUserID': 'user', 'StartTime': 1000,
+                        'StopTime': int(time.time())})
+        self.mock_parser.parse.return_value = record
+
+        dir_path = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(dir_path, 'log'), 'wb') as log:
+                log.write(b'Line one.\nLine two.\n')
+            seen = SeenIndex(os.path.join(dir_path, 'seen'), 86400)
+            # Records are loaded to replace those in the database when the
+            # files are reparsed.
+            for reparse in False, False, True:
+                bin.parser.scan_dir(self.mock_parser, dir_path, reparse,
+                                    re.compile('log$'), self.mock_db, [],
+                                    seen=seen)
+        finally:
+            shutil.rmtree(dir_path)
+
+        # The second line repeats the first, and the second pass is dropped,
+        # while records to replace those in the database are always loaded.
+        self.assertEqual([len(call[0][0]) for call in
+                          self.mock_db.load_records.call_args_list], [1, 2])
+        self.assertEqual(len(seen), 1)
 
     def test_scan_dir(self):
         """
@@ -53,10 +141,488 @@ class ParserTest(unittest.TestCase):
             records = bin.parser.scan_dir(self.mock_parser, dir_path, False,
                                           re.compile('(.*)'), self.mock_db, [])
             for record in records:
-                # Check that all three lines have been read
-                self.assertEqual(record.get_field('StopLine'), 3,
-                                 "Unable to read %s file"
-                                 % record.get_field('FileName').split('.')[1])
+                # Check that all three lines have been read, except for the
+                # unfinished last line of the normal file, which is only
+                # read once it is complete.
+                suffix = record.get_field('FileName').split('.')[1]
+                self.assertEqual(record.get_field('StopLine'),
+                                 2 if suffix == 'normal' else 3,
+                                 "Unable to read %s file" % suffix)
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_scan_dir_workers(self):
+        """
+        Check that parsing files in a pool gives the same results as parsing
+        them one after another.
+        """
+        dir_path = tempfile.mkdtemp()
+
+        try:
+            for number in range(3):
+                with open(os.path.join(dir_path, 'log%d' % number), 'wb') as log:
+                    log.write(("Line.\n" * (number + 1)).encode('utf-8'))
+
+            serial = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                         re.compile('log'), self.mock_db, [])
+            serial_loads = self.mock_db.load_records.call_args_list
+            self.mock_db.reset_mock()
+
+            pool = multiprocessing.Pool(2, bin.parser._init_worker,
+                                        (self.mock_parser,))
+            try:
+                pooled = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                             re.compile('log'), self.mock_db,
+                                             [], pool)
+            finally:
+                pool.close()
+                pool.join()
+
+            self.assertEqual([record.get_field('StopLine') for record in pooled],
+                             [1, 2, 3])
+            self.assertEqual([dict(record._record_content) for record in pooled],
+                             [dict(record._record_content) for record in serial])
+            pooled_loads = self.mock_db.load_records.call_args_list
+            self.assertEqual([len(call[0][0]) for call in pooled_loads],
+                             [len(call[0][0]) for call in serial_loads])
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_imap_bounded(self):
+        """Check that no more calls are made than the window ahead of the reader."""
+        calls = []
+
+        class Pool(object):
+            def apply_async(self, function, args):
+                calls.append(args[0])
+                result = mock.Mock()
+                result.get.return_value = function(*args)
+                return result
+
+        results = []
+        for result in bin.parser.imap_bounded(Pool(), lambda x: x * 2, range(10), 3):
+            # The result read, the window ahead of it, and no more.
+            self.assertEqual(len(calls), min(len(results) + 4, 10))
+            results.append(result)
+        self.assertEqual(results, [x * 2 for x in range(10)])
+
+    def test_scan_dir_ranges(self):
+        """
+        Check that parsing a large file in byte ranges gives the same results
+        as parsing it in one go.
+        """
+        dir_path = tempfile.mkdtemp()
+
+        def parse(line):
+            if line.startswith('Bad'):
+                raise ValueError('Bad line')
+            return self.mock_parser.parse.return_value
+        self.mock_parser.parse.side_effect = parse
+
+        try:
+            path = os.path.join(dir_path, 'log')
+            with open(path, 'wb') as log:
+                for number in range(20):
+                    log.write(b"Line.\n" if number % 7 else b"Bad line.\n")
+                log.write(b"Partial")
+
+            serial = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                         re.compile('log'), self.mock_db, [])
+            serial_loads = self.mock_db.load_records.call_args_list
+            self.mock_db.reset_mock()
+
+            pool = multiprocessing.Pool(2, bin.parser._init_worker,
+                                        (self.mock_parser,))
+            try:
+                with mock.patch('bin.parser.RANGE_SIZE', 16), \
+                        mock.patch('bin.parser.logging.getLogger') as mock_log, \
+                        mock.patch('bin.parser.imap_bounded',
+                                   wraps=bin.parser.imap_bounded) as mock_imap:
+                    pooled = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                                 re.compile('log'), self.mock_db,
+                                                 [], pool)
+            finally:
+                pool.close()
+                pool.join()
+
+            self.assertEqual(dict(pooled[0]._record_content),
+                             dict(serial[0]._record_content))
+            # The partial last line is left until it is complete.
+            self.assertEqual(pooled[0].get_field('StopLine'), 20)
+            self.assertEqual(pooled[0].get_field('Parsed'), 17)
+            self.assertEqual(sum(len(call[0][0]) for call in
+                                 self.mock_db.load_records.call_args_list),
+                             sum(len(call[0][0]) for call in serial_loads))
+            # No more ranges are in flight than one past the workers.
+            self.assertEqual(mock_imap.call_args_list[-1][0][3], 3)
+            # The failed lines are numbered from the start of the file.
+            mock_log.return_value.debug.assert_has_calls(
+                [mock.call('Error %s on line %d', 'Bad line', number)
+                 for number in (1, 8, 15)])
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_scan_dir_resume(self):
+        """Check that a file which has grown is parsed from where it ended."""
+        dir_path = tempfile.mkdtemp()
+
+        try:
+            path = os.path.join(dir_path, 'log')
+            with open(path, 'wb') as log:
+                log.write(b"Line one.\nLine two.\nLine th")
+
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db, [])
+            # The partial line is neither parsed nor counted until it is
+            # complete.
+            self.assertEqual(self.mock_parser.parse.call_count, 2)
+            self.assertEqual(processed[0].get_field('StopLine'), 2)
+            self.assertEqual(processed[0].get_field('Parsed'), 2)
+            self.assertEqual(processed[0].get_field('StopByte'), 20)
+
+            with open(path, 'ab') as log:
+                log.write(b"ree.\nLine four.\n")
+            self.mock_parser.parse.reset_mock()
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db,
+                                            processed)
+
+            self.assertEqual([call[0][0] for call in self.mock_parser.parse.call_args_list],
+                             ["Line three.\n", "Line four.\n"])
+            self.assertEqual(processed[0].get_field('StopLine'), 4)
+            self.assertEqual(processed[0].get_field('Parsed'), 4)
+            self.assertEqual(processed[0].get_field('StopByte'), 43)
+
+            # If the start of the file changes, it is parsed from the start.
+            with open(path, 'wb') as log:
+                log.write(b"Line 1.\nLine two.\nLine three.\nLine four.\nLine five.\n")
+            self.mock_parser.parse.reset_mock()
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db,
+                                            processed)
+            self.assertEqual(self.mock_parser.parse.call_count, 5)
+            self.assertEqual(processed[0].get_field('Parsed'), 5)
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_scan_dir_unchanged(self):
+        """Check that an unchanged file is skipped without being read."""
+        dir_path = tempfile.mkdtemp()
+
+        try:
+            path = os.path.join(dir_path, 'log')
+            with open(path, 'wb') as log:
+                log.write(b"Line one.\nLine two.\n")
+
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db, [])
+            st = os.stat(path)
+            self.assertEqual(processed[0].get_field('FileSize'), 20)
+            self.assertEqual(processed[0].get_field('Inode'), st.st_ino)
+
+            with mock.patch('bin.parser.calculate_hash') as mock_hash:
+                again = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db,
+                                            bin.parser.ProcessedIndex(processed))
+            mock_hash.assert_not_called()
+            self.assertEqual(again, processed)
+            self.assertEqual(self.mock_parser.parse.call_count, 2)
+
+            # A record without the identity is found by hash, and gains it.
+            for field in ('FileSize', 'ModifiedTime', 'Inode'):
+                processed[0].set_field(field, None)
+            bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                re.compile('log'), self.mock_db, processed)
+            self.assertEqual(processed[0].get_field('FileSize'), 20)
+            self.assertEqual(self.mock_parser.parse.call_count, 2)
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_scan_dir_single_pass(self):
+        """Check that a new file is hashed while it is parsed."""
+        dir_path = tempfile.mkdtemp()
+
+        try:
+            path = os.path.join(dir_path, 'log')
+            with open(path, 'wb') as log:
+                log.write(b"Line one.\nLine two.\nLine th")
+
+            with mock.patch('bin.parser.calculate_hash') as mock_hash:
+                processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                                re.compile('log'), self.mock_db, [])
+            mock_hash.assert_not_called()
+            self.assertEqual(processed[0].get_field('Hash'),
+                             bin.parser.calculate_hash(path))
+
+            # The hash of a resumed file covers the lines skipped.
+            with open(path, 'ab') as log:
+                log.write(b"ree.\n")
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db,
+                                            processed)
+            self.assertEqual(processed[0].get_field('StopLine'), 3)
+            self.assertEqual(processed[0].get_field('Hash'),
+                             bin.parser.calculate_hash(path))
+
+            # A compressed copy of the file is found by its hash.
+            with open(path, 'rb') as log:
+                with gzip.open(path + '.gz', 'wb') as compressed:
+                    compressed.write(log.read())
+            self.mock_parser.parse.reset_mock()
+            again = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                        re.compile('log'), self.mock_db, processed)
+            self.mock_parser.parse.assert_not_called()
+            self.assertEqual(again, processed * 2)
+
+            # New compressed files are not read before they are parsed.
+            with gzip.open(os.path.join(dir_path, 'log.1.gz'), 'wb') as compressed:
+                compressed.write(b"Line four.\n")
+            with bz2.BZ2File(os.path.join(dir_path, 'log.2.bz2'), 'wb') as compressed:
+                compressed.write(b"Line five.\n")
+            with mock.patch('bin.parser.calculate_hash',
+                            side_effect=bin.parser.calculate_hash) as mock_hash:
+                again = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db, again)
+            # Only the copy, whose content is the size of a processed file.
+            mock_hash.assert_called_once_with(path + '.gz')
+            self.assertEqual(self.mock_parser.parse.call_count, 2)
+            for pf in again[-2:]:
+                self.assertEqual(pf.get_field('Hash'),
+                                 bin.parser.calculate_hash(pf.get_field('FileName')))
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_scan_dir_writer(self):
+        """
+        Check that the records are loaded while parsing carries on, and that
+        a file is only recorded once all its records are loaded.
+        """
+        dir_path = tempfile.mkdtemp()
+        loads = []
+
+        def load_records(batch, replace):
+            loads.append(len(batch))
+            # The second file's records can't be loaded.
+            if len(loads) == 3:
+                raise bin.parser.ApelDbException('Lost connection')
+        self.mock_db.load_records.side_effect = load_records
+
+        try:
+            for name in 'log1', 'log2', 'log3':
+                with open(os.path.join(dir_path, name), 'wb') as log:
+                    log.write(b"Line.\n" * (bin.parser.BATCH_SIZE + 1))
+
+            processed = bin.parser.scan_dir(self.mock_parser, dir_path, False,
+                                            re.compile('log'), self.mock_db, [])
+        finally:
+            shutil.rmtree(dir_path)
+
+        # The batch after the error is dropped, and the second file isn't
+        # recorded, while the other two are.
+        self.assertEqual(loads, [bin.parser.BATCH_SIZE, 1, bin.parser.BATCH_SIZE,
+                                 bin.parser.BATCH_SIZE, 1])
+        self.assertEqual([pr.get_field('FileName')[-4:] for pr in processed],
+                         ['log1', 'log3'])
+
+    def test_scan_dir_parse_error(self):
+        """Check that a parse error isn't hidden by one from the writer."""
+        dir_path = tempfile.mkdtemp()
+        self.mock_db.load_records.side_effect = bin.parser.ApelDbException('Lost')
+
+        try:
+            with open(os.path.join(dir_path, 'log'), 'wb') as log:
+                log.write(b"Line.\n" * (bin.parser.BATCH_SIZE + 1))
+            with mock.patch('bin.parser.ProcessedRecord',
+                            side_effect=RuntimeError('Broken')):
+                self.assertRaises(RuntimeError, bin.parser.scan_dir,
+                                  self.mock_parser, dir_path, False,
+                                  re.compile('log'), self.mock_db, [])
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_batch_writer(self):
+        """Check that the writer loads batches in order, a bounded queue ahead."""
+        loaded = []
+        release = threading.Event()
+
+        def load(batch):
+            release.wait(5)
+            loaded.append(batch)
+
+        with mock.patch('bin.parser.WRITER_QUEUE_SIZE', 1):
+            writer = bin.parser.BatchWriter(load)
+        putter = threading.Thread(target=lambda: [writer.put(n) for n in range(4)])
+        putter.start()
+        # One batch is being loaded and one waits, so the third can't be put.
+        putter.join(0.2)
+        self.assertTrue(putter.is_alive())
+        release.set()
+        putter.join(5)
+        writer.close()
+        self.assertEqual(loaded, [0, 1, 2, 3])
+
+        # Errors are passed to the callback of the group of batches.
+        def fail(batch):
+            raise ValueError(batch)
+        errors = []
+        writer = bin.parser.BatchWriter(fail)
+        writer.put(1)
+        writer.put(2)
+        writer.mark(errors.append)
+        writer.mark(errors.append)
+        writer.put(3)
+        self.assertRaises(ValueError, writer.close)
+        self.assertEqual([str(error) for error in errors[:1]], ['1'])
+        self.assertEqual(errors[1:], [None])
+
+    def test_parse_sacct(self):
+        """Check that sacct is queried once for each window of time."""
+        dir_path = tempfile.mkdtemp()
+
+        try:
+            sacct = os.path.join(dir_path, 'sacct')
+            with open(sacct, 'w') as script:
+                script.write(FAKE_SACCT % sys.executable)
+            os.chmod(sacct, stat.S_IRWXU)
+            calls = os.path.join(dir_path, 'calls')
+            watermark = os.path.join(dir_path, 'watermark')
+            parser = SlurmParser('TestSite', 'TestHost', True)
+
+            bin.parser.parse_sacct(parser, self.mock_db, [sacct, calls, 'ok'],
+                                   watermark, 3600, 300, now=100000)
+            self.assertEqual(bin.parser.read_watermark(watermark), 99700)
+            # Only the two lines for the job which ended are loaded.
+            self.assertEqual([len(call[0][0]) for call in
+                              self.mock_db.load_records.call_args_list], [2])
+            with open(calls) as calls_file:
+                arguments = calls_file.read().split()
+            self.assertEqual(arguments[:4], ['ok', '-P', '-n', '--allusers'])
+            self.assertTrue('--state=CANCELLED,COMPLETED,FAILED,NODE_FAIL,'
+                            'PREEMPTED,TIMEOUT' in arguments)
+
+            # The next windows start from the watermark.
+            os.remove(calls)
+            bin.parser.parse_sacct(parser, self.mock_db, [sacct, calls, 'ok'],
+                                   watermark, 3600, 300, now=106000)
+            self.assertEqual(bin.parser.read_watermark(watermark), 105700)
+            with open(calls) as calls_file:
+                self.assertEqual(len(calls_file.readlines()), 2)
+
+            # The watermark stays put if sacct fails.
+            bin.parser.parse_sacct(parser, self.mock_db, [sacct, calls, 'fail'],
+                                   watermark, 3600, 300, now=110000)
+            self.assertEqual(bin.parser.read_watermark(watermark), 105700)
+            self.assertRaises(IOError, bin.parser.query_sacct, parser,
+                              self.mock_db, [sacct, calls, 'fail'], 0, 1)
+            self.assertRaises(IOError, bin.parser.query_sacct, parser,
+                              self.mock_db, [os.path.join(dir_path, 'none')], 0, 1)
+        finally:
+            shutil.rmtree(dir_path)
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), 'Needs time.tzset')
+    def test_query_sacct_dst(self):
+        """
+        Check that a sacct window starting near a change of the clocks starts
+        early enough, whichever repeated local time sacct takes.
+        """
+        dir_path = tempfile.mkdtemp()
+        old_tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'Europe/London'
+        time.tzset()
+        try:
+            sacct = os.path.join(dir_path, 'sacct')
+            with open(sacct, 'w') as script:
+                script.write(FAKE_SACCT % sys.executable)
+            os.chmod(sacct, stat.S_IRWXU)
+            calls = os.path.join(dir_path, 'calls')
+            parser = SlurmParser('TestSite', 'TestHost', True)
+
+            # 2013-10-27 00:30 UTC is 01:30 BST, which is also 01:30 GMT an
+            # hour later, and 2013-06-01 00:30 UTC is far from any change.
+            for start in (1382833800, 1370046600):
+                bin.parser.query_sacct(parser, self.mock_db, [sacct, calls, 'ok'],
+                                       start, start + 7200)
+            with open(calls) as calls_file:
+                starts = [argument for line in calls_file
+                          for argument in line.split()
+                          if argument.startswith('--starttime=')]
+            self.assertEqual(starts, ['--starttime=2013-10-27T00:30:00',
+                                      '--starttime=2013-06-01T01:30:00'])
+        finally:
+            if old_tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = old_tz
+            time.tzset()
+            shutil.rmtree(dir_path)
+
+    def test_parse_condor_history(self):
+        """Check that only the jobs completed since the last run are read."""
+        dir_path = tempfile.mkdtemp()
+
+        def loaded():
+            jobs = [record.get_field('JobName')
+                    for call in self.mock_db.load_records.call_args_list
+                    for record in call[0][0]]
+            self.mock_db.reset_mock()
+            return jobs
+
+        def called():
+            with open(calls) as calls_file:
+                count = len(calls_file.readlines())
+            os.remove(calls)
+            return count
+
+        try:
+            condor_history = os.path.join(dir_path, 'condor_history')
+            with open(condor_history, 'w') as script:
+                script.write(FAKE_CONDOR_HISTORY % sys.executable)
+            os.chmod(condor_history, stat.S_IRWXU)
+            calls = os.path.join(dir_path, 'calls')
+            command = [condor_history, calls]
+            spool = os.path.join(dir_path, 'spool')
+            os.mkdir(spool)
+            history = os.path.join(spool, 'history')
+            cursors = os.path.join(dir_path, 'cursors')
+            parser = HTCondorParser('TestSite', 'TestHost', True)
+
+            with open(history, 'w') as history_file:
+                for job, completed in (('a', 1000), ('b', 2000), ('c', 2000)):
+                    history_file.write(history_line(job, completed))
+            bin.parser.parse_condor_history(parser, self.mock_db, command,
+                                            spool, cursors)
+            self.assertEqual(loaded(), ['c', 'b', 'a'])
+            self.assertEqual(bin.parser.read_cursors(cursors),
+                             {history: (2000, set(['b', 'c']))})
+
+            # Jobs which completed at the time of the cursor aren't read again.
+            with open(history, 'a') as history_file:
+                for job, completed in (('d', 2000), ('e', 3000)):
+                    history_file.write(history_line(job, completed))
+            bin.parser.parse_condor_history(parser, self.mock_db, command,
+                                            spool, cursors)
+            self.assertEqual(loaded(), ['e', 'd'])
+            self.assertTrue('(EnteredCurrentStatus>=2000)' in open(calls).read())
+            self.assertEqual(called(), 2)
+
+            # A file not modified since the cursor isn't read.
+            os.utime(history, (2500, 2500))
+            bin.parser.parse_condor_history(parser, self.mock_db, command,
+                                            spool, cursors)
+            self.assertFalse(os.path.exists(calls))
+
+            # A rotated file starts from the cursor of the current one.
+            os.rename(history, history + '.20240101')
+            with open(history + '.20240101', 'a') as history_file:
+                history_file.write(history_line('f', 3000))
+            with open(history, 'w') as history_file:
+                history_file.write(history_line('g', 4000))
+            bin.parser.parse_condor_history(parser, self.mock_db, command,
+                                            spool, cursors)
+            self.assertEqual(loaded(), ['g', 'f'])
+            self.assertEqual(bin.parser.read_cursors(cursors),
+                             {history: (4000, set(['g'])),
+                              history + '.20240101': (3000, set(['e', 'f']))})
         finally:
             shutil.rmtree(dir_path)
 
@@ -75,6 +641,229 @@ class ParserTest(unittest.TestCase):
         bin.parser.handle_parsing('SGE', self.mock_db, self.cp)
         self.mock_db.load_records.assert_called_once_with([])
 
+    def test_parsing_task(self):
+        """
+        Check that a ParsingTask run again only parses what has been added,
+        without reading the processed files from the database again.
+        """
+        dir_path = tempfile.mkdtemp()
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                            'conf', 'parser.cfg'))
+        cp = ConfigParser.ConfigParser()
+        cp.read(path)
+        cp.set('site_info', 'site_name', 'TestSite')
+        cp.set('site_info', 'lrms_server', 'TestServer')
+        cp.set('batch', 'dir', dir_path)
+        self.mock_parser.machine_name = 'TestServer'
+        self.mock_db.get_processed_files.return_value = {}
+
+        try:
+            log_path = os.path.join(dir_path, 'log')
+            with open(log_path, 'wb') as log:
+                log.write(b"Line one.\nLine two.\n")
+            with mock.patch.dict(bin.parser.PARSERS,
+                                 {'TEST': lambda *args: self.mock_parser}):
+                task = bin.parser.ParsingTask('TEST', self.mock_db, cp)
+            self.assertEqual(task.directories(), [dir_path])
+            task.run()
+
+            with open(log_path, 'ab') as log:
+                log.write(b"Line three.\n")
+            task.run([dir_path])
+            # Nothing has changed since.
+            task.run()
+        finally:
+            shutil.rmtree(dir_path)
+
+        self.mock_db.get_processed_files.assert_called_once_with('TestServer')
+        self.assertEqual(self.mock_parser.parse.call_count, 3)
+        loads = self.mock_db.load_records.call_args_list
+        # The batches of records and the processed files, in turn.
+        self.assertEqual([[pf.get_field('StopLine') for pf in call[0][0]]
+                          for call in loads if isinstance(call[0][0], list)],
+                         [[2], [3], []])
+
+    def test_parsing_task_processed_files(self):
+        """
+        Check that the ProcessedFiles read from the database are enough to
+        skip an unchanged file, which is not recorded again.
+        """
+        dir_path = tempfile.mkdtemp()
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                            'conf', 'parser.cfg'))
+        cp = ConfigParser.ConfigParser()
+        cp.read(path)
+        cp.set('site_info', 'site_name', 'TestSite')
+        cp.set('site_info', 'lrms_server', 'TestServer')
+        cp.set('batch', 'dir', dir_path)
+
+        try:
+            log_path = os.path.join(dir_path, 'log')
+            with open(log_path, 'wb') as log:
+                log.write(b"Line one.\nLine two.\n")
+            size, mtime, inode = bin.parser.file_identity(log_path)
+            self.mock_db.get_processed_files.return_value = {
+                'abc': ProcessedFile(log_path, 'abc', 2, 2, 20, 'def', size, mtime, inode),
+                'ghi': ProcessedFile('/elsewhere/log', 'ghi', 5, 5, None, None,
+                                     None, None, None)}
+            with mock.patch.dict(bin.parser.PARSERS,
+                                 {'TEST': lambda *args: self.mock_parser}):
+                task = bin.parser.ParsingTask('TEST', self.mock_db, cp)
+            with mock.patch('bin.parser.calculate_hash') as mock_hash:
+                task.run()
+            mock_hash.assert_not_called()
+        finally:
+            shutil.rmtree(dir_path)
+
+        self.mock_parser.parse.assert_not_called()
+        self.mock_db.load_records.assert_called_once_with([])
+
+    def test_parsing_task_missing_dir(self):
+        """
+        Check that the subdirectories of a log directory which appears after
+        the ParsingTask is set up are searched.
+        """
+        dir_path = tempfile.mkdtemp()
+        root_dir = os.path.join(dir_path, 'logs')
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                            'conf', 'parser.cfg'))
+        cp = ConfigParser.ConfigParser()
+        cp.read(path)
+        cp.set('site_info', 'site_name', 'TestSite')
+        cp.set('site_info', 'lrms_server', 'TestServer')
+        cp.set('batch', 'dir', root_dir)
+        cp.set('batch', 'subdirs', 'true')
+        self.mock_db.get_processed_files.return_value = {}
+
+        try:
+            with mock.patch.dict(bin.parser.PARSERS,
+                                 {'TEST': lambda *args: self.mock_parser}):
+                task = bin.parser.ParsingTask('TEST', self.mock_db, cp)
+            self.assertEqual(task.directories(), [])
+
+            os.makedirs(os.path.join(root_dir, 'nested'))
+            self.assertEqual(sorted(task.directories()),
+                             [root_dir, os.path.join(root_dir, 'nested')])
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_parsing_task_sge_multiplier_cache(self):
+        """
+        Check that the SGE multiplier cache is used with a default lifetime
+        if none is configured.
+        """
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                            'conf', 'parser.cfg'))
+        cp = ConfigParser.ConfigParser()
+        cp.read(path)
+        cp.set('site_info', 'site_name', 'TestSite')
+        cp.set('site_info', 'lrms_server', 'TestServer')
+        cp.set('batch', 'sge_multiplier_cache', '/tmp/sge_multipliers.json')
+        self.mock_db.get_processed_files.return_value = {}
+
+        with mock.patch('bin.parser.logging.getLogger') as mock_log:
+            task = bin.parser.ParsingTask('SGE', self.mock_db, cp)
+        self.assertEqual(task.parser._multiplier_cache, '/tmp/sge_multipliers.json')
+        self.assertEqual(task.parser._multiplier_ttl, 86400)
+        self.assertTrue(any('sge_multiplier_ttl' in call[0][0] for call in
+                            mock_log.return_value.warning.call_args_list))
+
+        cp.set('batch', 'sge_multiplier_ttl', 'soon')
+        self.assertRaises(bin.parser.ParserConfigException, bin.parser.ParsingTask,
+                          'SGE', self.mock_db, cp)
+
+    def test_parse_sections(self):
+        """
+        Check that the blah and batch logs are parsed at the same time, with
+        the processed files read once.
+        """
+        dir_path = tempfile.mkdtemp()
+        path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                            'conf', 'parser.cfg'))
+        cp = ConfigParser.ConfigParser()
+        cp.read(path)
+        cp.set('site_info', 'site_name', 'TestSite')
+        cp.set('site_info', 'lrms_server', 'TestServer')
+        self.mock_db.get_processed_files.return_value = {}
+
+        try:
+            for section, line in (
+                    ('blah', '"timestamp=2012-05-20 23:59:47" "userDN=/C=UK/CN=User" '
+                             '"userFQAN=/atlas/Role=production/Capability=NULL" '
+                             '"ceID=ce01.example.org:8443/cream-pbs-atlas" '
+                             '"jobID=CREAM410741480" "lrmsID=9575064.lrms1" '
+                             '"localUser=11999"\n'),
+                    ('batch', '1007|cream_612883006|dteam005|dteam|2013-03-27T17:13:41|'
+                              '2013-03-27T17:13:44|00:00:03|3|prod|1|1|cert-40|||'
+                              'COMPLETED\n')):
+                os.mkdir(os.path.join(dir_path, section))
+                with open(os.path.join(dir_path, section, 'log'), 'w') as log:
+                    log.write(line)
+                cp.set(section, 'dir', os.path.join(dir_path, section))
+                cp.set(section, 'filename_prefix', 'log')
+            os.mkdir(os.path.join(dir_path, 'spool'))
+            spool = RecordSpool(os.path.join(dir_path, 'spool'))
+
+            # Each section connects to the database in its own process.
+            with mock.patch('bin.parser.connect_db') as mock_connect:
+                self.assertTrue(bin.parser.parse_sections(['blah', 'SLURM'],
+                                                          self.mock_db, cp, spool))
+                self.assertFalse(bin.parser.parse_sections(['blah', 'NOPE'],
+                                                           self.mock_db, cp, spool))
+            mock_connect.assert_not_called()
+            self.assertEqual(self.mock_db.get_processed_files.call_count, 2)
+
+            types = sorted(read_spool_file(os.path.join(dir_path, 'spool', name))[0].__name__
+                           for name in os.listdir(os.path.join(dir_path, 'spool')))
+            self.assertEqual(types, ['BlahdRecord', 'BlahdRecord', 'EventRecord'])
+        finally:
+            shutil.rmtree(dir_path)
+
+    def test_directory_watcher(self):
+        """Check that changed directories are found without inotify."""
+        dir_path = tempfile.mkdtemp()
+        other_path = tempfile.mkdtemp()
+        try:
+            with mock.patch('bin.parser.pyinotify', None):
+                watcher = bin.parser.DirectoryWatcher(lambda: [dir_path, other_path], 0)
+            self.assertEqual(watcher.wait(), set())
+            with open(os.path.join(dir_path, 'log'), 'wb') as log:
+                log.write(b"Line one.\n")
+            self.assertEqual(watcher.wait(), set([dir_path]))
+            self.assertEqual(watcher.wait(), set())
+        finally:
+            shutil.rmtree(dir_path)
+            shutil.rmtree(other_path)
+
+    def test_watch_logs(self):
+        """Check that the daemon parses the directories which change."""
+        task = mock.Mock()
+        task.directories.return_value = ['a', 'b']
+        # The first change fails to be recorded, so is parsed again.
+        task.run.side_effect = [None, bin.parser.ApelDbException('Lost'), None]
+        task.queries.return_value = False
+        query_task = mock.Mock()
+        query_task.queries.return_value = True
+        query_task.directories.return_value = []
+        # A task whose directory only appears later is run once it does.
+        missing_task = mock.Mock()
+        missing_task.queries.return_value = False
+        missing_task.directories.side_effect = [[], [], ['c'], ['c'], ['c']]
+        watcher = mock.Mock()
+        watcher.wait.side_effect = [set(['b']), set(), set(), SystemExit]
+
+        with mock.patch('bin.parser.DirectoryWatcher', return_value=watcher):
+            with mock.patch('bin.parser.time') as mock_time:
+                mock_time.time.side_effect = [0, 10, 20, 30]
+                self.assertRaises(SystemExit, bin.parser.watch_logs,
+                                  [task, query_task, missing_task], 15)
+
+        self.assertEqual(task.run.call_args_list,
+                         [mock.call(None), mock.call(['b']), mock.call(['b'])])
+        self.assertEqual(query_task.run.call_args_list,
+                         [mock.call(None), mock.call(None)])
+        self.assertEqual(missing_task.run.call_args_list, [mock.call(None)])
+
     def tearDown(self):
         self.tf.close()
         mock.patch.stopall()
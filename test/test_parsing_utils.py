@@ -1,6 +1,7 @@
 import unittest
 
 from apel.common import parse_fqan
+from apel.common.parsing_utils import FqanDecoder
 
 
 class ParsingUtilsTest(unittest.TestCase):
@@ -37,6 +38,24 @@ class ParsingUtilsTest(unittest.TestCase):
 
         self.assertEqual(parse_fqan(short_fqan1), ('None', '/no/role/or/equals', 'no'))
         self.assertEqual(parse_fqan(short_fqan2), ('None', '/someorg/somegroup', 'someorg'))
+    def test_decode_fqan(self):
+        """Check that FQANs are decoded as by parse_fqan and cached."""
+        decode = FqanDecoder(maxsize=2)
+        fqans = ["/atlas/Role=production/Capability=NULL",
+                 "/ilc/Role=NULL/Capability=NULL",
+                 "hello."]
+        for fqan in fqans + fqans[1:]:
+            self.assertEqual(decode(fqan), parse_fqan(fqan))
+
+        # The first FQAN has been dropped to make room for the third.
+        self.assertEqual(decode.stats(), {'hits': 2, 'misses': 3,
+                                          'hit_rate': 0.4, 'size': 2})
+        decode(fqans[0])
+        self.assertEqual(decode.stats()['misses'], 4)
+
+        decode.clear()
+        self.assertEqual(decode.stats(), {'hits': 0, 'misses': 0,
+                                          'hit_rate': 0.0, 'size': 0})
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from apel.db.records import Record, InvalidRecordException
@@ -37,6 +38,60 @@ class RecordTest(unittest.TestCase):
 
         self.assertEqual(record.get_field('Test'), 'value')
 
+    def test_schema_shared(self):
+        """Check that records of a type share one schema unless overridden."""
+        record = Record()
+        other = Record()
+        self.assertIs(record._schema, other._schema)
+        self.assertIs(record._schema, Record.get_schema())
+
+        record._db_fields = ['Test']
+        self.assertEqual(record._db_fields, ('Test',))
+        self.assertIn('Test', record._schema.db_set)
+        # The override must not leak into the class schema or other records.
+        self.assertEqual(other._db_fields, ())
+        self.assertRaises(InvalidRecordException,
+                          other.set_field, 'Test', 'value')
+
+    def test_record_content(self):
+        """Check the dict-like view of a record's values."""
+        record = Record()
+        record._db_fields = ['Test', 'Other']
+        content = record._record_content
+        self.assertEqual(len(content), 0)
+        self.assertNotIn('Test', content)
+
+        record.set_field('Test', 'value')
+        self.assertEqual(dict(content), {'Test': 'value'})
+
+        # Replacing the content drops existing values.
+        record._record_content = {'Other': 'other'}
+        self.assertEqual(dict(record._record_content), {'Other': 'other'})
+        del record._record_content['Other']
+        self.assertEqual(len(record._record_content), 0)
+        self.assertRaises(KeyError, record._record_content.__getitem__, 'Other')
+
+        # Values survive a change of schema.
+        record.set_field('Test', 'value')
+        record._db_fields = ['Test']
+        self.assertEqual(record.get_field('Test'), 'value')
+
+        # Unknown fields are kept, but rejected by _check_fields.
+        record._all_fields = ['Test']
+        record._record_content['Unknown'] = 'value'
+        self.assertEqual(record.get_field('Unknown'), 'value')
+        self.assertRaises(InvalidRecordException, record._check_fields)
+
+    def test_pickle(self):
+        """Check that records survive pickling, e.g. for process pools."""
+        record = Record()
+        record._db_fields = ['Test', 'Other']
+        record.set_field('Test', 'value')
+
+        copy = pickle.loads(pickle.dumps(record))
+        self.assertEqual(dict(copy._record_content), {'Test': 'value'})
+        self.assertIs(copy._schema, record._schema)
+
     def test_dict_field_parsing(self):
         good_inputs = {"{D: 3.0, E:4}": {'D': 3.0, 'E': 4.0}, "{A:1,B:2}": {'A': 1.0, 'B': 2.0}}
         bad_inputs =  ["{A:1,A:2}", "{A: 1, A: 2}"]
@@ -0,0 +1,138 @@
+import unittest
+
+from apel.db.records import (CloudRecord, EventRecord, InvalidRecordException,
+                             JobRecord, RecordBatch, SummaryRecord)
+
+
+JOB_MSG = '''\
+Site: RAL-LCG2
+SubmitHost: ce01.ncg.ingrid.pt:2119/jobmanager-lcgsge-atlasgrid
+LocalJobId: %s
+LocalUserId: atlasprd019
+GlobalUserName: /C=whatever/D=someDN
+FQAN: /atlas/higgs/Role=production/Capability=NULL
+WallDuration: 234256
+CpuDuration: 2345
+Processors: 2
+NodeCount: NULL
+StartTime: 1234567890
+EndTime: 1234567899
+MemoryReal: 1000
+MemoryVirtual: 2000
+ServiceLevelType: Si2k
+ServiceLevel: 1000
+'''
+
+CLOUD_MSG = '''\
+VMUUID: 2012-12-04 09:15:01+00:00 CESNET vm-%s
+SiteName: CESNET
+MachineName: 'one-0'
+LocalUserId: 5
+LocalGroupId: 1
+GlobalUserName: NULL
+FQAN: /ops/Role=NULL/Capability=NULL
+Status: completed
+StartTime: 1318840264
+EndTime: 1318848076
+WallDuration: NULL
+CpuCount: NULL
+Disk: NULL
+'''
+
+SUMMARY_MSG = '''\
+Site: %s
+Month: 3
+Year: 2010
+GlobalUserName: /C=whatever/D=someDN
+VO: atlas
+VOGroup: /atlas
+VORole: Role=production
+EarliestEndTime: 1267401600
+LatestEndTime: 1267401600
+WallDuration: 234256
+CpuDuration: 2345
+NumberOfJobs: 100
+'''
+
+
+class RecordBatchTest(unittest.TestCase):
+    '''
+    Test case for RecordBatch, which should give the same results as
+    loading and checking each record on its own.
+    '''
+
+    def _compare(self, record_class, texts):
+        '''Check a batch of texts against records made from each one.'''
+        batch = RecordBatch.from_msg(record_class, '%%'.join(texts))
+        batch.validate()
+        self.assertEqual(len(batch), len(texts))
+
+        for text, batch_record in zip(texts, batch.to_records()):
+            record = record_class()
+            record.load_from_msg(text)
+            self.assertEqual(dict(batch_record._record_content),
+                             dict(record._record_content))
+            self.assertEqual(batch_record.get_msg(), record.get_msg())
+
+        expected = []
+        for text in texts:
+            record = record_class()
+            record.load_from_msg(text)
+            expected.append(record.get_db_tuple('source'))
+        self.assertEqual(batch.get_db_tuples('source'), expected)
+
+    def test_job_records(self):
+        '''Check that job records are checked column by column.'''
+        self._compare(JobRecord, [JOB_MSG % i for i in range(3)])
+        # The overridden checks are made on the columns.
+        batch = RecordBatch.from_msg(JobRecord, JOB_MSG % 1)
+        batch.validate()
+        self.assertEqual(batch.column('VO'), ['atlas'])
+        self.assertEqual(batch.column('VOGroup'), ['/atlas/higgs'])
+
+    def test_interning(self):
+        '''Check that rows share one copy of each repeated Site.'''
+        batch = RecordBatch.from_msg(JobRecord, '%%'.join([JOB_MSG % i for i in range(2)]))
+        batch.validate()
+        sites = batch.column('Site')
+        self.assertIs(sites[0], sites[1])
+
+    def test_cloud_records(self):
+        '''Check that cloud records are checked column by column.'''
+        self._compare(CloudRecord, [CLOUD_MSG % i for i in range(3)])
+
+    def test_row_checks(self):
+        '''Check record types without column checks are checked by row.'''
+        self._compare(SummaryRecord, [SUMMARY_MSG % 'RAL-LCG2', SUMMARY_MSG % 'CESNET'])
+        wrong_month = (SUMMARY_MSG % 'RAL-LCG2').replace('Month: 3', 'Month: 5')
+        batch = RecordBatch.from_msg(SummaryRecord, wrong_month)
+        self.assertRaises(InvalidRecordException, batch.validate)
+
+    def test_invalid(self):
+        '''Check that one invalid record makes the whole batch invalid.'''
+        texts = [JOB_MSG % 1, JOB_MSG.replace('EndTime: 1234567899', 'EndTime: 1')]
+        batch = RecordBatch.from_msg(JobRecord, '%%'.join(texts))
+        self.assertRaises(InvalidRecordException, batch.validate)
+
+        missing = JOB_MSG.replace('Site: RAL-LCG2\n', '')
+        batch = RecordBatch.from_msg(JobRecord, missing)
+        self.assertRaises(InvalidRecordException, batch.validate)
+
+        batch = RecordBatch(JobRecord)
+        self.assertRaises(InvalidRecordException, batch.append, {'Rubbish': 1})
+
+    def test_append_record(self):
+        '''Check that records can be added to and taken out of a batch.'''
+        record = EventRecord()
+        record.set_all({'Site': 'TestSite', 'JobName': '1', 'WallDuration': '10',
+                        'StartTime': 1234567890})
+        batch = RecordBatch.from_records([record, record])
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.column('WallDuration'), [10, 10])
+        self.assertEqual(batch.get_db_tuples(), [record.get_db_tuple()] * 2)
+
+        self.assertRaises(TypeError, batch.append_record, JobRecord())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Memory benchmark for the storage used by records."""
+
+from datetime import datetime
+import tracemalloc
+import unittest
+
+import mock
+
+from apel.db.records import (BlahdRecord, CloudRecord, CloudSummaryRecord,
+                             EventRecord, GroupAttributeRecord, JobRecord,
+                             JobRecord04, NormalisedSummaryRecord,
+                             NormalisedSummaryRecord04, ProcessedRecord,
+                             StorageRecord, SummaryRecord, SummaryRecord04,
+                             SyncRecord)
+
+RECORD_TYPES = (BlahdRecord, CloudRecord, CloudSummaryRecord, EventRecord,
+                GroupAttributeRecord, JobRecord, JobRecord04,
+                NormalisedSummaryRecord, NormalisedSummaryRecord04,
+                ProcessedRecord, StorageRecord, SummaryRecord,
+                SummaryRecord04, SyncRecord)
+
+# Number of records to create for each measurement.
+COUNT = 1000
+
+
+class DictBackedRecord(object):
+    """
+    Layout of a record before records shared a schema: eight field lists and
+    a content dict per instance, all held in the instance dictionary.
+    """
+    def __init__(self, record_type):
+        schema = record_type.get_schema()
+        self._mandatory_fields = list(schema.mandatory_fields)
+        self._msg_fields = list(schema.msg_fields)
+        self._db_fields = list(schema.db_fields)
+        self._ignored_fields = list(schema.ignored_fields)
+        self._all_fields = list(schema.all_fields)
+        self._int_fields = list(schema.int_fields)
+        self._float_fields = list(schema.float_fields)
+        self._datetime_fields = list(schema.datetime_fields)
+        self._dict_fields = list(schema.dict_fields)
+        self._record_content = {}
+        self._fqan_fields = list(schema.fqan_fields)
+
+
+def sample_values(record_type):
+    """Return one value of the right type for each DB field."""
+    schema = record_type.get_schema()
+    values = {}
+    for name in schema.db_fields:
+        if name in schema.int_set:
+            values[name] = 1
+        elif name in schema.float_set:
+            values[name] = 1.0
+        elif name in schema.datetime_set:
+            values[name] = datetime(2020, 1, 1)
+        else:
+            values[name] = 'value'
+    return values
+
+
+def bytes_per_record(factory):
+    """Return the average bytes allocated by each of COUNT records."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = [factory() for _ in range(COUNT)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del records
+    return (after - before) // COUNT
+
+
+def fresh(value):
+    """Return a new copy of a string, as reading it from a line would."""
+    return ''.join(list(value))
+
+
+class RecordMemoryTest(unittest.TestCase):
+    """Compare the memory used by compact and dict-backed records."""
+
+    def test_bytes_per_record(self):
+        # The values are shared between records so that only the cost of
+        # the storage itself is measured.
+        for record_type in RECORD_TYPES:
+            values = sample_values(record_type)
+
+            def compact():
+                record = record_type()
+                for name, value in values.items():
+                    record._record_content[name] = value
+                return record
+
+            def dict_backed():
+                record = DictBackedRecord(record_type)
+                record._record_content.update(values)
+                return record
+
+            after = bytes_per_record(compact)
+            before = bytes_per_record(dict_backed)
+            self.assertLess(after, before, '%s: compact record uses %d bytes,'
+                            ' dict-backed record %d' % (record_type.__name__,
+                                                        after, before))
+
+    def test_interning(self):
+        """Records sharing values of INTERN_FIELDS should use less memory."""
+        for record_type in (JobRecord, ProcessedRecord):
+            schema = record_type.get_schema()
+            values = dict((name, 'repeated value %s' % name)
+                          for name in schema.intern_fields
+                          if name in schema.db_set)
+            self.assertTrue(values)
+
+            def parsed():
+                record = record_type()
+                # Every record gets its own copies, as if read from a log.
+                record.set_all(dict((name, fresh(value))
+                                    for name, value in values.items()))
+                return record
+
+            with mock.patch('apel.db.records.record.intern_value',
+                            lambda value: value):
+                plain = bytes_per_record(parsed)
+            interned = bytes_per_record(parsed)
+            self.assertLess(interned, plain)
+
+    def test_no_instance_dict(self):
+        for record_type in RECORD_TYPES:
+            self.assertFalse(hasattr(record_type(), '__dict__'),
+                             '%s has an instance dict' % record_type.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
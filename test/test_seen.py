@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from apel.db.records import EventRecord, JobRecord, RecordBatch
+from apel.parsers.seen import SeenIndex
+
+# 2024-01-01 00:00:00 UTC
+NOW = 1704067200
+
+
+def event_batch(jobs, stop=NOW - 3600):
+    """Returns a batch of EventRecords, as a parser makes, for the jobs."""
+    records = []
+    for job in jobs:
+        record = EventRecord()
+        record.set_all({'Site': 'TestSite', 'MachineName': 'ce01.example.org',
+                        'JobName': job, 'LocalUserID': 'user',
+                        'StartTime': stop - 100, 'StopTime': stop})
+        records.append(record)
+    return RecordBatch.from_records(records)
+
+
+class SeenIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir_path, 'seen')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_drop_seen(self):
+        """Records already seen, in the index or the batch, are dropped."""
+        seen = SeenIndex(self.path, 86400, now=NOW)
+        batch, keys = seen.drop_seen(event_batch(['1', '2', '1']))
+        self.assertEqual(batch.column('JobName'), ['1', '2'])
+        seen.add(keys)
+        self.assertEqual(len(seen), 2)
+
+        batch, keys = seen.drop_seen(event_batch(['2', '3']))
+        self.assertEqual(batch.column('JobName'), ['3'])
+        self.assertEqual(len(keys), 1)
+
+        # A job with the same name which ended at another time is another job.
+        batch, keys = seen.drop_seen(event_batch(['1'], stop=NOW - 60))
+        self.assertEqual(len(batch), 1)
+
+    def test_save_and_retention(self):
+        """The index is kept between runs, for the retention only."""
+        seen = SeenIndex(self.path, 86400, now=NOW)
+        seen.add(seen.drop_seen(event_batch(['1', '2']))[1])
+        # Records older than the retention aren't added at all.
+        seen.add(seen.drop_seen(event_batch(['old'], stop=NOW - 2 * 86400))[1])
+        self.assertEqual(len(seen), 2)
+        seen.save()
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        seen = SeenIndex(self.path, 86400, now=NOW)
+        self.assertEqual(len(seen), 2)
+        batch, _keys = seen.drop_seen(event_batch(['1', '2', '3']))
+        self.assertEqual(batch.column('JobName'), ['3'])
+
+        # A day later the records have passed the retention.
+        seen = SeenIndex(self.path, 86400, now=NOW + 86400)
+        self.assertEqual(len(seen), 0)
+
+    def test_other_records(self):
+        """Records of types which aren't indexed are left alone."""
+        seen = SeenIndex(self.path, 86400, now=NOW)
+        batch = RecordBatch(JobRecord)
+        dropped, keys = seen.drop_seen(batch)
+        self.assertTrue(dropped is batch)
+        self.assertEqual(keys, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
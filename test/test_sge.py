@@ -1,4 +1,8 @@
 from datetime import datetime
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 import mock
@@ -354,6 +358,55 @@ class ParserSGETest(unittest.TestCase):
             finally:
                 patcher.stop()
 
+    def test_multiplier_cache(self):
+        """Check that multipliers are cached until they are too old."""
+        qhost_output = """<?xml version='1.0'?>
+            <qhost>
+             <host name='global'>
+               <hostvalue name='num_proc'>-</hostvalue>
+             </host>
+             <host name='compute-4-19.local'>
+               <hostvalue name='num_proc'>24</hostvalue>
+               <resourcevalue name='cputmult' dominance='hf'>2.5</resourcevalue>
+             </host>
+            </qhost>
+        """
+        multipliers = {'compute-4-19.local': {'cputmult': 2.5}}
+        dir_path = tempfile.mkdtemp()
+        cache = os.path.join(dir_path, 'multipliers.json')
+        try:
+            patcher = mock.patch('apel.parsers.sge.subprocess')
+            subprocess = patcher.start()
+            subprocess.Popen.return_value.returncode = 0
+            subprocess.Popen.return_value.communicate = lambda: (qhost_output, '')
+
+            parser = apel.parsers.SGEParser('testSite', 'testHost', True)
+            parser.set_multiplier_cache(cache, 3600)
+            self.assertEqual(parser._get_cpu_multiplier('compute-4-19.local'), 2.5)
+            self.assertEqual(parser._get_wall_multiplier('compute-4-19.local'), 1.0)
+            self.assertEqual(parser._get_cpu_multiplier('unknown'), 1.0)
+            self.assertEqual(subprocess.Popen.call_count, 1)
+
+            # A new parser uses the cached multipliers without running qhost.
+            parser = apel.parsers.SGEParser('testSite', 'testHost', True)
+            parser.set_multiplier_cache(cache, 3600)
+            self.assertEqual(parser.multipliers, multipliers)
+            self.assertEqual(subprocess.Popen.call_count, 1)
+
+            # Once they are too old, qhost is run again, but if it fails the
+            # old ones are still used.
+            old = time.time() - 7200
+            os.utime(cache, (old, old))
+            subprocess.Popen.return_value.returncode = 1
+            subprocess.Popen.return_value.communicate = lambda: ('', 'timeout')
+            parser = apel.parsers.SGEParser('testSite', 'testHost', True)
+            parser.set_multiplier_cache(cache, 3600)
+            self.assertEqual(parser.multipliers, multipliers)
+            self.assertEqual(subprocess.Popen.call_count, 2)
+        finally:
+            patcher.stop()
+            shutil.rmtree(dir_path)
+
     def test_mpi_false(self):
         """Check that non-mpi parsers return zero procs even if at least 1."""
         line = ('dteam:testce.test:dteam:dteam041:STDIN:43:sge:19:1200093286:12'
@@ -1,11 +1,13 @@
 from future.builtins import zip
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
+import time
 from time import mktime
 import unittest
 
 from apel.parsers import SlurmParser
-#from apel.parsers.slurm import parse_local_timestamp
+from apel.parsers.slurm import cached_local_timestamp, parse_local_timestamp
 
 
 class ParserSlurmTest(unittest.TestCase):
@@ -152,6 +154,38 @@ class ParserSlurmTest(unittest.TestCase):
             self.assertEqual(self.parser.parse(line), None,
                              "Line incorrectly accepted: %s" % line)
 
+    @unittest.skipUnless(hasattr(time, 'tzset'), 'Needs time.tzset')
+    def test_cached_local_timestamp(self):
+        """Check that caching timestamps gives the same times, over DST."""
+        old_tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'Europe/London'
+        time.tzset()
+        try:
+            # Every 7 minutes and 13 seconds across the change to and from
+            # summer time.
+            for start in (datetime(2013, 3, 30, 23), datetime(2013, 10, 26, 23)):
+                for step in range(100):
+                    timestamp = (start + timedelta(seconds=433 * step)).strftime('%Y-%m-%dT%H:%M:%S')
+                    self.assertEqual(cached_local_timestamp(timestamp),
+                                     parse_local_timestamp(timestamp), timestamp)
+
+            for timestamp in ('2013-03-27 17:13:41', '2013-03-27T17:13:62', 'bad'):
+                self.assertRaises(ValueError, cached_local_timestamp, timestamp)
+
+            # Minutes cached in one time zone are not used in another.
+            timestamp = '2013-06-01T10:00:05'
+            london = cached_local_timestamp(timestamp)
+            os.environ['TZ'] = 'America/New_York'
+            time.tzset()
+            self.assertEqual(cached_local_timestamp(timestamp),
+                             london + timedelta(hours=5))
+        finally:
+            if old_tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = old_tz
+            time.tzset()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from apel.db import ApelDbException
+from apel.db.records import BlahdRecord, EventRecord, JobRecord, RecordBatch
+from apel.db.spool import RecordSpool, read_spool_file
+
+
+def make_batch(record_class, fielddicts):
+    """Returns a batch of records as a parser makes them."""
+    records = []
+    for fielddict in fielddicts:
+        record = record_class()
+        record.set_all(fielddict)
+        records.append(record)
+    return RecordBatch.from_records(records)
+
+
+EVENTS = [{'Site': 'TestSite', 'JobName': str(job), 'LocalUserID': 'user\t%d' % job,
+           'WallDuration': job * 10, 'StartTime': 1700000000 + job,
+           'StopTime': 1700000100 + job, 'MachineName': 'ce01', 'Queue': 'a\\b\nc',
+           'Processors': None}
+          for job in range(5)]
+
+BLAHD = [{'TimeStamp': 1700000000, 'GlobalUserName': '/C=UK/CN=\\N',
+          'FQAN': '/atlas/Role=NULL/Capability=NULL', 'VO': 'atlas',
+          'CE': 'ce01.example.org', 'GlobalJobId': 'CREAM1', 'LrmsId': '1',
+          'Site': 'TestSite', 'ValidFrom': 1690000000, 'ValidUntil': 1710000000,
+          'Processed': 0}]
+
+
+class RecordSpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_round_trip(self):
+        """The spooled records load as the tuples they would have loaded."""
+        events = make_batch(EventRecord, EVENTS)
+        blahd = make_batch(BlahdRecord, BLAHD)
+        spool = RecordSpool(self.dir_path, records_per_file=4)
+        # A file is complete once it has records_per_file records.
+        for batch in events.select([0, 1]), events.select([2, 3]), events.select([4]):
+            spool.load_records(batch, replace=False)
+        spool.load_records(blahd)
+        # Only the complete files are loaded.
+        mock_db = mock.Mock()
+        self.assertEqual(spool.load(mock_db), 4)
+        spool.close()
+
+        self.assertEqual(spool.load(mock_db), 2)
+        self.assertEqual(os.listdir(self.dir_path), [])
+        loads = [(call[0][0].record_class, call[1]['replace'], call[0][0].get_db_tuples())
+                 for call in mock_db.load_records.call_args_list]
+        self.assertEqual(loads, [(EventRecord, False, events.get_db_tuples()[:4]),
+                                 (EventRecord, False, events.get_db_tuples()[4:]),
+                                 (BlahdRecord, True, blahd.get_db_tuples())])
+
+    def test_load_error(self):
+        """A file which can't be loaded is kept, with those after it."""
+        spool = RecordSpool(self.dir_path)
+        spool.load_records(make_batch(EventRecord, EVENTS))
+        spool.close()
+        spool.load_records(make_batch(BlahdRecord, BLAHD))
+        spool.close()
+
+        mock_db = mock.Mock()
+        mock_db.load_records.side_effect = ApelDbException('Lost connection')
+        self.assertRaises(ApelDbException, spool.load, mock_db)
+        self.assertEqual(len(os.listdir(self.dir_path)), 2)
+
+    def test_bad_files(self):
+        """Only the record types the parser loads are spooled."""
+        spool = RecordSpool(self.dir_path)
+        self.assertRaises(ApelDbException, spool.load_records, RecordBatch(JobRecord))
+
+        path = os.path.join(self.dir_path, 'other.tsv.gz')
+        with gzip.open(path, 'wb') as spool_file:
+            spool_file.write(b'JobRecord\tinsert\nSite\n')
+        self.assertRaises(ApelDbException, read_spool_file, path)
+
+
+if __name__ == '__main__':
+    unittest.main()